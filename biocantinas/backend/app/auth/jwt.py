@@ -1,13 +1,18 @@
 import os
+import threading
 import time
 from typing import Optional
 
 import jwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
+from ..db.models import UserORM
 from ..dtos.userDTO import User
-from ..services.userService import get_user_service
+from ..services.userService import UserService, get_user_service
 ALGORITHM = "HS256"
 DEFAULT_EXP_SECONDS = 60 * 60 * 24  # 24h
 
@@ -41,16 +46,74 @@ def decode_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail="Token inválido")
 
 
+# Cache (por processo) dos utilizadores autenticados: id → User. Evita uma consulta
+# a utilizadores em cada pedido autenticado; as alterações feitas neste processo
+# invalidam a entrada, as feitas noutro worker ficam visíveis ao fim de TTL segundos.
+USER_CACHE_TTL = float(os.environ.get("BIOCANTINAS_USER_CACHE_TTL", "60"))  # s
+USER_CACHE_SIZE = int(os.environ.get("BIOCANTINAS_USER_CACHE_SIZE", "1024"))
+
+_cache_utilizadores: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_cache_lock = threading.Lock()
+_cache_geracao = 0  # incrementada a cada invalidação; evita guardar leituras anteriores a ela
+
+
+def invalidar_cache_utilizadores(user_id: Optional[int] = None) -> None:
+    """Descarta o utilizador indicado (ou todos). Chamar sempre que um utilizador mudar."""
+    global _cache_geracao
+    with _cache_lock:
+        _cache_geracao += 1
+        if user_id is None:
+            _cache_utilizadores.clear()
+        else:
+            _cache_utilizadores.pop(user_id, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _registar_escritas_utilizadores(session, flush_context):
+    """Guarda os utilizadores escritos pela transação; a cache só é invalidada no commit."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, UserORM):
+            session.info.setdefault("utilizadores_alterados", set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_ao_escrever_utilizador(session):
+    """
+    Escritas ORM em utilizadores (neste processo) invalidam a cache depois do commit:
+    invalidar no flush deixaria um pedido concorrente guardar a linha ainda por
+    confirmar (papel antigo, utilizador apagado) com a geração nova.
+    """
+    for user_id in session.info.pop("utilizadores_alterados", ()):
+        invalidar_cache_utilizadores(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_escritas_utilizadores(session):
+    session.info.pop("utilizadores_alterados", None)
+
+
 security = HTTPBearer()
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    svc: UserService = Depends(get_user_service),
+) -> User:
     data = decode_token(credentials.credentials)
     user_id = int(data.get("sub"))
-    svc = get_user_service()
-    user = svc.get_user(user_id)
-    if not user:
+    with _cache_lock:
+        user = _cache_utilizadores.get(user_id)
+        geracao = _cache_geracao
+    if user is not None:
+        return user
+
+    orm = svc.get_user(user_id)
+    if not orm:
         raise HTTPException(status_code=401, detail="Utilizador não existe")
+    user = User(id=orm.id, username=orm.username, role=orm.role)
+    with _cache_lock:
+        if geracao == _cache_geracao:
+            _cache_utilizadores[user_id] = user
     return user
 
 
@@ -1,56 +1,175 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
 from datetime import date
-from typing import List
-from sqlalchemy import func
-from ..services.aprovisionamentoService import get_aprovisionamento_service
+from typing import List, Optional
+from ..services.aprovisionamentoService import (
+    AprovisionamentoService, AprovisionamentoServiceAsync,
+    get_aprovisionamento_service, get_aprovisionamento_service_async
+)
+from ..services.reservaService import fila_reservas, FilaReservasCheia
+from ..repositories.reservaRepo import CapacidadeEsgotada, RefeicaoNaoEncontrada
 from ..auth.jwt import require_role, get_current_user
 from ..dtos.userDTO import User
-from ..dtos.aprovisionamentoDTO import ReservaRefeicaoCreate, ReservaRefeicaoDTO
-from ..db.models import ReservaRefeicaoORM
+from ..dtos.aprovisionamentoDTO import (
+    ReservaRefeicaoCreate, ReservaRefeicaoDTO, ReservaLoteCreate, ReservaLoteResultadoDTO,
+    ContadorReservasDTO, CapacidadeRefeicaoUpdate
+)
 
 router = APIRouter(prefix="/aprovisionamento", tags=["aprovisionamento"])
 
 # ============ ENDPOINTS PARA RESERVAS DE REFEIÇÕES ============
 
 @router.post("/reservas", response_model=ReservaRefeicaoDTO)
-def criar_reserva(
+async def criar_reserva(
     reserva: ReservaRefeicaoCreate,
-    user: User = Depends(get_current_user)
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
 ):
-    """Estudante reserva uma refeição específica"""
-    service = get_aprovisionamento_service()
+    """
+    Estudante reserva uma refeição específica.
+    A reserva é gravada em group commit (fila_reservas); a resposta só é enviada
+    depois do commit do lote.
+    
+    Com o cabeçalho Idempotency-Key, repetir o pedido (mesma chave, mesmo utilizador)
+    devolve a reserva já criada em vez de criar outra (cabeçalho Idempotent-Replayed).
+    """
+    if idempotency_key:
+        repetido = await _resposta_guardada(service, user.id, idempotency_key, reserva, response)
+        if repetido is not None:
+            return repetido
     try:
-        reserva_criada = service.reserva_repo.criar(
+        futuro = fila_reservas.submeter(
             utilizador_id=user.id,
             refeicao_id=reserva.refeicao_id,
-            quantidade_pessoas=reserva.quantidade_pessoas
+            quantidade_pessoas=reserva.quantidade_pessoas,
+            chave=idempotency_key or None
         )
-        return reserva_criada
+        return await asyncio.wrap_future(futuro)
+    except IntegrityError as e:
+        # Pedido repetido em simultâneo: a mesma chave foi gravada por outro pedido
+        if idempotency_key:
+            repetido = await _resposta_guardada(service, user.id, idempotency_key, reserva, response)
+            if repetido is not None:
+                return repetido
+        raise HTTPException(status_code=500, detail=str(e))
+    except FilaReservasCheia as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except CapacidadeEsgotada as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RefeicaoNaoEncontrada as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _resposta_guardada(service: AprovisionamentoServiceAsync, utilizador_id: int, chave: str,
+                             reserva: ReservaRefeicaoCreate, response: Response) -> Optional[ReservaRefeicaoDTO]:
+    """Resposta já enviada para a chave (None se não existir); 422 se a chave foi usada noutra reserva."""
+    registo = await service.idempotencia_repo.obter(utilizador_id, chave)
+    resposta = registo.resposta if registo is not None else None
+    await service.session.rollback()  # não manter a ligação enquanto a reserva espera na fila
+    if resposta is None:
+        return None
+    guardada = ReservaRefeicaoDTO.model_validate_json(resposta)
+    if (guardada.refeicao_id, guardada.quantidade_pessoas) != (reserva.refeicao_id, reserva.quantidade_pessoas):
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada noutra reserva")
+    response.headers["Idempotent-Replayed"] = "true"
+    return guardada
+
+
+@router.post("/reservas/lote", response_model=ReservaLoteResultadoDTO)
+def criar_reservas_lote(
+    lote: ReservaLoteCreate,
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
+):
+    """
+    Reserva várias refeições num só pedido (e.g. todas as refeições da semana,
+    ou uma turma). As reservas válidas são gravadas numa só transação; o
+    resultado de cada item indica se a reserva foi criada ou o erro.
+    """
+    try:
+        resultados = service.criar_reservas_lote(
+            user.id, [(r.refeicao_id, r.quantidade_pessoas) for r in lote.reservas]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    criadas = sum(1 for r in resultados if r["sucesso"])
+    return {
+        "total": len(resultados),
+        "criadas": criadas,
+        "falhadas": len(resultados) - criadas,
+        "resultados": resultados
+    }
+
+
 @router.get("/reservas", response_model=List[ReservaRefeicaoDTO])
-def listar_minhas_reservas(user: User = Depends(get_current_user)):
+async def listar_minhas_reservas(user: User = Depends(get_current_user), service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)):
     """Lista reservas do utilizador autenticado"""
-    service = get_aprovisionamento_service()
-    return service.reserva_repo.listar_por_utilizador(user.id)
+    return await service.reserva_repo.listar_por_utilizador(user.id)
+
+
+@router.delete("/reservas/{reserva_id}")
+def cancelar_reserva(
+    reserva_id: int,
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
+):
+    """Cancela uma reserva do utilizador autenticado"""
+    if not service.reserva_repo.remover(reserva_id, user.id):
+        raise HTTPException(status_code=404, detail="Reserva não encontrada")
+    return {"sucesso": True, "reserva_id": reserva_id}
+
+
+@router.get("/reservas/contadores", response_model=List[ContadorReservasDTO])
+async def listar_contadores_reservas(
+    refeicao_ids: Optional[List[int]] = Query(None),
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
+):
+    """
+    Totais correntes de reservas por refeição (todas, ou as indicadas em refeicao_ids).
+    Leitura por chave primária dos contadores: pode ser consultado com frequência (cozinha).
+    """
+    return await service.reserva_repo.listar_contadores(refeicao_ids)
+
+
+@router.put("/refeicoes/{refeicao_id}/capacidade", response_model=ContadorReservasDTO)
+def definir_capacidade_refeicao(
+    refeicao_id: int,
+    dados: CapacidadeRefeicaoUpdate,
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
+):
+    """
+    [GESTOR_CANTINA] Define o máximo de pessoas que a refeição pode servir
+    (null remove o limite). Reservas acima da capacidade são recusadas (409);
+    reduzir a capacidade abaixo do já reservado não cancela reservas.
+    """
+    if refeicao_id not in service.reserva_repo.refeicoes_existentes([refeicao_id]):
+        raise HTTPException(status_code=404, detail="Refeição não encontrada")
+    return service.reserva_repo.definir_capacidade(refeicao_id, dados.capacidade)
 
 
 # ============ ENDPOINTS PARA CÁLCULO DE NECESSIDADES ============
 
 @router.get("/necessidades")
-def calcular_necessidades(
+async def calcular_necessidades(
     data_inicio: date,
     data_fim: date,
-    user: User = Depends(get_current_user)
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
 ):
     """
     Calcula necessidades de produtos para um período baseado nas ementas planejadas.
     Endpoint público para visualização.
     """
-    service = get_aprovisionamento_service()
-    necessidades = service.calcular_necessidades(data_inicio, data_fim)
+    necessidades = await service.executar(lambda s: s.calcular_necessidades(data_inicio, data_fim))
     
     return {
         "periodo": f"{data_inicio} a {data_fim}",
@@ -60,10 +179,11 @@ def calcular_necessidades(
 
 
 @router.get("/preview")
-def preview_necessidades(
+async def preview_necessidades(
     data_inicio: date,
     data_fim: date,
-    user: User = Depends(get_current_user)
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
 ):
     """
     Preview de necessidades SEM salvar no banco.
@@ -78,11 +198,16 @@ def preview_necessidades(
     - Busca total de refeições do histórico por dia da semana
     - Aplica % de escolha de cada prato para calcular quantidades
     """
-    service = get_aprovisionamento_service()
+    return await service.executar(lambda s: _calcular_preview(s, data_inicio, data_fim))
+
+
+def _calcular_preview(service: AprovisionamentoService, data_inicio: date, data_fim: date) -> dict:
+    # Grafo ementa → refeição → item carregado uma única vez para todo o preview
+    ementas = service.carregar_ementas(data_inicio, data_fim)
     
-    necessidades_base = service.calcular_necessidades(data_inicio, data_fim)
+    necessidades_base = service.calcular_necessidades(data_inicio, data_fim, ementas)
     necessidades_previstas = service.ajustar_com_previsao_historica(
-        necessidades_base.copy(), data_inicio, data_fim
+        necessidades_base.copy(), data_inicio, data_fim, ementas
     )
     
     # Calcular desvios para visualização
@@ -93,14 +218,17 @@ def preview_necessidades(
         desvio = service.calcular_desvio(qtd_planejada, qtd_prevista)
         desvios[produto] = round(desvio, 2)
     
-    # Buscar detalhes das ementas do período
-    ementas = service.ementa_repo.listar_por_periodo(data_inicio, data_fim)
+    # Detalhes das ementas do período
     refeicoes_detalhes = []
     from datetime import timedelta
     dias_semana_nomes = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
     dias_semana = ["segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"]
     
-    historico_repo = service.historico_repo
+    historico = service.historico_repo.obter_tabela()
+    # Reservas reais de todas as refeições do período (uma consulta agregada)
+    reservas_por_refeicao = service.reserva_repo.totais_por_refeicao(
+        [refeicao.id for ementa in ementas for refeicao in ementa.refeicoes]
+    )
     
     for ementa in ementas:
         # Iterar sobre cada dia da ementa que esteja no período selecionado
@@ -120,16 +248,12 @@ def preview_necessidades(
                     ]
                     
                     # Buscar previsão histórica
-                    reservas_historico = historico_repo.obter_reservas_prato(
-                        dia_semana_texto, refeicao.tipo.lower(), refeicao.descricao or ""
+                    reservas_historico = historico.reservas_prato(
+                        dia_semana_texto, refeicao.tipo, refeicao.descricao or ""
                     )
                     
-                    # Contar reservas reais
-                    reservas_reais = service.session.query(
-                        func.sum(ReservaRefeicaoORM.quantidade_pessoas)
-                    ).filter(
-                        ReservaRefeicaoORM.refeicao_id == refeicao.id
-                    ).scalar() or 0
+                    # Reservas reais
+                    reservas_reais = reservas_por_refeicao.get(refeicao.id, 0)
                     
                     refeicoes_detalhes.append({
                         "data": str(data_atual),
@@ -168,13 +292,64 @@ def preview_necessidades(
     }
 
 
+@router.get("/alocacao")
+async def alocacao_fornecedores(
+    data_inicio: date,
+    data_fim: date,
+    data_entrega: Optional[date] = None,
+    user: User = Depends(get_current_user),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
+):
+    """
+    Divisão das necessidades previstas (previsão histórica, como no preview) pelos
+    fornecedores aprovados, SEM criar pedidos.
+    
+    Cada produto é dividido por ordem de data de inscrição, respeitando a capacidade
+    disponível e o intervalo de produção: tem de cobrir data_entrega ou, sem
+    data_entrega, intersetar o período.
+    """
+    return await service.executar(lambda s: _calcular_alocacao(s, data_inicio, data_fim, data_entrega))
+
+
+def _calcular_alocacao(service: AprovisionamentoService, data_inicio: date, data_fim: date,
+                       data_entrega: Optional[date]) -> dict:
+    ementas = service.carregar_ementas(data_inicio, data_fim)
+    necessidades_base = service.calcular_necessidades(data_inicio, data_fim, ementas)
+    necessidades_previstas = service.ajustar_com_previsao_historica(
+        necessidades_base.copy(), data_inicio, data_fim, ementas
+    )
+    if data_entrega:
+        alocacao = service.calcular_alocacao(necessidades_previstas, data_entrega)
+    else:
+        alocacao = service.calcular_alocacao(necessidades_previstas, data_inicio, data_fim)
+    
+    return {
+        "periodo": f"{data_inicio} a {data_fim}",
+        "data_entrega": data_entrega,
+        "necessidades": necessidades_previstas,
+        "alocacoes": [
+            {
+                "produto": linha.produto,
+                "produto_id": linha.produto_id,
+                "fornecedor_id": linha.fornecedor_id,
+                "fornecedor": linha.fornecedor_nome,
+                "ordem_prioridade": linha.ordem_prioridade,
+                "quantidade": linha.quantidade
+            }
+            for linha in alocacao.linhas
+        ],
+        "faltas": alocacao.faltas
+    }
+
+
 # ============ ENDPOINTS EXCLUSIVOS DO GESTOR DA CANTINA ============
 
 @router.post("/calcular-plano")
 def calcular_plano_producao(
     data_inicio: date,
     data_fim: date,
-    user: User = Depends(require_role("GESTOR_CANTINA"))
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
 ):
     """
     [GESTOR_CANTINA] Calcula e SALVA o plano de produção final.
@@ -186,7 +361,6 @@ def calcular_plano_producao(
     4. Gera alertas se desvio > 10%
     5. Salva tudo no banco de dados
     """
-    service = get_aprovisionamento_service()
     resultado = service.calcular_e_salvar_plano(data_inicio, data_fim)
     
     return {
@@ -196,12 +370,79 @@ def calcular_plano_producao(
     }
 
 
+@router.get("/plano")
+async def obter_plano_vigente(
+    data_inicio: date,
+    data_fim: date,
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
+):
+    """
+    [GESTOR_CANTINA] Plano de produção vigente (última versão calculada) do período.
+    """
+    return await service.executar(lambda s: _plano_vigente(s, data_inicio, data_fim))
+
+
+def _plano_vigente(service: AprovisionamentoService, data_inicio: date, data_fim: date) -> dict:
+    lote = service.plano_repo.obter_lote_vigente(data_inicio, data_fim)
+    if not lote:
+        raise HTTPException(status_code=404, detail="Sem plano calculado para este período")
+    
+    return {
+        "lote_id": lote.id,
+        "periodo": f"{data_inicio} a {data_fim}",
+        "data_calculo": lote.data_calculo,
+        "total_produtos": lote.total_produtos,
+        "produtos_com_alerta": lote.produtos_com_alerta,
+        "plano": [
+            {
+                "produto_nome": item.produto_nome,
+                "quantidade_prevista": item.quantidade_prevista,
+                "quantidade_realizada": item.quantidade_realizada,
+                "desvio_percentual": item.desvio_percentual,
+                "requer_alerta": item.requer_alerta
+            }
+            for item in service.plano_repo.listar_por_lote(lote.id)
+        ]
+    }
+
+
+@router.get("/plano/versoes")
+async def listar_versoes_plano(
+    data_inicio: date,
+    data_fim: date,
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
+):
+    """
+    [GESTOR_CANTINA] Versões do plano de produção do período (mais recente primeiro),
+    para comparar alertas ao longo do tempo.
+    """
+    return await service.executar(lambda s: _versoes_plano(s, data_inicio, data_fim))
+
+
+def _versoes_plano(service: AprovisionamentoService, data_inicio: date, data_fim: date) -> list:
+    vigente = service.plano_repo.obter_lote_vigente(data_inicio, data_fim)
+    
+    return [
+        {
+            "lote_id": lote.id,
+            "data_calculo": lote.data_calculo,
+            "total_produtos": lote.total_produtos,
+            "produtos_com_alerta": lote.produtos_com_alerta,
+            "vigente": vigente is not None and lote.id == vigente.id
+        }
+        for lote in service.plano_repo.listar_lotes(data_inicio, data_fim)
+    ]
+
+
 @router.post("/gerar-pedidos")
 def gerar_pedidos_fornecedores(
     data_inicio: date,
     data_fim: date,
     data_entrega: date,
-    user: User = Depends(require_role("GESTOR_CANTINA"))
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
 ):
     """
     [GESTOR_CANTINA] Gera pedidos aos fornecedores aprovados.
@@ -211,7 +452,6 @@ def gerar_pedidos_fornecedores(
     - Segundo mais antigo = prioridade 2
     - etc.
     """
-    service = get_aprovisionamento_service()
     resultado = service.gerar_pedidos_fornecedores(data_inicio, data_fim, data_entrega)
     
     return {
@@ -223,12 +463,19 @@ def gerar_pedidos_fornecedores(
 
 
 @router.get("/alertas")
-def listar_alertas(user: User = Depends(require_role("GESTOR_CANTINA"))):
+async def listar_alertas(
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
+):
     """
-    [GESTOR_CANTINA] Lista todos os alertas de desvio > 10%.
+    [GESTOR_CANTINA] Lista os alertas de desvio > 10% dos planos vigentes.
+    Com data_inicio e data_fim, apenas os do plano vigente desse período.
     """
-    service = get_aprovisionamento_service()
-    alertas = service.listar_alertas()
+    if (data_inicio is None) != (data_fim is None):
+        raise HTTPException(status_code=400, detail="Indique data_inicio e data_fim, ou nenhum dos dois")
+    alertas = await service.executar(lambda s: s.listar_alertas(data_inicio, data_fim))
     
     return {
         "total_alertas": len(alertas),
@@ -237,16 +484,19 @@ def listar_alertas(user: User = Depends(require_role("GESTOR_CANTINA"))):
 
 
 @router.get("/pedidos")
-def listar_pedidos(
+async def listar_pedidos(
     status: str | None = None,
-    user: User = Depends(require_role("GESTOR_CANTINA"))
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoServiceAsync = Depends(get_aprovisionamento_service_async)
 ):
     """
     [GESTOR_CANTINA] Lista pedidos aos fornecedores.
     Pode filtrar por status: pendente, confirmado, entregue
     """
-    service = get_aprovisionamento_service()
-    
+    return await service.executar(lambda s: _listar_pedidos(s, status))
+
+
+def _listar_pedidos(service: AprovisionamentoService, status: str | None) -> dict:
     if status:
         pedidos = service.pedido_repo.listar_por_status(status)
     else:
@@ -273,13 +523,13 @@ def listar_pedidos(
 def atualizar_status_pedido(
     pedido_id: int,
     novo_status: str,
-    user: User = Depends(require_role("GESTOR_CANTINA"))
+    user: User = Depends(require_role("GESTOR_CANTINA")),
+    service: AprovisionamentoService = Depends(get_aprovisionamento_service)
 ):
     """
     [GESTOR_CANTINA] Atualiza status de um pedido.
     Status válidos: pendente, confirmado, entregue
     """
-    service = get_aprovisionamento_service()
     
     if novo_status not in ["pendente", "confirmado", "entregue"]:
         raise HTTPException(status_code=400, detail="Status inválido")
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
 from ..dtos.userDTO import User
-from ..services.userService import get_user_service
+from ..services.userService import (
+    UserService, get_user_service, UserServiceAsync, get_user_service_async, PoolHashSaturado
+)
 from ..auth.jwt import create_access_token
 
 router = APIRouter(tags=["auth"], prefix="/auth")
@@ -27,8 +29,7 @@ class LoginCredentials(BaseModel):
 
 
 @router.post("/signup", response_model=User)
-def signup(payload: SignupCredentials):
-    svc = get_user_service()
+def signup(payload: SignupCredentials, svc: UserService = Depends(get_user_service)):
     try:
         # Do not force a default role; require provided role
         if payload.role is None or not isinstance(payload.role, str) or payload.role.strip() == "":
@@ -40,9 +41,11 @@ def signup(payload: SignupCredentials):
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(payload: LoginCredentials):
-	svc = get_user_service()
-	user = svc.verify_user(username=payload.username, password=payload.password)
+async def login(payload: LoginCredentials, svc: UserServiceAsync = Depends(get_user_service_async)):
+	try:
+		user = await svc.verify_user(username=payload.username, password=payload.password)
+	except PoolHashSaturado as e:
+		raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
 	if not user:
 		raise HTTPException(status_code=401, detail="Credenciais inválidas")
 	token = create_access_token(user)
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from datetime import date
 from ..dtos.ementaDTO import Ementa, EmentaCreate
-from ..services.ementaService import get_ementa_service
+from ..repositories.ementaRepo import EmentaComReservas
+from ..services.ementaService import EmentaService, EmentaServiceAsync, get_ementa_service, get_ementa_service_async
 from ..auth.jwt import get_current_user, require_role
 from ..dtos.userDTO import User
 
@@ -10,9 +11,8 @@ router = APIRouter(tags=["ementas"], prefix="/ementas")
 
 
 @router.post("/", response_model=Ementa)
-def criar_ementa(ementa: EmentaCreate, user: User = Depends(require_role("DIETISTA"))):
+def criar_ementa(ementa: EmentaCreate, user: User = Depends(require_role("DIETISTA")), svc: EmentaService = Depends(get_ementa_service)):
     """Cria uma ementa manualmente"""
-    svc = get_ementa_service()
     return svc.criar_ementa(ementa)
 
 
@@ -20,10 +20,10 @@ def criar_ementa(ementa: EmentaCreate, user: User = Depends(require_role("DIETIS
 def gerar_ementa_automatica(
     data_inicio: date,
     nome: str | None = None,
-    user: User = Depends(require_role("DIETISTA"))
+    user: User = Depends(require_role("DIETISTA")),
+    svc: EmentaService = Depends(get_ementa_service)
 ):
     """Gera automaticamente uma ementa semanal baseada no stock disponível"""
-    svc = get_ementa_service()
     try:
         return svc.gerar_ementa_automatica(data_inicio, nome)
     except Exception as e:
@@ -31,17 +31,15 @@ def gerar_ementa_automatica(
 
 
 @router.get("/", response_model=List[Ementa])
-def listar_ementas(user: User = Depends(get_current_user)):
+async def listar_ementas(user: User = Depends(get_current_user), svc: EmentaServiceAsync = Depends(get_ementa_service_async)):
     """Lista todas as ementas"""
-    svc = get_ementa_service()
-    return svc.listar_ementas()
+    return await svc.listar_ementas()
 
 
 @router.get("/{ementa_id}", response_model=Ementa)
-def obter_ementa(ementa_id: int, user: User = Depends(get_current_user)):
+async def obter_ementa(ementa_id: int, user: User = Depends(get_current_user), svc: EmentaServiceAsync = Depends(get_ementa_service_async)):
     """Obtém uma ementa específica com todas as refeições"""
-    svc = get_ementa_service()
-    ementa = svc.obter_ementa(ementa_id)
+    ementa = await svc.obter_ementa(ementa_id)
     if not ementa:
         raise HTTPException(status_code=404, detail="Ementa não encontrada")
     return ementa
@@ -51,21 +49,30 @@ def obter_ementa(ementa_id: int, user: User = Depends(get_current_user)):
 def atualizar_ementa(
     ementa_id: int,
     ementa: EmentaCreate,
-    user: User = Depends(require_role("DIETISTA"))
+    user: User = Depends(require_role("DIETISTA")),
+    svc: EmentaService = Depends(get_ementa_service)
 ):
-    """Atualiza uma ementa existente (nome, datas e refeições)."""
-    svc = get_ementa_service()
-    atualizado = svc.atualizar_ementa(ementa_id, ementa)
+    """
+    Atualiza uma ementa existente (nome, datas e refeições). As refeições mantêm-se
+    (com as reservas) quando o dia e o tipo não mudam; remover uma refeição com
+    reservas é recusado (409).
+    """
+    try:
+        atualizado = svc.atualizar_ementa(ementa_id, ementa)
+    except EmentaComReservas as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not atualizado:
         raise HTTPException(status_code=404, detail="Ementa não encontrada")
     return atualizado
 
 
 @router.delete("/{ementa_id}")
-def deletar_ementa(ementa_id: int, user: User = Depends(require_role("DIETISTA"))):
-    """Remove uma ementa"""
-    svc = get_ementa_service()
-    sucesso = svc.deletar_ementa(ementa_id)
+def deletar_ementa(ementa_id: int, user: User = Depends(require_role("DIETISTA")), svc: EmentaService = Depends(get_ementa_service)):
+    """Remove uma ementa (409 se alguma das refeições tiver reservas)"""
+    try:
+        sucesso = svc.deletar_ementa(ementa_id)
+    except EmentaComReservas as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not sucesso:
         raise HTTPException(status_code=404, detail="Ementa não encontrada")
     return {"message": "Ementa removida com sucesso"}
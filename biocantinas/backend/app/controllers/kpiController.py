@@ -1,24 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db
 from app.services.kpiService import KPIService
 from app.dtos.kpiDTO import (
     RefeicaoKPIDTO, DiaKPIDTO, EmentaKPIDTO,
-    DesperdícioRefeicaoDTO, DesperdícioDiaDTO, DesperdícioEmentaDTO, KPIConsolidadoDTO
+    DesperdícioRefeicaoDTO, DesperdícioDiaDTO, DesperdícioEmentaDTO, KPIConsolidadoDTO,
+    KPILoteDTO
 )
 from datetime import date
+from typing import List
 
 router = APIRouter(prefix="/kpi", tags=["KPI"])
 
+# Rotas assíncronas: os cálculos do KPIService (síncronos, sobre Session) correm com
+# AsyncSession.run_sync, sem ocupar uma thread do threadpool à espera da base de dados.
+
 # ==== ENDPOINTS DE BIOLÓGICO ====
 
 @router.get("/refeicao/{refeicao_id}", response_model=RefeicaoKPIDTO)
-def get_kpi_refeicao(refeicao_id: int, db: Session = Depends(get_db)):
+async def get_kpi_refeicao(refeicao_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula a percentagem de produtos biológicos utilizados numa refeição específica
     """
     try:
-        kpi = KPIService.calcular_kpi_refeicao(db, refeicao_id)
+        kpi = await db.run_sync(KPIService.calcular_kpi_refeicao, refeicao_id)
         return kpi
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -26,7 +31,7 @@ def get_kpi_refeicao(refeicao_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Erro ao calcular KPI: {str(e)}")
 
 @router.get("/dia/{ementa_id}/{dia_semana}", response_model=DiaKPIDTO)
-def get_kpi_dia(ementa_id: int, dia_semana: int, db: Session = Depends(get_db)):
+async def get_kpi_dia(ementa_id: int, dia_semana: int, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula a percentagem de produtos biológicos para um dia inteiro (almoço + jantar)
     dia_semana: 1=Segunda, 2=Terça, 3=Quarta, 4=Quinta, 5=Sexta
@@ -35,18 +40,18 @@ def get_kpi_dia(ementa_id: int, dia_semana: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="dia_semana deve estar entre 1 e 5")
     
     try:
-        kpi = KPIService.calcular_kpi_dia(db, ementa_id, dia_semana)
+        kpi = await db.run_sync(KPIService.calcular_kpi_dia, ementa_id, dia_semana)
         return kpi
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular KPI: {str(e)}")
 
 @router.get("/ementa/{ementa_id}", response_model=EmentaKPIDTO)
-def get_kpi_ementa(ementa_id: int, db: Session = Depends(get_db)):
+async def get_kpi_ementa(ementa_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula a percentagem média de produtos biológicos para uma ementa completa
     """
     try:
-        kpi = KPIService.calcular_kpi_ementa(db, ementa_id)
+        kpi = await db.run_sync(KPIService.calcular_kpi_ementa, ementa_id)
         return kpi
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -56,13 +61,13 @@ def get_kpi_ementa(ementa_id: int, db: Session = Depends(get_db)):
 # ==== ENDPOINTS DE DESPERDÍCIO ====
 
 @router.get("/desperdicio/refeicao/{refeicao_id}", response_model=DesperdícioRefeicaoDTO)
-def get_desperdicio_refeicao(refeicao_id: int, data_execucao: date = None, db: Session = Depends(get_db)):
+async def get_desperdicio_refeicao(refeicao_id: int, data_execucao: date = None, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula taxa de desperdício de uma refeição específica.
     Se data_execucao não for fornecida, usa a mais recente.
     """
     try:
-        kpi = KPIService.calcular_desperdicio_refeicao(db, refeicao_id, data_execucao)
+        kpi = await db.run_sync(KPIService.calcular_desperdicio_refeicao, refeicao_id, data_execucao)
         return kpi
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -70,7 +75,7 @@ def get_desperdicio_refeicao(refeicao_id: int, data_execucao: date = None, db: S
         raise HTTPException(status_code=500, detail=f"Erro ao calcular desperdício: {str(e)}")
 
 @router.get("/desperdicio/dia/{ementa_id}/{dia_semana}", response_model=DesperdícioDiaDTO)
-def get_desperdicio_dia(ementa_id: int, dia_semana: int, db: Session = Depends(get_db)):
+async def get_desperdicio_dia(ementa_id: int, dia_semana: int, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula desperdício agregado de um dia (almoço + jantar)
     dia_semana: 1=Segunda, 2=Terça, 3=Quarta, 4=Quinta, 5=Sexta
@@ -79,18 +84,18 @@ def get_desperdicio_dia(ementa_id: int, dia_semana: int, db: Session = Depends(g
         raise HTTPException(status_code=400, detail="dia_semana deve estar entre 1 e 5")
     
     try:
-        kpi = KPIService.calcular_desperdicio_dia(db, ementa_id, dia_semana)
+        kpi = await db.run_sync(KPIService.calcular_desperdicio_dia, ementa_id, dia_semana)
         return kpi
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular desperdício: {str(e)}")
 
 @router.get("/desperdicio/ementa/{ementa_id}", response_model=DesperdícioEmentaDTO)
-def get_desperdicio_ementa(ementa_id: int, db: Session = Depends(get_db)):
+async def get_desperdicio_ementa(ementa_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Calcula desperdício agregado de uma ementa completa
     """
     try:
-        kpi = KPIService.calcular_desperdicio_ementa(db, ementa_id)
+        kpi = await db.run_sync(KPIService.calcular_desperdicio_ementa, ementa_id)
         return kpi
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -100,14 +105,37 @@ def get_desperdicio_ementa(ementa_id: int, db: Session = Depends(get_db)):
 # ==== ENDPOINTS CONSOLIDADOS ====
 
 @router.get("/consolidado/{ementa_id}", response_model=KPIConsolidadoDTO)
-def get_kpi_consolidado(ementa_id: int, db: Session = Depends(get_db)):
+async def get_kpi_consolidado(ementa_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retorna KPI consolidado: percentagem biológica + taxa de desperdício + resumo de quantidades
     """
     try:
-        kpi = KPIService.calcular_kpi_consolidado(db, ementa_id)
+        kpi = await db.run_sync(KPIService.calcular_kpi_consolidado, ementa_id)
         return kpi
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular KPI consolidado: {str(e)}")
+
+# ==== ENDPOINTS EM LOTE ====
+
+@router.get("/lote", response_model=KPILoteDTO)
+async def get_kpi_lote(
+    ementa_ids: List[int] = Query(None),
+    data_inicio: date = None,
+    data_fim: date = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    KPIs biológicos, de desperdício e consolidados de várias ementas numa só resposta.
+    Indicar ementa_ids (ex: ?ementa_ids=1&ementa_ids=2) ou um período (data_inicio e data_fim).
+    """
+    if not ementa_ids and not (data_inicio and data_fim):
+        raise HTTPException(status_code=400, detail="Indique ementa_ids ou data_inicio e data_fim")
+    if not ementa_ids and data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="data_inicio deve ser anterior a data_fim")
+    
+    try:
+        return await db.run_sync(KPIService.calcular_kpi_ementas, ementa_ids, data_inicio, data_fim)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular KPIs em lote: {str(e)}")
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from ..dtos.produtoDTO import ProdutoDTO, ProdutoCreateDTO, ProdutoUpdateDTO
-from ..services.produtoService import get_produto_service
+from ..services.produtoService import ProdutoService, get_produto_service
 from ..auth.jwt import get_current_user, require_role
 from ..dtos.userDTO import User
 
@@ -11,10 +11,10 @@ router = APIRouter(tags=["produtos"], prefix="/produtos")
 def criar_produto(
     fornecedor_id: int,
     produto: ProdutoCreateDTO,
-    user: User = Depends(require_role("PRODUTOR"))
+    user: User = Depends(require_role("PRODUTOR")),
+    svc: ProdutoService = Depends(get_produto_service)
 ):
     """Adiciona um produto a um fornecedor existente"""
-    svc = get_produto_service()
     try:
         return svc.criar_produto(fornecedor_id, produto)
     except Exception as e:
@@ -22,9 +22,8 @@ def criar_produto(
 
 
 @router.get("/{produto_id}", response_model=ProdutoDTO)
-def obter_produto(produto_id: int, user: User = Depends(get_current_user)):
+def obter_produto(produto_id: int, user: User = Depends(get_current_user), svc: ProdutoService = Depends(get_produto_service)):
     """Obtém detalhes de um produto específico"""
-    svc = get_produto_service()
     produto = svc.obter_produto(produto_id)
     if not produto:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -35,10 +34,10 @@ def obter_produto(produto_id: int, user: User = Depends(get_current_user)):
 def atualizar_produto(
     produto_id: int,
     produto: ProdutoUpdateDTO,
-    user: User = Depends(require_role("PRODUTOR"))
+    user: User = Depends(require_role("PRODUTOR")),
+    svc: ProdutoService = Depends(get_produto_service)
 ):
     """Atualiza informações de um produto"""
-    svc = get_produto_service()
     atualizado = svc.atualizar_produto(produto_id, produto)
     if not atualizado:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -48,10 +47,10 @@ def atualizar_produto(
 @router.delete("/{produto_id}")
 def deletar_produto(
     produto_id: int,
-    user: User = Depends(require_role("PRODUTOR"))
+    user: User = Depends(require_role("PRODUTOR")),
+    svc: ProdutoService = Depends(get_produto_service)
 ):
     """Remove um produto"""
-    svc = get_produto_service()
     sucesso = svc.deletar_produto(produto_id)
     if not sucesso:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -0,0 +1,209 @@
+"""
+Migrações versionadas do esquema.
+
+Cada migração tem um número de versão e um passo idempotente (pode correr numa base
+de dados que já tenha a alteração, e.g. criada por create_all). A versão aplicada é
+registada na tabela schema_version; aplicar_migracoes corre apenas as pendentes, uma
+vez, no arranque da aplicação (init_db).
+
+Para alterar o esquema de bases de dados existentes (colunas, índices, tabelas novas),
+acrescentar uma Migracao no fim de MIGRACOES — nunca alterar as já publicadas.
+"""
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, List
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, literal, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import Base, ContadorReservasRefeicaoORM, RefeicaoORM, ReservaRefeicaoORM
+from ..repositories.kpiSnapshotRepo import KPISnapshotRepo
+
+logger = logging.getLogger(__name__)
+
+_metadata_versao = MetaData()
+
+schema_version = Table(
+    "schema_version", _metadata_versao,
+    Column("versao", Integer, primary_key=True),
+    Column("descricao", String, nullable=False),
+    Column("aplicada_em", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migracao:
+    versao: int
+    descricao: str
+    aplicar: Callable[[Connection], None]
+
+
+# ==== PASSOS IDEMPOTENTES ====
+
+def _criar_tabelas(*nomes: str) -> Callable[[Connection], None]:
+    """Cria as tabelas do modelo indicadas (todas, se nenhuma for indicada) que ainda não existam."""
+    def passo(conn: Connection) -> None:
+        tabelas = [Base.metadata.tables[n] for n in nomes] if nomes else None
+        Base.metadata.create_all(bind=conn, tables=tabelas, checkfirst=True)
+    return passo
+
+
+def _adicionar_coluna(tabela: str, coluna: str) -> Callable[[Connection], None]:
+    """Adiciona a coluna do modelo (tem de ser nullable) se a tabela ainda não a tiver."""
+    def passo(conn: Connection) -> None:
+        existentes = {c["name"] for c in inspect(conn).get_columns(tabela)}
+        if coluna in existentes:
+            return
+        definicao = Base.metadata.tables[tabela].columns[coluna]
+        tipo = definicao.type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    return passo
+
+
+def _criar_indices(*nomes: str) -> Callable[[Connection], None]:
+    """Cria os índices do modelo indicados que ainda não existam."""
+    def passo(conn: Connection) -> None:
+        inspetor = inspect(conn)
+        for tabela in Base.metadata.sorted_tables:
+            existentes = {i["name"] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name in nomes and indice.name not in existentes:
+                    indice.create(conn)
+    return passo
+
+
+def _preencher_contadores_reservas(conn: Connection) -> None:
+    """Cria os contadores em falta a partir das reservas existentes (refeições que ainda existem)."""
+    contador, reserva = ContadorReservasRefeicaoORM, ReservaRefeicaoORM
+    conn.execute(insert(contador).from_select(
+        ["refeicao_id", "total_pessoas", "total_reservas", "atualizado_em"],
+        select(
+            reserva.refeicao_id,
+            func.sum(reserva.quantidade_pessoas),
+            func.count(reserva.id),
+            literal(datetime.utcnow(), DateTime),
+        )
+        .where(reserva.refeicao_id.in_(select(RefeicaoORM.id)))
+        .where(reserva.refeicao_id.not_in(select(contador.refeicao_id)))
+        .group_by(reserva.refeicao_id)
+    ))
+
+
+def _remover_contadores_orfaos(conn: Connection) -> None:
+    """Apaga os contadores de refeições que já não existem (ementas alteradas ou removidas)."""
+    contador = ContadorReservasRefeicaoORM
+    conn.execute(contador.__table__.delete().where(contador.refeicao_id.not_in(select(RefeicaoORM.id))))
+
+
+def _preencher_kpis_desperdicio(conn: Connection) -> None:
+    """Cria os rollups de desperdício das ementas que ainda não os têm (as leituras não escrevem)."""
+    with Session(bind=conn) as session:
+        KPISnapshotRepo(session).preencher_em_falta()
+
+
+def _em_sequencia(*passos: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    def passo(conn: Connection) -> None:
+        for p in passos:
+            p(conn)
+    return passo
+
+
+MIGRACOES: List[Migracao] = [
+    Migracao(1, "Esquema base (tabelas do modelo)", _criar_tabelas()),
+    Migracao(2, "Lotes do plano de produção: plano_producao.lote_id", _em_sequencia(
+        _criar_tabelas("lotes_plano_producao", "planos_producao_vigentes"),
+        _adicionar_coluna("plano_producao", "lote_id"),
+        _criar_indices("ix_plano_producao_lote_id"),
+    )),
+    Migracao(3, "Índices secundários em chaves estrangeiras e colunas de filtro", _criar_indices(
+        "ix_fornecedores_usuario_id",
+        "ix_fornecedores_aprovado_inscricao",
+        "ix_produtos_fornecedor_fornecedor_id",
+        "ix_ementas_periodo",
+        "ix_refeicoes_ementa_dia_tipo",
+        "ix_itens_refeicao_refeicao_id",
+        "ix_execucoes_refeicao_refeicao_data",
+        "ix_execucoes_refeicao_data",
+        "ix_reservas_refeicoes_utilizador_id",
+        "ix_reservas_refeicoes_refeicao_pessoas",
+        "ix_pedidos_fornecedores_status",
+        "ix_pedidos_fornecedores_produto_status",
+        "ix_pedidos_fornecedores_fornecedor",
+        "ix_historico_refeicoes_dia_chave",
+        "ix_historico_reservas_prato_chave",
+    )),
+    Migracao(4, "Contadores de reservas por refeição", _em_sequencia(
+        _criar_tabelas("contadores_reservas_refeicao"),
+        _preencher_contadores_reservas,
+    )),
+    Migracao(5, "Capacidade por refeição: contadores_reservas_refeicao.capacidade",
+             _adicionar_coluna("contadores_reservas_refeicao", "capacidade")),
+    Migracao(6, "Chaves de idempotência das reservas", _criar_tabelas("chaves_idempotencia")),
+    Migracao(7, "Remover contadores de reservas de refeições apagadas", _remover_contadores_orfaos),
+    Migracao(8, "Rollups de desperdício das ementas existentes", _preencher_kpis_desperdicio),
+]
+
+
+# ==== EXECUÇÃO ====
+
+# Chave (arbitrária, fixa) do advisory lock de arranque em Postgres
+_CHAVE_BLOQUEIO_ARRANQUE = 73112024
+
+
+@contextmanager
+def bloqueio_arranque(engine: Engine) -> Iterator[None]:
+    """
+    Serializa o arranque entre processos que partilham a base de dados (vários workers
+    uvicorn): em Postgres, um advisory lock de sessão; os restantes dialetos não precisam
+    (SQLite serializa as escritas no ficheiro).
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"SELECT pg_advisory_lock({_CHAVE_BLOQUEIO_ARRANQUE})")
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.exec_driver_sql(f"SELECT pg_advisory_unlock({_CHAVE_BLOQUEIO_ARRANQUE})")
+            conn.commit()
+
+
+def versao_atual(conn: Connection) -> int:
+    """Maior versão registada (0 se a base de dados ainda não tem migrações)."""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.versao))).scalar() or 0
+
+
+def aplicar_migracoes(engine: Engine) -> List[int]:
+    """
+    Aplica as migrações pendentes, cada uma na sua transação (o registo da versão
+    é feito na mesma transação do passo). Retorna as versões aplicadas.
+    Se outro processo aplicar a mesma versão em simultâneo, a inserção duplicada
+    em schema_version falha e a migração é ignorada aqui.
+    """
+    _metadata_versao.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        atual = versao_atual(conn)
+
+    aplicadas = []
+    for migracao in MIGRACOES:
+        if migracao.versao <= atual:
+            continue
+        try:
+            with engine.begin() as conn:
+                migracao.aplicar(conn)
+                conn.execute(schema_version.insert().values(
+                    versao=migracao.versao,
+                    descricao=migracao.descricao,
+                    aplicada_em=datetime.utcnow(),
+                ))
+        except IntegrityError:
+            continue
+        aplicadas.append(migracao.versao)
+        logger.info("Migração %d aplicada: %s", migracao.versao, migracao.descricao)
+    return aplicadas
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, Text, Float, DateTime
+from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, Text, Float, DateTime, Index
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -10,7 +10,12 @@ class FornecedorORM(Base):
     nome = Column(String, nullable=False)
     data_inscricao = Column(Date, nullable=False)
     aprovado = Column(Boolean, default=False, nullable=False)
-    usuario_id = Column(Integer, ForeignKey("utilizadores.id"), nullable=True)  # Vínculo com o usuário
+    usuario_id = Column(Integer, ForeignKey("utilizadores.id"), nullable=True, index=True)  # Vínculo com o usuário
+
+    __table_args__ = (
+        # Ranking de prioridade: aprovados ordenados por data de inscrição
+        Index("ix_fornecedores_aprovado_inscricao", "aprovado", "data_inscricao"),
+    )
 
     produtos = relationship("ProdutoFornecedorORM", back_populates="fornecedor", cascade="all, delete-orphan")
     usuario = relationship("UserORM", foreign_keys=[usuario_id])
@@ -18,7 +23,7 @@ class FornecedorORM(Base):
 class ProdutoFornecedorORM(Base):
     __tablename__ = "produtos_fornecedor"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    fornecedor_id = Column(Integer, ForeignKey("fornecedores.id"), nullable=False)
+    fornecedor_id = Column(Integer, ForeignKey("fornecedores.id"), nullable=False, index=True)
     nome = Column(String, nullable=False)
     tipo = Column(String, nullable=True)  # Categoria do produto: fruta, hortícola, proteína, etc.
     biologico = Column(Boolean, default=True, nullable=False)  # Indica se o produto é biológico
@@ -28,6 +33,17 @@ class ProdutoFornecedorORM(Base):
 
     fornecedor = relationship("FornecedorORM", back_populates="produtos")
 
+class IndiceIngredienteORM(Base):
+    """
+    Índice de resolução ingrediente → produto.
+    Uma linha por produto com o nome normalizado (ver normalizar_ingrediente),
+    mantida pelos repositórios de produtos e fornecedores.
+    """
+    __tablename__ = "indice_ingredientes"
+    produto_id = Column(Integer, ForeignKey("produtos_fornecedor.id"), primary_key=True)
+    nome_normalizado = Column(String, nullable=False, index=True)
+
+
 class UserORM(Base):
     __tablename__ = "utilizadores"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -44,7 +60,13 @@ class EmentaORM(Base):
     data_inicio = Column(Date, nullable=False)
     data_fim = Column(Date, nullable=False)
     
-    refeicoes = relationship("RefeicaoORM", back_populates="ementa", cascade="all, delete-orphan")
+    refeicoes = relationship("RefeicaoORM", back_populates="ementa", cascade="all, delete-orphan",
+                             order_by="RefeicaoORM.id")
+
+    __table_args__ = (
+        # Filtros por período (sobreposição e inclusão)
+        Index("ix_ementas_periodo", "data_inicio", "data_fim"),
+    )
 
 
 class RefeicaoORM(Base):
@@ -56,14 +78,20 @@ class RefeicaoORM(Base):
     descricao = Column(Text, nullable=True)
     
     ementa = relationship("EmentaORM", back_populates="refeicoes")
-    itens = relationship("ItemRefeicaoORM", back_populates="refeicao", cascade="all, delete-orphan")
+    itens = relationship("ItemRefeicaoORM", back_populates="refeicao", cascade="all, delete-orphan",
+                         order_by="ItemRefeicaoORM.id")
     execucoes = relationship("ExecucaoRefeicaoORM", back_populates="refeicao", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Refeições de uma ementa, por dia e tipo (também serve ementa_id sozinho)
+        Index("ix_refeicoes_ementa_dia_tipo", "ementa_id", "dia_semana", "tipo"),
+    )
+
 
 class ItemRefeicaoORM(Base):
     __tablename__ = "itens_refeicao"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), nullable=False)
+    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), nullable=False, index=True)
     produto_id = Column(Integer, ForeignKey("produtos_fornecedor.id"), nullable=True)
     ingrediente = Column(String, nullable=False)
     quantidade_estimada = Column(Integer, nullable=True)
@@ -83,13 +111,66 @@ class ExecucaoRefeicaoORM(Base):
 
     refeicao = relationship("RefeicaoORM", back_populates="execucoes")
 
+    __table_args__ = (
+        # Execuções de uma refeição (por data ou a mais recente)
+        Index("ix_execucoes_refeicao_refeicao_data", "refeicao_id", "data_execucao"),
+        # Execuções num intervalo de datas
+        Index("ix_execucoes_refeicao_data", "data_execucao"),
+    )
+
+
+# TABELAS DE KPI MATERIALIZADAS (mantidas por KPISnapshotRepo)
+
+class KPIRefeicaoSnapshotORM(Base):
+    """
+    Rollup de desperdício por refeição: totais de todas as execuções
+    e valores da execução mais recente.
+    """
+    __tablename__ = "kpi_refeicao_snapshot"
+    refeicao_id = Column(Integer, primary_key=True)
+    ementa_id = Column(Integer, nullable=False)
+    dia_semana = Column(Integer, nullable=False)
+    total_produzido = Column(Integer, default=0, nullable=False)
+    total_servido = Column(Integer, default=0, nullable=False)
+    total_nao_servido = Column(Integer, default=0, nullable=False)
+    soma_taxas_desperdicio = Column(Float, default=0.0, nullable=False)  # Soma das taxas das execuções com produção
+    execucoes_com_producao = Column(Integer, default=0, nullable=False)
+    ultima_execucao_id = Column(Integer, nullable=True)
+    ultima_data_execucao = Column(Date, nullable=True)
+    ultima_quantidade_produzida = Column(Integer, nullable=True)
+    ultima_quantidade_servida = Column(Integer, nullable=True)
+    ultima_quantidade_nao_servida = Column(Integer, nullable=True)
+
+
+class KPIDiaSnapshotORM(Base):
+    """Rollup de desperdício por dia de uma ementa (almoço + jantar)."""
+    __tablename__ = "kpi_dia_snapshot"
+    ementa_id = Column(Integer, primary_key=True)
+    dia_semana = Column(Integer, primary_key=True)
+    tipo_refeicao = Column(String, nullable=False)  # Ex: "almoço + jantar"
+    total_produzido = Column(Integer, default=0, nullable=False)
+    total_servido = Column(Integer, default=0, nullable=False)
+    total_nao_servido = Column(Integer, default=0, nullable=False)
+    soma_taxas_desperdicio = Column(Float, default=0.0, nullable=False)
+    execucoes_com_producao = Column(Integer, default=0, nullable=False)
+
+
+class KPIEmentaSnapshotORM(Base):
+    """Rollup de desperdício por ementa (apenas dias 1-5 com produção)."""
+    __tablename__ = "kpi_ementa_snapshot"
+    ementa_id = Column(Integer, primary_key=True)
+    ementa_nome = Column(String, nullable=False)
+    total_produzido = Column(Integer, default=0, nullable=False)
+    total_servido = Column(Integer, default=0, nullable=False)
+    total_nao_servido = Column(Integer, default=0, nullable=False)
+
 
 # TABELAS PARA APROVISIONAMENTO (REQUISITO 4)
 
 class ReservaRefeicaoORM(Base):
     __tablename__ = "reservas_refeicoes"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    utilizador_id = Column(Integer, ForeignKey("utilizadores.id"), nullable=False)
+    utilizador_id = Column(Integer, ForeignKey("utilizadores.id"), nullable=False, index=True)
     refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), nullable=False)
     data_reserva = Column(DateTime, default=datetime.utcnow, nullable=False)
     quantidade_pessoas = Column(Integer, default=1, nullable=False)
@@ -97,10 +178,74 @@ class ReservaRefeicaoORM(Base):
     refeicao = relationship("RefeicaoORM")
     utilizador = relationship("UserORM")
 
+    __table_args__ = (
+        # Cobre os totais por refeição (SUM(quantidade_pessoas) GROUP BY refeicao_id) sem ler a tabela
+        Index("ix_reservas_refeicoes_refeicao_pessoas", "refeicao_id", "quantidade_pessoas"),
+    )
+
+
+class ContadorReservasRefeicaoORM(Base):
+    """
+    Totais correntes das reservas de cada refeição, mantidos na mesma transação
+    que cria/remove as reservas (ReservaRepo). Ler os totais é uma leitura por
+    chave primária, sem agregar reservas_refeicoes.
+    capacidade: máximo de pessoas da refeição (None = sem limite); as reservas
+    só incrementam total_pessoas enquanto couberem (ReservaRepo._ocupar_lugares).
+    """
+    __tablename__ = "contadores_reservas_refeicao"
+    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), primary_key=True)
+    total_pessoas = Column(Integer, default=0, nullable=False)
+    total_reservas = Column(Integer, default=0, nullable=False)
+    capacidade = Column(Integer, nullable=True)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ChaveIdempotenciaORM(Base):
+    """
+    Chaves de idempotência (Idempotency-Key) das reservas já gravadas, por utilizador,
+    com a resposta enviada: uma repetição do pedido é respondida daqui em vez de
+    criar outra reserva. Registadas na transação da reserva; expiram ao fim de
+    IDEMPOTENCIA_TTL (idempotenciaRepo).
+    """
+    __tablename__ = "chaves_idempotencia"
+    utilizador_id = Column(Integer, ForeignKey("utilizadores.id"), primary_key=True)
+    chave = Column(String(255), primary_key=True)
+    reserva_id = Column(Integer, nullable=True)   # Sem FK: a reserva pode ser cancelada depois
+    resposta = Column(Text, nullable=False)       # JSON da ReservaRefeicaoDTO devolvida
+    criada_em = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class LotePlanoProducaoORM(Base):
+    """
+    Execução do cálculo do plano de produção para um período (versão do plano).
+    assinatura: hash das entradas (ementas + reservas) usadas no cálculo.
+    """
+    __tablename__ = "lotes_plano_producao"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data_inicio = Column(Date, nullable=False)
+    data_fim = Column(Date, nullable=False)
+    data_calculo = Column(DateTime, default=datetime.utcnow, nullable=False)
+    assinatura = Column(String, nullable=False)
+    total_produtos = Column(Integer, default=0, nullable=False)
+    produtos_com_alerta = Column(Integer, default=0, nullable=False)
+
+    itens = relationship("PlanoProducaoORM", back_populates="lote")
+
+
+class PlanoVigenteORM(Base):
+    """Versão mais recente do plano de produção de cada período."""
+    __tablename__ = "planos_producao_vigentes"
+    data_inicio = Column(Date, primary_key=True)
+    data_fim = Column(Date, primary_key=True)
+    lote_id = Column(Integer, ForeignKey("lotes_plano_producao.id"), nullable=False)
+
+    lote = relationship("LotePlanoProducaoORM")
+
 
 class PlanoProducaoORM(Base):
     __tablename__ = "plano_producao"
     id = Column(Integer, primary_key=True, autoincrement=True)
+    lote_id = Column(Integer, ForeignKey("lotes_plano_producao.id"), nullable=True, index=True)  # NULL = plano anterior aos lotes
     data_calculo = Column(DateTime, default=datetime.utcnow, nullable=False)
     produto_nome = Column(String, nullable=False)
     quantidade_prevista = Column(Integer, nullable=False)
@@ -108,6 +253,8 @@ class PlanoProducaoORM(Base):
     desvio_percentual = Column(Float, nullable=False)
     requer_alerta = Column(Boolean, default=False, nullable=False)
 
+    lote = relationship("LotePlanoProducaoORM", back_populates="itens")
+
 
 class PedidoFornecedorORM(Base):
     __tablename__ = "pedidos_fornecedores"
@@ -117,12 +264,18 @@ class PedidoFornecedorORM(Base):
     quantidade_solicitada = Column(Integer, nullable=False)
     data_pedido = Column(DateTime, default=datetime.utcnow, nullable=False)
     data_entrega_prevista = Column(Date, nullable=False)
-    status = Column(String, default="pendente", nullable=False)
+    status = Column(String, default="pendente", nullable=False, index=True)
     ordem_prioridade = Column(Integer, nullable=False)
     
     fornecedor = relationship("FornecedorORM")
     produto = relationship("ProdutoFornecedorORM")
 
+    __table_args__ = (
+        # Quantidades em aberto por produto (produto_id IN (...) AND status IN (...))
+        Index("ix_pedidos_fornecedores_produto_status", "produto_id", "status"),
+        Index("ix_pedidos_fornecedores_fornecedor", "fornecedor_id"),
+    )
+
 
 class HistoricoRefeicoesDiaORM(Base):
     """
@@ -134,7 +287,11 @@ class HistoricoRefeicoesDiaORM(Base):
     dia_semana = Column(String, nullable=False)  # "segunda", "terca", etc.
     tipo_refeicao = Column(String, nullable=False)  # "almoço" ou "jantar"
     total_refeicoes = Column(Integer, nullable=False)  # Total oferecido neste dia/tipo
-    ultima_atualizacao = Column(DateTime, default=datetime.utcnow, nullable=False)
+    ultima_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_historico_refeicoes_dia_chave", "dia_semana", "tipo_refeicao"),
+    )
 
 
 class HistoricoReservasPratoORM(Base):
@@ -150,4 +307,8 @@ class HistoricoReservasPratoORM(Base):
     descricao_prato = Column(String, nullable=False)  # Ex: "Frango grelhado", "Peixe assado"
     total_reservas = Column(Integer, nullable=False)  # Quantas vezes foi escolhido
     percentual_escolha = Column(Float, nullable=False)  # % em relação ao total do dia (0.0 a 1.0)
-    ultima_atualizacao = Column(DateTime, default=datetime.utcnow, nullable=False)
+    ultima_atualizacao = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_historico_reservas_prato_chave", "dia_semana", "tipo_refeicao", "descricao_prato"),
+    )
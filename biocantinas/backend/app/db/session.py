@@ -1,15 +1,188 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .models import Base
 import os
+import threading
+from typing import AsyncIterator, Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def _normalizar_url(url: str) -> str:
+    """postgres:// (formato de Render/Heroku) não é aceite pelo SQLAlchemy: usar postgresql://."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _url_assincrono(url: str) -> str:
+    """URL do motor assíncrono equivalente: sqlite → aiosqlite, postgresql → asyncpg."""
+    esquema, resto = url.split(":", 1)
+    if esquema == "sqlite":
+        return "sqlite+aiosqlite:" + resto
+    if esquema in ("postgresql", "postgresql+psycopg2"):
+        return "postgresql+asyncpg:" + resto
+    return url
+
+
+DB_PATH = _normalizar_url(os.getenv("BIOCANTINAS_DB_PATH", "sqlite:///biocantinas.db"))
+ASYNC_DB_PATH = _normalizar_url(os.getenv("BIOCANTINAS_ASYNC_DB_PATH", _url_assincrono(DB_PATH)))
+
+# Perfil SQLite aplicado a cada ligação nova (configurável por variáveis de ambiente).
+# WAL + synchronous=NORMAL: leituras não bloqueiam escritas (e vice-versa) e cada commit
+# não faz fsync do ficheiro principal; busy_timeout espera pelo lock em vez de falhar.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("BIOCANTINAS_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("BIOCANTINAS_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("BIOCANTINAS_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),  # bytes
+    "cache_size": int(os.getenv("BIOCANTINAS_SQLITE_CACHE_SIZE", "-65536")),  # negativo = KiB (64 MiB)
+    "busy_timeout": int(os.getenv("BIOCANTINAS_SQLITE_BUSY_TIMEOUT_MS", "5000")),  # ms
+    "temp_store": os.getenv("BIOCANTINAS_SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Perfil de produção para bases de dados servidor (Postgres), por motor e por processo:
+# com N workers uvicorn, cada um abre até 2 × (pool_size + max_overflow) ligações
+# (motor síncrono + assíncrono) — dimensionar com o max_connections do servidor.
+POOL_CONFIG = {
+    "pool_size": int(os.getenv("BIOCANTINAS_DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("BIOCANTINAS_DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("BIOCANTINAS_DB_POOL_TIMEOUT", "30")),  # s à espera de uma ligação livre
+    "pool_recycle": int(os.getenv("BIOCANTINAS_DB_POOL_RECYCLE", "1800")),  # s; antes de timeouts do servidor/proxy
+    "pool_pre_ping": os.getenv("BIOCANTINAS_DB_POOL_PRE_PING", "1") != "0",
+}
+STATEMENT_TIMEOUT_MS = int(os.getenv("BIOCANTINAS_DB_STATEMENT_TIMEOUT_MS", "30000"))
 
-DB_PATH = os.getenv("BIOCANTINAS_DB_PATH", "sqlite:///biocantinas.db")
-engine = create_engine(DB_PATH, connect_args={"check_same_thread": False} if DB_PATH.startswith("sqlite") else {})
+
+def _opcoes_motor(url: str, assincrono: bool = False) -> dict:
+    """Argumentos de create_engine/create_async_engine para o tipo de base de dados."""
+    if url.startswith("sqlite"):
+        return {} if assincrono else {"connect_args": {"check_same_thread": False}}
+    opcoes = dict(POOL_CONFIG)
+    if url.startswith("postgresql"):
+        if assincrono:  # asyncpg
+            opcoes["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+        else:  # psycopg2
+            opcoes["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+    return opcoes
+
+
+engine = create_engine(DB_PATH, **_opcoes_motor(DB_PATH))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-# Ensure tables exist
+# Motor assíncrono (mesma base de dados) para as rotas de leitura async def
+async_engine = create_async_engine(ASYNC_DB_PATH, **_opcoes_motor(ASYNC_DB_PATH, assincrono=True))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for nome, valor in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+    finally:
+        cursor.close()
+
+
+for _motor in (engine, async_engine.sync_engine):
+    if _motor.dialect.name == "sqlite":
+        event.listen(_motor, "connect", _aplicar_pragmas_sqlite)
+
+
+class EstatisticasPool:
+    """
+    Utilização do pool de ligações de um motor, neste processo: estado atual
+    (em uso, livres, overflow) e contadores acumulados a partir dos eventos do pool.
+    """
+    def __init__(self, motor: Engine):
+        self.pool = motor.pool
+        self._lock = threading.Lock()
+        self.ligacoes_criadas = 0
+        self.checkouts = 0
+        self.invalidacoes = 0
+        self.em_uso = 0
+        self.pico_em_uso = 0
+        event.listen(motor, "connect", self._ao_ligar)
+        event.listen(motor, "checkout", self._ao_requisitar)
+        event.listen(motor, "checkin", self._ao_devolver)
+        event.listen(motor, "invalidate", self._ao_invalidar)
+
+    def _ao_ligar(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.ligacoes_criadas += 1
+
+    def _ao_requisitar(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.em_uso += 1
+            self.pico_em_uso = max(self.pico_em_uso, self.em_uso)
+
+    def _ao_devolver(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.em_uso = max(self.em_uso - 1, 0)
+
+    def _ao_invalidar(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidacoes += 1
+
+    def relatorio(self) -> Dict[str, object]:
+        pool = self.pool
+        relatorio: Dict[str, object] = {"tipo": type(pool).__name__}
+        if hasattr(pool, "checkedout"):  # QueuePool e variantes
+            capacidade = pool.size() + max(pool._max_overflow, 0)
+            relatorio.update({
+                "tamanho": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "em_uso": pool.checkedout(),
+                "livres": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "utilizacao": round(pool.checkedout() / capacidade, 3) if capacidade > 0 else None,
+            })
+        with self._lock:
+            relatorio.update({
+                "pico_em_uso": self.pico_em_uso,
+                "checkouts": self.checkouts,
+                "ligacoes_criadas": self.ligacoes_criadas,
+                "invalidacoes": self.invalidacoes,
+            })
+        return relatorio
+
+
+_estatisticas_pool = {
+    "sincrono": EstatisticasPool(engine),
+    "assincrono": EstatisticasPool(async_engine.sync_engine),
+}
+
+
+def relatorio_pool() -> Dict[str, object]:
+    """Utilização dos pools dos motores síncrono e assíncrono deste processo (worker)."""
+    return {
+        "pid": os.getpid(),
+        "dialeto": engine.dialect.name,
+        **{nome: estatisticas.relatorio() for nome, estatisticas in _estatisticas_pool.items()},
+    }
+
+
+def relatorio_pragmas() -> Dict[str, object]:
+    """Valores ativos dos pragmas do perfil SQLite, lidos de uma ligação do pool."""
+    if engine.dialect.name != "sqlite":
+        return {}
+    with engine.connect() as conn:
+        return {nome: conn.exec_driver_sql(f"PRAGMA {nome}").scalar() for nome in SQLITE_PRAGMAS}
+
+# Ensure tables exist (migrações versionadas; ver migrations.py)
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    from .migrations import aplicar_migracoes, bloqueio_arranque
+    from ..repositories.indiceIngredientesRepo import IndiceIngredientesRepo
+
+    # Um worker de cada vez: os restantes esperam e encontram o esquema já atualizado
+    with bloqueio_arranque(engine):
+        aplicar_migracoes(engine)
+
+        # Índice ingrediente → produto é construído uma vez e mantido pelos repositórios
+        session = SessionLocal()
+        try:
+            IndiceIngredientesRepo(session).garantir_atualizado()
+        finally:
+            session.close()
 
 # Dependency for FastAPI
 def get_db():
@@ -18,3 +191,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency for async routes: código síncrono (repositórios/serviços) corre com db.run_sync
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,10 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, datetime
+from typing import List, Optional
 
 # Reservas de Refeições
 class ReservaRefeicaoCreate(BaseModel):
     refeicao_id: int
-    quantidade_pessoas: int = 1
+    quantidade_pessoas: int = Field(1, gt=0)
 
 class ReservaRefeicaoDTO(ReservaRefeicaoCreate):
     id: int
@@ -14,6 +15,39 @@ class ReservaRefeicaoDTO(ReservaRefeicaoCreate):
     class Config:
         from_attributes = True
 
+class ContadorReservasDTO(BaseModel):
+    refeicao_id: int
+    total_pessoas: int
+    total_reservas: int
+    capacidade: Optional[int] = None   # None = sem limite
+    atualizado_em: datetime
+
+    class Config:
+        from_attributes = True
+
+class CapacidadeRefeicaoUpdate(BaseModel):
+    capacidade: Optional[int] = Field(None, ge=0)
+
+# Reservas em lote (semana inteira, turma)
+MAX_RESERVAS_LOTE = 500
+
+class ReservaLoteCreate(BaseModel):
+    reservas: List[ReservaRefeicaoCreate] = Field(..., min_length=1, max_length=MAX_RESERVAS_LOTE)
+
+class ResultadoReservaLoteDTO(BaseModel):
+    indice: int                    # Posição do item no pedido
+    refeicao_id: int
+    quantidade_pessoas: int
+    sucesso: bool
+    reserva: Optional[ReservaRefeicaoDTO] = None
+    erro: Optional[str] = None
+
+class ReservaLoteResultadoDTO(BaseModel):
+    total: int
+    criadas: int
+    falhadas: int
+    resultados: List[ResultadoReservaLoteDTO]
+
 
 # Plano de Produção
 class PlanoProducaoDTO(BaseModel):
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date
 
 class IngredienteKPIDTO(BaseModel):
     nome: str
@@ -73,3 +74,19 @@ class KPIConsolidadoDTO(BaseModel):
     total_produzido: int
     total_servido: int
     total_nao_servido: int
+
+# ==== KPI EM LOTE (VÁRIAS EMENTAS) ====
+
+class KPIEmentaLoteDTO(BaseModel):
+    ementa_id: int
+    ementa_nome: str
+    data_inicio: date
+    data_fim: date
+    consolidado: KPIConsolidadoDTO
+    biologico: EmentaKPIDTO
+    desperdicio: DesperdícioEmentaDTO
+
+class KPILoteDTO(BaseModel):
+    total: int
+    ementas: List[KPIEmentaLoteDTO]
+    ementas_nao_encontradas: List[int] = []
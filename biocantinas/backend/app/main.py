@@ -1,4 +1,9 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from .db.session import init_db, relatorio_pragmas, relatorio_pool, async_engine
+from .services.userService import pool_hash
+from .services.reservaService import fila_reservas
 from .controllers.fornecedorController import router as fornecedores_router
 from .controllers.produtoController import router as produtos_router
 from .controllers.authController import router as auth_router
@@ -7,7 +12,24 @@ from .controllers.aprovisionamentoController import router as aprovisionamento_r
 from .controllers.execucaoRefeicaoController import router as execucoes_router
 from .controllers.kpiController import router as kpi_router
 
-app = FastAPI(title="BioCantinas - Fornecedores")
+# Sem configuração do servidor, mostrar as mensagens INFO da aplicação (migrações, perfil SQLite)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(name)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	# Criar/atualizar o esquema uma vez no arranque (os serviços usam a sessão de cada pedido)
+	init_db()
+	pragmas = relatorio_pragmas()
+	if pragmas:
+		logger.info("SQLite: %s", ", ".join(f"{nome}={valor}" for nome, valor in pragmas.items()))
+	fila_reservas.iniciar()
+	yield
+	fila_reservas.parar()
+	await async_engine.dispose()
+
+
+app = FastAPI(title="BioCantinas - Fornecedores", lifespan=lifespan)
 
 
 @app.get("/")
@@ -19,6 +41,26 @@ def root():
 def health():
 	return {"status": "ok"}
 
+
+@app.get("/health/db")
+def health_db():
+	return {"status": "ok", "sqlite_pragmas": relatorio_pragmas()}
+
+
+@app.get("/health/db/pool")
+def health_db_pool():
+	return relatorio_pool()
+
+
+@app.get("/health/auth/hash")
+def health_auth_hash():
+	return pool_hash.relatorio()
+
+
+@app.get("/health/reservas/fila")
+def health_reservas_fila():
+	return fila_reservas.relatorio()
+
 # Controllers/Routers
 app.include_router(fornecedores_router, prefix="")
 app.include_router(produtos_router, prefix="")
@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass(frozen=True, slots=True)
+class CandidatoFornecimento:
+    """Produto de um fornecedor aprovado que pode entregar na data pedida."""
+    produto_id: int
+    fornecedor_id: int
+    fornecedor_nome: str
+    ordem_prioridade: int          # Posição do fornecedor por data_inscricao (1 = mais antigo)
+    capacidade_disponivel: int     # Capacidade do produto menos pedidos em aberto
+
+
+@dataclass(frozen=True, slots=True)
+class LinhaAlocacao:
+    produto: str
+    produto_id: int
+    fornecedor_id: int
+    fornecedor_nome: str
+    ordem_prioridade: int
+    quantidade: int
+
+
+@dataclass
+class ResultadoAlocacao:
+    linhas: List[LinhaAlocacao] = field(default_factory=list)
+    faltas: Dict[str, int] = field(default_factory=dict)   # produto → quantidade sem fornecedor
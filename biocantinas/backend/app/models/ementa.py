@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from datetime import date
-from typing import List
+from typing import List, Tuple
 
 
 @dataclass
@@ -25,3 +25,30 @@ class EmentaModel:
     data_inicio: date
     data_fim: date
     refeicoes: List[RefeicaoModel] = field(default_factory=list)
+
+
+# Estruturas só de leitura para o aprovisionamento (ver EmentaRepo.carregar_grafo_por_periodo)
+
+@dataclass(frozen=True, slots=True)
+class ItemRefeicaoLeitura:
+    ingrediente: str
+    produto_id: int | None
+    quantidade_estimada: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class RefeicaoLeitura:
+    id: int
+    dia_semana: int  # 1=Segunda, 2=Terça, 3=Quarta, 4=Quinta, 5=Sexta
+    tipo: str  # "almoço" ou "jantar"
+    descricao: str | None
+    itens: Tuple[ItemRefeicaoLeitura, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class EmentaLeitura:
+    id: int
+    nome: str
+    data_inicio: date
+    data_fim: date
+    refeicoes: Tuple[RefeicaoLeitura, ...]
@@ -1,13 +1,26 @@
 from typing import List, Optional
 from datetime import date
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from ..db.models import EmentaORM, RefeicaoORM, ItemRefeicaoORM
-from ..models.ementa import EmentaModel, RefeicaoModel, ItemRefeicaoModel
+from ..models.ementa import (
+    EmentaModel, RefeicaoModel, ItemRefeicaoModel,
+    EmentaLeitura, RefeicaoLeitura, ItemRefeicaoLeitura
+)
+from .kpiSnapshotRepo import KPISnapshotRepo
+from .reservaRepo import ReservaRepo
+
+
+class EmentaComReservas(ValueError):
+    """A alteração removeria refeições que já têm reservas."""
 
 
 class EmentaRepo:
     def __init__(self, session: Session):
         self.session = session
+        self.kpi_snapshot = KPISnapshotRepo(session)
+        self.reservas = ReservaRepo(session)
 
     def criar_ementa(self, model: EmentaModel) -> EmentaModel:
         orm = EmentaORM(
@@ -38,6 +51,8 @@ class EmentaRepo:
             orm.refeicoes.append(refeicao_orm)
         
         self.session.add(orm)
+        self.session.flush()
+        self.kpi_snapshot.recalcular_ementa(orm.id)
         self.session.commit()
         self.session.refresh(orm)
         
@@ -61,19 +76,20 @@ class EmentaRepo:
         orm.data_inicio = model.data_inicio
         orm.data_fim = model.data_fim
         
-        # Remover refeições antigas e criar novas
-        # (simplificado - em produção, considerar update inteligente)
+        # Atualizar as refeições no lugar, emparelhadas por (dia_semana, tipo): mantêm o
+        # id e, com ele, as reservas, a capacidade e as execuções
+        existentes = {}
         for ref in orm.refeicoes:
-            self.session.delete(ref)
+            existentes.setdefault((ref.dia_semana, ref.tipo), []).append(ref)
         
-        orm.refeicoes = []
+        refeicoes = []
         for ref in model.refeicoes:
-            refeicao_orm = RefeicaoORM(
+            candidatas = existentes.get((ref.dia_semana, ref.tipo))
+            refeicao_orm = candidatas.pop(0) if candidatas else RefeicaoORM(
                 dia_semana=ref.dia_semana,
                 tipo=ref.tipo,
-                descricao=ref.descricao,
             )
-            
+            refeicao_orm.descricao = ref.descricao
             refeicao_orm.itens = [
                 ItemRefeicaoORM(
                     produto_id=item.produto_id,
@@ -82,9 +98,16 @@ class EmentaRepo:
                 )
                 for item in ref.itens
             ]
-            
-            orm.refeicoes.append(refeicao_orm)
+            refeicoes.append(refeicao_orm)
         
+        removidas = [ref.id for candidatas in existentes.values() for ref in candidatas]
+        self._garantir_sem_reservas(removidas)
+        self.reservas.remover_contadores(removidas)
+        orm.refeicoes = refeicoes
+        
+        # Itens (e execuções das refeições removidas) mudaram: recalcular KPIs
+        self.session.flush()
+        self.kpi_snapshot.recalcular_ementa(orm.id)
         self.session.commit()
         self.session.refresh(orm)
         return self._to_model(orm)
@@ -94,10 +117,23 @@ class EmentaRepo:
         if not orm:
             return False
         
+        refeicao_ids = [ref.id for ref in orm.refeicoes]
+        self._garantir_sem_reservas(refeicao_ids)
+        self.kpi_snapshot.remover_ementa(ementa_id)
+        self.reservas.remover_contadores(refeicao_ids)
         self.session.delete(orm)
         self.session.commit()
         return True
 
+    def _garantir_sem_reservas(self, refeicao_ids: List[int]) -> None:
+        """As reservas dos alunos nunca são apagadas implicitamente: recusa remover refeições reservadas."""
+        reservadas = self.reservas.refeicoes_com_reservas(refeicao_ids)
+        if reservadas:
+            self.session.rollback()
+            raise EmentaComReservas(
+                f"As refeições {sorted(reservadas)} têm reservas; cancele-as antes de as remover"
+            )
+
     def listar_por_periodo(self, data_inicio: date, data_fim: date) -> List[EmentaORM]:
         """
         Retorna todas as ementas que se sobrepõem ao período especificado.
@@ -110,7 +146,59 @@ class EmentaRepo:
             EmentaORM.data_fim >= data_inicio
         ).all()
 
-    def _to_model(self, orm: EmentaORM) -> EmentaModel:
+    def carregar_grafo_por_periodo(self, data_inicio: date, data_fim: date) -> List[EmentaLeitura]:
+        """
+        Como listar_por_periodo, mas carrega todo o grafo ementa → refeição → item
+        numa única consulta e devolve estruturas só de leitura (sem lazy loads).
+        """
+        linhas = (
+            self.session.query(
+                EmentaORM.id, EmentaORM.nome, EmentaORM.data_inicio, EmentaORM.data_fim,
+                RefeicaoORM.id, RefeicaoORM.dia_semana, RefeicaoORM.tipo, RefeicaoORM.descricao,
+                ItemRefeicaoORM.id, ItemRefeicaoORM.ingrediente, ItemRefeicaoORM.produto_id,
+                ItemRefeicaoORM.quantidade_estimada,
+            )
+            .outerjoin(RefeicaoORM, RefeicaoORM.ementa_id == EmentaORM.id)
+            .outerjoin(ItemRefeicaoORM, ItemRefeicaoORM.refeicao_id == RefeicaoORM.id)
+            .filter(
+                EmentaORM.data_inicio <= data_fim,
+                EmentaORM.data_fim >= data_inicio
+            )
+            .order_by(EmentaORM.id, RefeicaoORM.id, ItemRefeicaoORM.id)
+            .all()
+        )
+        
+        ementas = {}
+        refeicoes = {}
+        itens = {}
+        for (ementa_id, nome, inicio, fim, refeicao_id, dia_semana, tipo, descricao,
+             item_id, ingrediente, produto_id, quantidade) in linhas:
+            ementas.setdefault(ementa_id, (nome, inicio, fim, []))
+            if refeicao_id is None:
+                continue
+            if refeicao_id not in refeicoes:
+                refeicoes[refeicao_id] = (dia_semana, tipo, descricao)
+                ementas[ementa_id][3].append(refeicao_id)
+                itens[refeicao_id] = []
+            if item_id is not None:
+                itens[refeicao_id].append(ItemRefeicaoLeitura(ingrediente, produto_id, quantidade))
+        
+        return [
+            EmentaLeitura(
+                id=ementa_id,
+                nome=nome,
+                data_inicio=inicio,
+                data_fim=fim,
+                refeicoes=tuple(
+                    RefeicaoLeitura(rid, *refeicoes[rid], itens=tuple(itens[rid]))
+                    for rid in refeicao_ids
+                ),
+            )
+            for ementa_id, (nome, inicio, fim, refeicao_ids) in ementas.items()
+        ]
+
+    @staticmethod
+    def _to_model(orm: EmentaORM) -> EmentaModel:
         refeicoes = []
         for ref_orm in orm.refeicoes:
             itens = [
@@ -136,3 +224,25 @@ class EmentaRepo:
             data_fim=orm.data_fim,
             refeicoes=refeicoes,
         )
+
+
+class EmentaRepoAsync:
+    """
+    Leituras de EmentaRepo para rotas assíncronas (AsyncSession).
+    Refeições e itens são carregados com selectinload: sem lazy loads depois do await.
+    """
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def _consulta(self):
+        return select(EmentaORM).options(
+            selectinload(EmentaORM.refeicoes).selectinload(RefeicaoORM.itens)
+        )
+
+    async def listar_ementas(self) -> List[EmentaModel]:
+        results = await self.session.scalars(self._consulta().order_by(EmentaORM.id))
+        return [EmentaRepo._to_model(orm) for orm in results]
+
+    async def obter_ementa(self, ementa_id: int) -> Optional[EmentaModel]:
+        orm = await self.session.scalar(self._consulta().where(EmentaORM.id == ementa_id))
+        return EmentaRepo._to_model(orm) if orm else None
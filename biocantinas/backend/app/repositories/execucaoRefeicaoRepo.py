@@ -3,11 +3,13 @@ from sqlalchemy.orm import Session
 from datetime import date
 from ..db.models import ExecucaoRefeicaoORM
 from ..models.execucaoRefeicao import ExecucaoRefeicaoModel
+from .kpiSnapshotRepo import KPISnapshotRepo
 
 
 class ExecucaoRefeicaoRepo:
     def __init__(self, session: Session):
         self.session = session
+        self.kpi_snapshot = KPISnapshotRepo(session)
 
     def criar(self, model: ExecucaoRefeicaoModel) -> ExecucaoRefeicaoModel:
         orm = ExecucaoRefeicaoORM(
@@ -18,6 +20,8 @@ class ExecucaoRefeicaoRepo:
             quantidade_nao_servida=model.quantidade_nao_servida,
         )
         self.session.add(orm)
+        self.session.flush()
+        self.kpi_snapshot.aplicar_execucao(orm, +1)
         self.session.commit()
         self.session.refresh(orm)
         model.id = orm.id
@@ -40,6 +44,7 @@ class ExecucaoRefeicaoRepo:
         orm = self.session.get(ExecucaoRefeicaoORM, execucao_id)
         if not orm:
             return False
+        self.kpi_snapshot.aplicar_execucao(orm, -1)
         self.session.delete(orm)
         self.session.commit()
         return True
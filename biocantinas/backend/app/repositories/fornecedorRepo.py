@@ -1,12 +1,16 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from ..db.models import FornecedorORM, ProdutoFornecedorORM
 from ..models.fornecedor import FornecedorModel
 from ..models.produto import ProdutoFornecedorModel
+from .indiceIngredientesRepo import IndiceIngredientesRepo
 
 class FornecedorRepo:
 	def __init__(self, session: Session):
 		self.session = session
+		self.indice = IndiceIngredientesRepo(session)
 
 	def criar_fornecedor(self, model: FornecedorModel) -> FornecedorModel:
 		orm = FornecedorORM(
@@ -27,6 +31,9 @@ class FornecedorRepo:
 			for p in model.produtos
 		]
 		self.session.add(orm)
+		self.session.flush()
+		for produto in orm.produtos:
+			self.indice.registar_produto(produto)
 		self.session.commit()
 		self.session.refresh(orm)
 		model.id = orm.id
@@ -40,6 +47,15 @@ class FornecedorRepo:
 		orm = self.session.get(FornecedorORM, fid)
 		return self._to_model(orm) if orm else None
 
+	def obter_por_usuario_id(self, usuario_id: int) -> Optional[FornecedorModel]:
+		orm = (
+			self.session.query(FornecedorORM)
+			.filter(FornecedorORM.usuario_id == usuario_id)
+			.order_by(FornecedorORM.id)
+			.first()
+		)
+		return self._to_model(orm) if orm else None
+
 	def atualizar_fornecedor(self, f: FornecedorModel) -> None:
 		orm = self.session.get(FornecedorORM, f.id)
 		if not orm:
@@ -50,7 +66,8 @@ class FornecedorRepo:
 		orm.usuario_id = f.usuario_id
 		self.session.commit()
 
-	def _to_model(self, orm: FornecedorORM) -> FornecedorModel:
+	@staticmethod
+	def _to_model(orm: FornecedorORM) -> FornecedorModel:
 		produtos = [
 			ProdutoFornecedorModel(
 				nome=p.nome,
@@ -70,3 +87,29 @@ class FornecedorRepo:
 			aprovado=orm.aprovado,
 			usuario_id=orm.usuario_id,
 		)
+
+
+class FornecedorRepoAsync:
+	"""Leituras de FornecedorRepo para rotas assíncronas (produtos carregados com selectinload)."""
+	def __init__(self, session: AsyncSession):
+		self.session = session
+
+	def _consulta(self):
+		return select(FornecedorORM).options(selectinload(FornecedorORM.produtos))
+
+	async def listar_fornecedores(self) -> List[FornecedorModel]:
+		results = await self.session.scalars(self._consulta().order_by(FornecedorORM.id))
+		return [FornecedorRepo._to_model(orm) for orm in results]
+
+	async def obter_fornecedor(self, fid: int) -> Optional[FornecedorModel]:
+		orm = await self.session.scalar(self._consulta().where(FornecedorORM.id == fid))
+		return FornecedorRepo._to_model(orm) if orm else None
+
+	async def obter_por_usuario_id(self, usuario_id: int) -> Optional[FornecedorModel]:
+		orm = await self.session.scalar(
+			self._consulta()
+			.where(FornecedorORM.usuario_id == usuario_id)
+			.order_by(FornecedorORM.id)
+			.limit(1)
+		)
+		return FornecedorRepo._to_model(orm) if orm else None
@@ -1,81 +1,148 @@
-from typing import Optional, List, Dict
+import threading
+from typing import Optional, List, Dict, Tuple
+from sqlalchemy import event, func, select
 from sqlalchemy.orm import Session
 from ..db.models import HistoricoRefeicoesDiaORM, HistoricoReservasPratoORM
 
 
+class TabelaHistorico:
+    """
+    Histórico carregado em memória, indexado por chave:
+    - totais: (dia, tipo) → total_refeicoes
+    - pratos: (dia, tipo, prato) → (total_reservas, percentual_escolha)
+    - distribuicao: (dia, tipo) → [{"prato", "percentual", "reservas"}, ...]
+
+    Em chaves repetidas prevalece o registo com menor id (como o .first() das consultas).
+    """
+    def __init__(self, dias: List[tuple], pratos: List[tuple]):
+        self.totais: Dict[Tuple[str, str], int] = {}
+        for dia, tipo, total in dias:
+            self.totais.setdefault((dia, tipo), total)
+
+        self.pratos: Dict[Tuple[str, str, str], Tuple[int, float]] = {}
+        self.distribuicao: Dict[Tuple[str, str], List[Dict]] = {}
+        for dia, tipo, prato, reservas, percentual in pratos:
+            self.pratos.setdefault((dia, tipo, prato), (reservas, percentual))
+            self.distribuicao.setdefault((dia, tipo), []).append({
+                "prato": prato,
+                "percentual": percentual,
+                "reservas": reservas
+            })
+
+    def total_refeicoes(self, dia_semana: str, tipo_refeicao: str) -> Optional[int]:
+        return self.totais.get((dia_semana.lower(), tipo_refeicao.lower()))
+
+    def reservas_prato(self, dia_semana: str, tipo_refeicao: str, descricao_prato: str) -> Optional[int]:
+        registo = self.pratos.get((dia_semana.lower(), tipo_refeicao.lower(), descricao_prato))
+        return registo[0] if registo else None
+
+    def percentual_prato(self, dia_semana: str, tipo_refeicao: str, descricao_prato: str) -> Optional[float]:
+        registo = self.pratos.get((dia_semana.lower(), tipo_refeicao.lower(), descricao_prato))
+        return registo[1] if registo else None
+
+    def distribuicao_pratos(self, dia_semana: str, tipo_refeicao: str) -> List[Dict]:
+        return [dict(d) for d in self.distribuicao.get((dia_semana.lower(), tipo_refeicao.lower()), [])]
+
+
+# Cache do histórico partilhada pelo processo: (assinatura, tabela)
+_cache_historico: Optional[Tuple[tuple, TabelaHistorico]] = None
+_cache_lock = threading.Lock()
+
+
+def invalidar_cache_historico() -> None:
+    """Descarta a tabela em memória. Chamar sempre que o histórico for reescrito."""
+    global _cache_historico
+    with _cache_lock:
+        _cache_historico = None
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidar_ao_escrever_historico(session, flush_context):
+    """Escritas ORM no histórico (neste processo) invalidam a tabela em memória."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (HistoricoRefeicoesDiaORM, HistoricoReservasPratoORM)):
+            invalidar_cache_historico()
+            return
+
+
 class HistoricoReservasRepo:
     """
     Repositório para dados históricos de refeições e reservas.
     Combina informações de 2 tabelas:
     - historico_refeicoes_dia: Total de refeições por dia/tipo
     - historico_reservas_prato: Distribuição de escolha por prato
+
+    As consultas são servidas por uma TabelaHistorico em memória, carregada uma vez
+    e recarregada quando o histórico muda (invalidar_cache_historico ou alteração
+    da assinatura das tabelas, e.g. escrita feita por outro processo).
     """
     def __init__(self, session: Session):
         self.session = session
-    
+
+    def obter_tabela(self) -> TabelaHistorico:
+        """Retorna a tabela do histórico em memória, recarregando-a se estiver desatualizada."""
+        global _cache_historico
+        assinatura = self._assinatura()
+        with _cache_lock:
+            if _cache_historico is not None and _cache_historico[0] == assinatura:
+                return _cache_historico[1]
+
+        dias = self.session.execute(
+            select(
+                HistoricoRefeicoesDiaORM.dia_semana,
+                HistoricoRefeicoesDiaORM.tipo_refeicao,
+                HistoricoRefeicoesDiaORM.total_refeicoes
+            ).order_by(HistoricoRefeicoesDiaORM.id)
+        ).all()
+        pratos = self.session.execute(
+            select(
+                HistoricoReservasPratoORM.dia_semana,
+                HistoricoReservasPratoORM.tipo_refeicao,
+                HistoricoReservasPratoORM.descricao_prato,
+                HistoricoReservasPratoORM.total_reservas,
+                HistoricoReservasPratoORM.percentual_escolha
+            ).order_by(HistoricoReservasPratoORM.id)
+        ).all()
+        tabela = TabelaHistorico(dias, pratos)
+
+        with _cache_lock:
+            _cache_historico = (assinatura, tabela)
+        return tabela
+
     def obter_total_refeicoes(self, dia_semana: str, tipo_refeicao: str) -> Optional[int]:
         """
         Retorna o total de refeições oferecidas para um dia e tipo.
         Ex: obter_total_refeicoes("segunda", "almoço") -> 200
         """
-        historico = self.session.query(HistoricoRefeicoesDiaORM).filter(
-            HistoricoRefeicoesDiaORM.dia_semana == dia_semana.lower(),
-            HistoricoRefeicoesDiaORM.tipo_refeicao == tipo_refeicao.lower()
-        ).first()
-        
-        return historico.total_refeicoes if historico else None
-    
+        return self.obter_tabela().total_refeicoes(dia_semana, tipo_refeicao)
+
     def obter_distribuicao_pratos(self, dia_semana: str, tipo_refeicao: str) -> List[Dict]:
         """
         Retorna a distribuição de pratos para um dia/tipo.
         Retorna: [{"prato": "Frango", "percentual": 0.475, "reservas": 95}, ...]
         """
-        historicos = self.session.query(HistoricoReservasPratoORM).filter(
-            HistoricoReservasPratoORM.dia_semana == dia_semana.lower(),
-            HistoricoReservasPratoORM.tipo_refeicao == tipo_refeicao.lower()
-        ).all()
-        
-        return [
-            {
-                "prato": h.descricao_prato,
-                "percentual": h.percentual_escolha,
-                "reservas": h.total_reservas
-            }
-            for h in historicos
-        ]
-    
-    def obter_percentual_prato(self, dia_semana: str, tipo_refeicao: str, 
+        return self.obter_tabela().distribuicao_pratos(dia_semana, tipo_refeicao)
+
+    def obter_percentual_prato(self, dia_semana: str, tipo_refeicao: str,
                                descricao_prato: str) -> Optional[float]:
         """
         Retorna o % de escolha de um prato específico em um dia/tipo.
         Ex: obter_percentual_prato("segunda", "almoço", "Frango") -> 0.475 (47.5%)
         """
-        historico = self.session.query(HistoricoReservasPratoORM).filter(
-            HistoricoReservasPratoORM.dia_semana == dia_semana.lower(),
-            HistoricoReservasPratoORM.tipo_refeicao == tipo_refeicao.lower(),
-            HistoricoReservasPratoORM.descricao_prato == descricao_prato
-        ).first()
-        
-        return historico.percentual_escolha if historico else None
-    
-    def obter_reservas_prato(self, dia_semana: str, tipo_refeicao: str, 
+        return self.obter_tabela().percentual_prato(dia_semana, tipo_refeicao, descricao_prato)
+
+    def obter_reservas_prato(self, dia_semana: str, tipo_refeicao: str,
                             descricao_prato: str) -> Optional[int]:
         """
         Retorna o número de reservas de um prato específico em um dia/tipo.
         Ex: obter_reservas_prato("segunda", "almoço", "Frango grelhado") -> 90
         """
-        historico = self.session.query(HistoricoReservasPratoORM).filter(
-            HistoricoReservasPratoORM.dia_semana == dia_semana.lower(),
-            HistoricoReservasPratoORM.tipo_refeicao == tipo_refeicao.lower(),
-            HistoricoReservasPratoORM.descricao_prato == descricao_prato
-        ).first()
-        
-        return historico.total_reservas if historico else None
-    
+        return self.obter_tabela().reservas_prato(dia_semana, tipo_refeicao, descricao_prato)
+
     def listar_todos_dias(self) -> List[HistoricoRefeicoesDiaORM]:
         """Retorna todos os registros de totais por dia."""
         return self.session.query(HistoricoRefeicoesDiaORM).all()
-    
+
     def listar_todos_pratos(self) -> List[HistoricoReservasPratoORM]:
         """Retorna todos os registros de distribuição de pratos."""
         return self.session.query(HistoricoReservasPratoORM).order_by(
@@ -83,3 +150,15 @@ class HistoricoReservasRepo:
             HistoricoReservasPratoORM.tipo_refeicao,
             HistoricoReservasPratoORM.percentual_escolha.desc()
         ).all()
+
+    def _assinatura(self) -> tuple:
+        """Contagem, maior id e última atualização de cada tabela (numa consulta)."""
+        def resumo(modelo):
+            return (
+                select(func.count(modelo.id)).scalar_subquery(),
+                select(func.max(modelo.id)).scalar_subquery(),
+                select(func.max(modelo.ultima_atualizacao)).scalar_subquery(),
+            )
+        return tuple(self.session.execute(
+            select(*resumo(HistoricoRefeicoesDiaORM), *resumo(HistoricoReservasPratoORM))
+        ).one())
@@ -0,0 +1,72 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..db.models import ChaveIdempotenciaORM
+
+# Durante quanto tempo uma repetição do pedido é respondida a partir da chave guardada
+IDEMPOTENCIA_TTL = timedelta(seconds=int(os.getenv("BIOCANTINAS_IDEMPOTENCIA_TTL", str(24 * 60 * 60))))
+
+
+def _limite_validade() -> datetime:
+    return datetime.utcnow() - IDEMPOTENCIA_TTL
+
+
+class IdempotenciaRepo:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def registar(self, chaves: Iterable[Tuple[int, str, Optional[int], str]]) -> None:
+        """
+        Regista (utilizador_id, chave, reserva_id, resposta) na transação corrente (sem commit).
+        Chaves expiradas iguais são substituídas; uma chave ainda válida repetida
+        falha com IntegrityError (chave primária) e a transação deve ser desfeita.
+        """
+        linhas = [
+            {"utilizador_id": u, "chave": c, "reserva_id": r, "resposta": resposta, "criada_em": datetime.utcnow()}
+            for u, c, r, resposta in chaves
+        ]
+        if not linhas:
+            return
+        self.session.execute(
+            delete(ChaveIdempotenciaORM)
+            .where(or_(*(
+                and_(ChaveIdempotenciaORM.utilizador_id == l["utilizador_id"], ChaveIdempotenciaORM.chave == l["chave"])
+                for l in linhas
+            )))
+            .where(ChaveIdempotenciaORM.criada_em < _limite_validade())
+        )
+        self.session.execute(insert(ChaveIdempotenciaORM), linhas)
+
+    def obter(self, utilizador_id: int, chave: str) -> Optional[ChaveIdempotenciaORM]:
+        """Registo ainda válido da chave do utilizador, se existir."""
+        return self.session.scalar(
+            select(ChaveIdempotenciaORM)
+            .where(ChaveIdempotenciaORM.utilizador_id == utilizador_id)
+            .where(ChaveIdempotenciaORM.chave == chave)
+            .where(ChaveIdempotenciaORM.criada_em >= _limite_validade())
+        )
+
+    def remover_expiradas(self) -> int:
+        """Apaga as chaves com mais de IDEMPOTENCIA_TTL (pelo índice de criada_em). Retorna quantas."""
+        removidas = self.session.execute(
+            delete(ChaveIdempotenciaORM).where(ChaveIdempotenciaORM.criada_em < _limite_validade())
+        ).rowcount
+        self.session.commit()
+        return removidas
+
+
+class IdempotenciaRepoAsync:
+    """Leituras de IdempotenciaRepo para rotas assíncronas (AsyncSession)."""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def obter(self, utilizador_id: int, chave: str) -> Optional[ChaveIdempotenciaORM]:
+        return await self.session.scalar(
+            select(ChaveIdempotenciaORM)
+            .where(ChaveIdempotenciaORM.utilizador_id == utilizador_id)
+            .where(ChaveIdempotenciaORM.chave == chave)
+            .where(ChaveIdempotenciaORM.criada_em >= _limite_validade())
+        )
@@ -0,0 +1,92 @@
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db.models import IndiceIngredienteORM, ProdutoFornecedorORM
+
+
+def normalizar_ingrediente(nome: str) -> str:
+    """Normaliza um nome de ingrediente/produto: sem espaços extra e sem distinção de maiúsculas."""
+    return " ".join((nome or "").split()).casefold()
+
+
+class IndiceIngredientesRepo:
+    """
+    Repositório do índice ingrediente → produto.
+    Quando vários produtos têm o mesmo nome normalizado, a resolução devolve
+    sempre o de menor id, para que KPIs, aprovisionamento e pedidos obtenham
+    a mesma resposta.
+    """
+    def __init__(self, session: Session):
+        self.session = session
+
+    def registar_produto(self, produto: ProdutoFornecedorORM) -> None:
+        """Cria ou atualiza a entrada de um produto (sem commit; o produto já deve ter id)."""
+        self.session.merge(IndiceIngredienteORM(
+            produto_id=produto.id,
+            nome_normalizado=normalizar_ingrediente(produto.nome),
+        ))
+
+    def remover_produto(self, produto_id: int) -> None:
+        """Remove a entrada de um produto (sem commit)."""
+        self.session.query(IndiceIngredienteORM).filter(
+            IndiceIngredienteORM.produto_id == produto_id
+        ).delete(synchronize_session=False)
+
+    def reconstruir(self) -> int:
+        """Reconstrói o índice inteiro a partir de produtos_fornecedor. Retorna nº de entradas."""
+        produtos = self.session.query(ProdutoFornecedorORM.id, ProdutoFornecedorORM.nome).all()
+        self.session.query(IndiceIngredienteORM).delete(synchronize_session=False)
+        self.session.add_all([
+            IndiceIngredienteORM(produto_id=pid, nome_normalizado=normalizar_ingrediente(nome))
+            for pid, nome in produtos
+        ])
+        self.session.commit()
+        return len(produtos)
+
+    def garantir_atualizado(self) -> bool:
+        """
+        Reconstrói o índice se não corresponder ao catálogo atual
+        (ex: produtos inseridos diretamente por scripts). Retorna True se reconstruiu.
+        """
+        esperado = {
+            pid: normalizar_ingrediente(nome)
+            for pid, nome in self.session.query(ProdutoFornecedorORM.id, ProdutoFornecedorORM.nome)
+        }
+        atual = dict(self.session.query(
+            IndiceIngredienteORM.produto_id, IndiceIngredienteORM.nome_normalizado
+        ))
+        if esperado == atual:
+            return False
+        self.reconstruir()
+        return True
+
+    def resolver(self, ingrediente: str) -> Optional[int]:
+        """Retorna o id do produto correspondente ao ingrediente, ou None."""
+        return self.session.query(func.min(IndiceIngredienteORM.produto_id)).filter(
+            IndiceIngredienteORM.nome_normalizado == normalizar_ingrediente(ingrediente)
+        ).scalar()
+
+    def resolver_produtos(self, ingredientes: Iterable[str]) -> Dict[str, ProdutoFornecedorORM]:
+        """
+        Resolve vários ingredientes numa única consulta.
+        Retorna: {nome_normalizado: ProdutoFornecedorORM} apenas para os encontrados
+        """
+        nomes = {normalizar_ingrediente(i) for i in ingredientes}
+        if not nomes:
+            return {}
+
+        escolhidos = (
+            self.session.query(
+                IndiceIngredienteORM.nome_normalizado,
+                func.min(IndiceIngredienteORM.produto_id).label("produto_id"),
+            )
+            .filter(IndiceIngredienteORM.nome_normalizado.in_(nomes))
+            .group_by(IndiceIngredienteORM.nome_normalizado)
+            .subquery()
+        )
+        resultados = (
+            self.session.query(escolhidos.c.nome_normalizado, ProdutoFornecedorORM)
+            .join(ProdutoFornecedorORM, ProdutoFornecedorORM.id == escolhidos.c.produto_id)
+            .all()
+        )
+        return {nome: produto for nome, produto in resultados}
@@ -0,0 +1,301 @@
+from typing import Dict, List, Optional
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from ..db.models import (
+    EmentaORM, RefeicaoORM, ExecucaoRefeicaoORM,
+    KPIRefeicaoSnapshotORM, KPIDiaSnapshotORM, KPIEmentaSnapshotORM
+)
+
+
+_TOTAIS = ("total_produzido", "total_servido", "total_nao_servido")
+
+
+class KPISnapshotRepo:
+    """
+    Repositório das tabelas de KPI materializadas (desperdício).
+
+    - kpi_refeicao_snapshot: totais por refeição + execução mais recente
+    - kpi_dia_snapshot: totais por (ementa, dia da semana)
+    - kpi_ementa_snapshot: totais por ementa
+
+    As escritas em execuções aplicam apenas a diferença (aplicar_execucao);
+    alterações às refeições de uma ementa recalculam essa ementa (recalcular_ementa).
+    Os métodos de escrita não fazem commit: a atualização fica na transação de
+    quem escreve. As leituras não escrevem: os rollups das ementas existentes são
+    preenchidos pela migração 8 (e por preencher_em_falta após cargas diretas); uma
+    ementa ainda sem rollup é calculada em memória, sem a gravar.
+    """
+    def __init__(self, session: Session):
+        self.session = session
+
+    # ==== ESCRITA ====
+
+    def aplicar_execucao(self, execucao: ExecucaoRefeicaoORM, sinal: int) -> None:
+        """
+        Aplica uma execução criada (sinal=+1) ou a remover (sinal=-1) aos rollups.
+        A execução já deve ter id (flush feito).
+
+        Os totais são somados em SQL (UPDATE ... SET col = col + delta), não lidos e
+        reescritos: as linhas ficam bloqueadas até ao fim da transação, por isso duas
+        execuções concorrentes na mesma refeição ou no mesmo dia não perdem updates.
+        """
+        refeicao = self.session.get(RefeicaoORM, execucao.refeicao_id)
+        if not refeicao:
+            return
+
+        prod = execucao.quantidade_produzida
+        delta = {
+            "total_produzido": sinal * prod,
+            "total_servido": sinal * execucao.quantidade_servida,
+            "total_nao_servido": sinal * execucao.quantidade_nao_servida,
+        }
+        if prod > 0:
+            delta["soma_taxas_desperdicio"] = sinal * (execucao.quantidade_nao_servida / prod * 100)
+            delta["execucoes_com_producao"] = sinal
+
+        snap_ref = KPIRefeicaoSnapshotORM.__table__
+        snap_dia = KPIDiaSnapshotORM.__table__
+        snap_ementa = KPIEmentaSnapshotORM.__table__
+        atualizado_ref = self.session.execute(
+            update(snap_ref)
+            .where(snap_ref.c.refeicao_id == refeicao.id)
+            .values({col: snap_ref.c[col] + d for col, d in delta.items()})
+        ).rowcount
+        dia = self.session.execute(
+            update(snap_dia)
+            .where(snap_dia.c.ementa_id == refeicao.ementa_id, snap_dia.c.dia_semana == refeicao.dia_semana)
+            .values({col: snap_dia.c[col] + d for col, d in delta.items()})
+            .returning(*(snap_dia.c[col] for col in _TOTAIS))
+        ).first()
+        # Totais da ementa: só contam os dias 1-5 com produção. A diferença da contribuição
+        # do dia (antes/depois, pela linha já bloqueada) é somada à linha da ementa.
+        delta_ementa = [0, 0, 0]
+        if dia is not None and 1 <= refeicao.dia_semana <= 5:
+            depois = tuple(dia)
+            antes = tuple(v - delta[col] for col, v in zip(_TOTAIS, depois))
+            for totais, fator in ((depois, 1), (antes, -1)):
+                if totais[0] > 0:
+                    delta_ementa = [e + fator * v for e, v in zip(delta_ementa, totais)]
+        atualizado_ementa = self.session.execute(
+            update(snap_ementa)
+            .where(snap_ementa.c.ementa_id == refeicao.ementa_id)
+            .values({col: snap_ementa.c[col] + d for col, d in zip(_TOTAIS, delta_ementa)})
+        ).rowcount
+        if not atualizado_ref or dia is None or not atualizado_ementa:
+            # Ementa ainda sem snapshot: calcular tudo a partir das execuções
+            self.recalcular_ementa(refeicao.ementa_id, excluir_execucao_id=execucao.id if sinal < 0 else None)
+            return
+
+        if sinal > 0:
+            # Passa a ser a última execução se for mais recente (data, id) que a atual
+            self.session.execute(
+                update(snap_ref)
+                .where(snap_ref.c.refeicao_id == refeicao.id)
+                .where(or_(
+                    snap_ref.c.ultima_execucao_id.is_(None),
+                    snap_ref.c.ultima_data_execucao < execucao.data_execucao,
+                    and_(snap_ref.c.ultima_data_execucao == execucao.data_execucao,
+                         snap_ref.c.ultima_execucao_id <= execucao.id),
+                ))
+                .values(self._ultima(execucao))
+            )
+        else:
+            anterior = (
+                self.session.query(ExecucaoRefeicaoORM)
+                .filter(ExecucaoRefeicaoORM.refeicao_id == refeicao.id)
+                .filter(ExecucaoRefeicaoORM.id != execucao.id)
+                .order_by(ExecucaoRefeicaoORM.data_execucao.desc(), ExecucaoRefeicaoORM.id.desc())
+                .first()
+            )
+            self.session.execute(
+                update(snap_ref)
+                .where(snap_ref.c.refeicao_id == refeicao.id)
+                .where(snap_ref.c.ultima_execucao_id == execucao.id)
+                .values(self._ultima(anterior))
+            )
+
+    def recalcular_ementa(self, ementa_id: int, excluir_execucao_id: Optional[int] = None) -> Optional[KPIEmentaSnapshotORM]:
+        """
+        Recalcula todos os rollups de uma ementa a partir das execuções.
+        Usado quando as refeições da ementa mudam ou quando ainda não há snapshot.
+        """
+        self.remover_ementa(ementa_id)
+        calculado = self._calcular_ementa(ementa_id, excluir_execucao_id)
+        if calculado is None:
+            return None
+        snaps_ref, snaps_dia, snap_ementa = calculado
+        self.session.add_all(list(snaps_ref.values()) + list(snaps_dia.values()) + [snap_ementa])
+        self.session.flush()
+        return snap_ementa
+
+    def preencher_em_falta(self) -> int:
+        """
+        Cria os rollups das ementas que ainda não os têm (e.g. após cargas diretas de
+        dados). Não faz commit. Retorna o número de ementas preenchidas.
+        """
+        em_falta = list(self.session.scalars(
+            select(EmentaORM.id)
+            .where(EmentaORM.id.not_in(select(KPIEmentaSnapshotORM.ementa_id)))
+            .order_by(EmentaORM.id)
+        ))
+        for ementa_id in em_falta:
+            self.recalcular_ementa(ementa_id)
+        return len(em_falta)
+
+    def remover_ementa(self, ementa_id: int) -> None:
+        """Remove todos os rollups de uma ementa."""
+        for tabela in (KPIRefeicaoSnapshotORM, KPIDiaSnapshotORM, KPIEmentaSnapshotORM):
+            self.session.query(tabela).filter(tabela.ementa_id == ementa_id).delete(synchronize_session="fetch")
+
+    # ==== LEITURA (sem escritas: ementas sem rollup são calculadas em memória) ====
+
+    def obter_refeicao(self, refeicao: RefeicaoORM) -> Optional[KPIRefeicaoSnapshotORM]:
+        snap = self.session.get(KPIRefeicaoSnapshotORM, refeicao.id)
+        if snap is None and self.session.get(KPIEmentaSnapshotORM, refeicao.ementa_id) is None:
+            calculado = self._calcular_ementa(refeicao.ementa_id)
+            snap = calculado[0].get(refeicao.id) if calculado else None
+        return snap
+
+    def obter_dia(self, ementa_id: int, dia_semana: int) -> Optional[KPIDiaSnapshotORM]:
+        if self.session.get(KPIEmentaSnapshotORM, ementa_id) is None:
+            calculado = self._calcular_ementa(ementa_id)
+            return calculado[1].get(dia_semana) if calculado else None
+        return self.session.get(KPIDiaSnapshotORM, (ementa_id, dia_semana))
+
+    def obter_ementa(self, ementa_id: int) -> Optional[KPIEmentaSnapshotORM]:
+        snap = self.session.get(KPIEmentaSnapshotORM, ementa_id)
+        if snap is None:
+            calculado = self._calcular_ementa(ementa_id)
+            snap = calculado[2] if calculado else None
+        return snap
+
+    def listar_dias_com_producao(self, ementa_id: int) -> List[KPIDiaSnapshotORM]:
+        """Dias 1-5 (Segunda a Sexta) da ementa com produção registada."""
+        return self.listar_dias_com_producao_por_ementa([ementa_id]).get(ementa_id, [])
+
+    def obter_ementas(self, ementa_ids: List[int]) -> Dict[int, KPIEmentaSnapshotORM]:
+        """Rollups de várias ementas (calcula os que faltarem). Ementas inexistentes são omitidas."""
+        snaps = self._listar_ementas(ementa_ids)
+        for eid in ementa_ids:
+            if eid not in snaps:
+                calculado = self._calcular_ementa(eid)
+                if calculado:
+                    snaps[eid] = calculado[2]
+        return snaps
+
+    def listar_dias_com_producao_por_ementa(self, ementa_ids: List[int]) -> Dict[int, List[KPIDiaSnapshotORM]]:
+        """Como listar_dias_com_producao, para várias ementas numa só consulta."""
+        resultado: Dict[int, List[KPIDiaSnapshotORM]] = {}
+        dias = (
+            self.session.query(KPIDiaSnapshotORM)
+            .filter(KPIDiaSnapshotORM.ementa_id.in_(ementa_ids))
+            .filter(KPIDiaSnapshotORM.dia_semana.between(1, 5))
+            .filter(KPIDiaSnapshotORM.total_produzido > 0)
+            .order_by(KPIDiaSnapshotORM.ementa_id, KPIDiaSnapshotORM.dia_semana)
+        )
+        for d in dias:
+            resultado.setdefault(d.ementa_id, []).append(d)
+        for eid in set(ementa_ids) - set(self._listar_ementas(ementa_ids)):
+            calculado = self._calcular_ementa(eid)
+            if calculado:
+                resultado[eid] = self._dias_com_producao(calculado[1].values())
+        return resultado
+
+    # ==== AUXILIARES ====
+
+    def _listar_ementas(self, ementa_ids: List[int]) -> Dict[int, KPIEmentaSnapshotORM]:
+        if not ementa_ids:
+            return {}
+        snaps = self.session.query(KPIEmentaSnapshotORM).filter(KPIEmentaSnapshotORM.ementa_id.in_(ementa_ids))
+        return {s.ementa_id: s for s in snaps}
+
+    def _calcular_ementa(self, ementa_id: int, excluir_execucao_id: Optional[int] = None) -> Optional[tuple]:
+        """
+        Rollups (por refeição, por dia, da ementa) calculados a partir das execuções,
+        sem os gravar: ({refeicao_id: snap}, {dia_semana: snap}, snap_ementa).
+        Retorna None se a ementa não existe.
+        """
+        ementa = self.session.get(EmentaORM, ementa_id)
+        if not ementa:
+            return None
+
+        refeicoes = (
+            self.session.query(RefeicaoORM)
+            .filter(RefeicaoORM.ementa_id == ementa_id)
+            .all()
+        )
+        snaps_ref = {
+            r.id: KPIRefeicaoSnapshotORM(
+                refeicao_id=r.id, ementa_id=ementa_id, dia_semana=r.dia_semana,
+                total_produzido=0, total_servido=0, total_nao_servido=0,
+                soma_taxas_desperdicio=0.0, execucoes_com_producao=0,
+            )
+            for r in refeicoes
+        }
+        snaps_dia = {}
+        for r in refeicoes:
+            snaps_dia.setdefault(r.dia_semana, set()).add(r.tipo)
+        snaps_dia = {
+            dia: KPIDiaSnapshotORM(
+                ementa_id=ementa_id, dia_semana=dia,
+                tipo_refeicao=" + ".join(sorted(tipos)),
+                total_produzido=0, total_servido=0, total_nao_servido=0,
+                soma_taxas_desperdicio=0.0, execucoes_com_producao=0,
+            )
+            for dia, tipos in snaps_dia.items()
+        }
+
+        execucoes = (
+            self.session.query(ExecucaoRefeicaoORM)
+            .join(RefeicaoORM, RefeicaoORM.id == ExecucaoRefeicaoORM.refeicao_id)
+            .filter(RefeicaoORM.ementa_id == ementa_id)
+            .order_by(ExecucaoRefeicaoORM.id)
+        )
+        for execucao in execucoes:
+            if execucao.id == excluir_execucao_id:
+                continue
+            snap_ref = snaps_ref[execucao.refeicao_id]
+            snap_dia = snaps_dia[snap_ref.dia_semana]
+            prod = execucao.quantidade_produzida
+            for snap in (snap_ref, snap_dia):
+                snap.total_produzido += prod
+                snap.total_servido += execucao.quantidade_servida
+                snap.total_nao_servido += execucao.quantidade_nao_servida
+                if prod > 0:
+                    snap.soma_taxas_desperdicio += execucao.quantidade_nao_servida / prod * 100
+                    snap.execucoes_com_producao += 1
+            if snap_ref.ultima_execucao_id is None or \
+                    (execucao.data_execucao, execucao.id) >= (snap_ref.ultima_data_execucao, snap_ref.ultima_execucao_id):
+                self._definir_ultima(snap_ref, execucao)
+
+        dias = self._dias_com_producao(snaps_dia.values())
+        snap_ementa = KPIEmentaSnapshotORM(
+            ementa_id=ementa_id, ementa_nome=ementa.nome,
+            total_produzido=sum(d.total_produzido for d in dias),
+            total_servido=sum(d.total_servido for d in dias),
+            total_nao_servido=sum(d.total_nao_servido for d in dias),
+        )
+        return snaps_ref, snaps_dia, snap_ementa
+
+    @staticmethod
+    def _dias_com_producao(dias) -> List[KPIDiaSnapshotORM]:
+        """Dias 1-5 com produção, por ordem (os que contam para o rollup da ementa)."""
+        return sorted(
+            (d for d in dias if 1 <= d.dia_semana <= 5 and d.total_produzido > 0),
+            key=lambda d: d.dia_semana
+        )
+
+    def _definir_ultima(self, snap: KPIRefeicaoSnapshotORM, execucao: Optional[ExecucaoRefeicaoORM]) -> None:
+        for coluna, valor in self._ultima(execucao).items():
+            setattr(snap, coluna, valor)
+
+    @staticmethod
+    def _ultima(execucao: Optional[ExecucaoRefeicaoORM]) -> Dict[str, object]:
+        """Colunas ultima_* do rollup da refeição para a execução (None limpa-as)."""
+        return {
+            "ultima_execucao_id": execucao.id if execucao else None,
+            "ultima_data_execucao": execucao.data_execucao if execucao else None,
+            "ultima_quantidade_produzida": execucao.quantidade_produzida if execucao else None,
+            "ultima_quantidade_servida": execucao.quantidade_servida if execucao else None,
+            "ultima_quantidade_nao_servida": execucao.quantidade_nao_servida if execucao else None,
+        }
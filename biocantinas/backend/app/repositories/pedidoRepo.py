@@ -1,53 +1,37 @@
-from typing import List, Optional
-from datetime import date
+from typing import Dict, Iterable, List, Optional
+from datetime import date, datetime
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
-from ..db.models import PedidoFornecedorORM, FornecedorORM, ProdutoFornecedorORM
+from ..db.models import PedidoFornecedorORM, FornecedorORM, ProdutoFornecedorORM, IndiceIngredienteORM
+from ..models.alocacao import CandidatoFornecimento
+from .indiceIngredientesRepo import normalizar_ingrediente
+
+# Pedidos que ainda ocupam capacidade do fornecedor
+STATUS_EM_ABERTO = ("pendente", "confirmado")
 
 class PedidoRepo:
     def __init__(self, session: Session):
         self.session = session
     
-    def criar_pedido(self, produto_id: int, quantidade: int, data_entrega: date) -> PedidoFornecedorORM:
+    def criar_pedidos_em_lote(self, pedidos: List[dict]) -> List[PedidoFornecedorORM]:
         """
-        Cria pedido ao fornecedor com ordem baseada em data_inscricao.
-        Fornecedor mais antigo tem prioridade.
+        Insere vários pedidos (já com fornecedor e ordem_prioridade) numa só instrução
+        e numa só transação. Retorna os pedidos persistidos, pela ordem recebida.
         """
-        # Buscar fornecedor do produto (aprovado e mais antigo)
-        produto = self.session.get(ProdutoFornecedorORM, produto_id)
-        if not produto:
-            raise ValueError(f"Produto {produto_id} não encontrado")
-        
-        fornecedor = (
-            self.session.query(FornecedorORM)
-            .filter(FornecedorORM.id == produto.fornecedor_id)
-            .filter(FornecedorORM.aprovado == True)
-            .first()
-        )
-        
-        if not fornecedor:
-            raise ValueError(f"Nenhum fornecedor aprovado para o produto {produto.nome}")
-        
-        # Calcular ordem de prioridade (baseado em data_inscricao)
-        ordem = self._calcular_ordem_prioridade(fornecedor.id)
-        
-        pedido = PedidoFornecedorORM(
-            fornecedor_id=fornecedor.id,
-            produto_id=produto_id,
-            quantidade_solicitada=quantidade,
-            data_entrega_prevista=data_entrega,
-            ordem_prioridade=ordem,
-            status="pendente"
-        )
-        
-        self.session.add(pedido)
+        if not pedidos:
+            return []
+        data_pedido = datetime.utcnow()
+        criados = self.session.scalars(
+            insert(PedidoFornecedorORM).returning(PedidoFornecedorORM, sort_by_parameter_order=True),
+            [{"data_pedido": data_pedido, "status": "pendente", **pedido} for pedido in pedidos]
+        ).all()
         self.session.commit()
-        self.session.refresh(pedido)
-        return pedido
+        return criados
     
-    def _calcular_ordem_prioridade(self, fornecedor_id: int) -> int:
+    def obter_ranking_prioridade(self) -> Dict[int, FornecedorORM]:
         """
-        Calcula ordem de prioridade baseada na data de inscrição.
-        Fornecedor mais antigo = prioridade 1
+        Fornecedores aprovados por data de inscrição: {fornecedor_id: fornecedor},
+        pela ordem de prioridade (o primeiro é o mais antigo = prioridade 1).
         """
         fornecedores_aprovados = (
             self.session.query(FornecedorORM)
@@ -55,17 +39,77 @@ class PedidoRepo:
             .order_by(FornecedorORM.data_inscricao.asc())
             .all()
         )
+        return {fornecedor.id: fornecedor for fornecedor in fornecedores_aprovados}
+    
+    def listar_candidatos(self, ingredientes: Iterable[str], data_inicio: date,
+                          data_fim: Optional[date] = None) -> Dict[str, List[CandidatoFornecimento]]:
+        """
+        Fornecedores aprovados de cada ingrediente cujo intervalo de produção cobre
+        data_inicio (ou interseta [data_inicio, data_fim], se data_fim for dado),
+        por ordem de prioridade (data_inscricao), numa só consulta.
+        A capacidade disponível desconta os pedidos em aberto (pendente/confirmado) do produto.
         
-        for idx, fornecedor in enumerate(fornecedores_aprovados, start=1):
-            if fornecedor.id == fornecedor_id:
-                return idx
+        Retorna: {nome_normalizado: [CandidatoFornecimento, ...]} apenas para ingredientes com candidatos
+        """
+        nomes = {normalizar_ingrediente(i) for i in ingredientes}
+        if not nomes:
+            return {}
         
-        return 999  # Fallback
+        linhas = (
+            self.session.query(
+                IndiceIngredienteORM.nome_normalizado,
+                ProdutoFornecedorORM.id,
+                ProdutoFornecedorORM.capacidade,
+                ProdutoFornecedorORM.fornecedor_id
+            )
+            .join(ProdutoFornecedorORM, ProdutoFornecedorORM.id == IndiceIngredienteORM.produto_id)
+            .join(FornecedorORM, FornecedorORM.id == ProdutoFornecedorORM.fornecedor_id)
+            .filter(IndiceIngredienteORM.nome_normalizado.in_(nomes))
+            .filter(FornecedorORM.aprovado == True)
+            .filter(ProdutoFornecedorORM.intervalo_producao_inicio <= (data_fim or data_inicio))
+            .filter(ProdutoFornecedorORM.intervalo_producao_fim >= data_inicio)
+            .all()
+        )
+        if not linhas:
+            return {}
+        
+        ranking = self.obter_ranking_prioridade()
+        ordem_por_fornecedor = {fornecedor_id: idx for idx, fornecedor_id in enumerate(ranking, start=1)}
+        em_aberto = self.quantidades_em_aberto([produto_id for _, produto_id, _, _ in linhas])
+        
+        candidatos: Dict[str, List[CandidatoFornecimento]] = {}
+        for nome, produto_id, capacidade, fornecedor_id in linhas:
+            candidatos.setdefault(nome, []).append(CandidatoFornecimento(
+                produto_id=produto_id,
+                fornecedor_id=fornecedor_id,
+                fornecedor_nome=ranking[fornecedor_id].nome,
+                ordem_prioridade=ordem_por_fornecedor[fornecedor_id],
+                capacidade_disponivel=max((capacidade or 0) - em_aberto.get(produto_id, 0), 0)
+            ))
+        for lista in candidatos.values():
+            lista.sort(key=lambda c: (c.ordem_prioridade, c.produto_id))
+        return candidatos
+    
+    def quantidades_em_aberto(self, produto_ids: List[int]) -> Dict[int, int]:
+        """Quantidade já pedida e ainda em aberto (pendente/confirmado) por produto."""
+        if not produto_ids:
+            return {}
+        linhas = (
+            self.session.query(
+                PedidoFornecedorORM.produto_id,
+                func.sum(PedidoFornecedorORM.quantidade_solicitada)
+            )
+            .filter(PedidoFornecedorORM.produto_id.in_(set(produto_ids)))
+            .filter(PedidoFornecedorORM.status.in_(STATUS_EM_ABERTO))
+            .group_by(PedidoFornecedorORM.produto_id)
+            .all()
+        )
+        return {produto_id: int(total or 0) for produto_id, total in linhas}
     
     def listar_todos(self) -> List[PedidoFornecedorORM]:
         return (
             self.session.query(PedidoFornecedorORM)
-            .order_by(PedidoFornecedorORM.ordem_prioridade.asc())
+            .order_by(PedidoFornecedorORM.ordem_prioridade.asc(), PedidoFornecedorORM.id)
             .all()
         )
     
@@ -73,6 +117,7 @@ class PedidoRepo:
         return (
             self.session.query(PedidoFornecedorORM)
             .filter(PedidoFornecedorORM.fornecedor_id == fornecedor_id)
+            .order_by(PedidoFornecedorORM.id)
             .all()
         )
     
@@ -80,6 +125,7 @@ class PedidoRepo:
         return (
             self.session.query(PedidoFornecedorORM)
             .filter(PedidoFornecedorORM.status == status)
+            .order_by(PedidoFornecedorORM.id)
             .all()
         )
     
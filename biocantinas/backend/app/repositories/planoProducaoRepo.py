@@ -1,29 +1,83 @@
+from datetime import date, datetime
 from typing import List, Optional
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from ..db.models import PlanoProducaoORM
+from ..db.models import PlanoProducaoORM, LotePlanoProducaoORM, PlanoVigenteORM
 
 class PlanoProducaoRepo:
     def __init__(self, session: Session):
         self.session = session
     
-    def criar(self, dados: dict) -> PlanoProducaoORM:
-        plano = PlanoProducaoORM(**dados)
-        self.session.add(plano)
+    # ==== VERSÕES DO PLANO (LOTES POR PERÍODO) ====
+    
+    def registar_lote(self, data_inicio: date, data_fim: date, assinatura: str,
+                      itens: List[dict]) -> LotePlanoProducaoORM:
+        """
+        Guarda uma nova versão do plano do período e torna-a a vigente, numa só transação.
+        As versões anteriores ficam guardadas (histórico de alertas).
+        """
+        lote = LotePlanoProducaoORM(
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            data_calculo=datetime.utcnow(),
+            assinatura=assinatura,
+            total_produtos=len(itens),
+            produtos_com_alerta=sum(1 for item in itens if item.get("requer_alerta"))
+        )
+        self.session.add(lote)
+        self.session.flush()
+        
+        self._inserir_itens(itens, lote.data_calculo, lote.id)
+        self._definir_vigente(data_inicio, data_fim, lote.id)
         self.session.commit()
-        self.session.refresh(plano)
-        return plano
+        return lote
     
-    def listar_todos(self) -> List[PlanoProducaoORM]:
-        return self.session.query(PlanoProducaoORM).all()
+    def obter_lote_vigente(self, data_inicio: date, data_fim: date) -> Optional[LotePlanoProducaoORM]:
+        vigente = self.session.get(PlanoVigenteORM, (data_inicio, data_fim))
+        return vigente.lote if vigente else None
+    
+    def listar_lotes(self, data_inicio: date, data_fim: date) -> List[LotePlanoProducaoORM]:
+        """Todas as versões do plano de um período, da mais recente para a mais antiga."""
+        return (
+            self.session.query(LotePlanoProducaoORM)
+            .filter(LotePlanoProducaoORM.data_inicio == data_inicio)
+            .filter(LotePlanoProducaoORM.data_fim == data_fim)
+            .order_by(LotePlanoProducaoORM.id.desc())
+            .all()
+        )
     
-    def listar_alertas(self) -> List[PlanoProducaoORM]:
-        """Lista apenas itens com desvio > 10% (requer_alerta = True)"""
+    def listar_por_lote(self, lote_id: int) -> List[PlanoProducaoORM]:
         return (
             self.session.query(PlanoProducaoORM)
-            .filter(PlanoProducaoORM.requer_alerta == True)
+            .filter(PlanoProducaoORM.lote_id == lote_id)
+            .order_by(PlanoProducaoORM.id)
             .all()
         )
     
+    def listar_todos(self) -> List[PlanoProducaoORM]:
+        return self.session.query(PlanoProducaoORM).all()
+    
+    def listar_alertas(self, data_inicio: Optional[date] = None,
+                       data_fim: Optional[date] = None) -> List[PlanoProducaoORM]:
+        """
+        Lista apenas itens com desvio > 10% (requer_alerta = True) dos planos vigentes.
+        Com período: apenas a versão vigente desse período.
+        Sem período: versões vigentes de todos os períodos e planos anteriores aos lotes.
+        """
+        query = self.session.query(PlanoProducaoORM).filter(PlanoProducaoORM.requer_alerta == True)
+        if data_inicio is not None and data_fim is not None:
+            lote = self.obter_lote_vigente(data_inicio, data_fim)
+            if not lote:
+                return []
+            query = query.filter(PlanoProducaoORM.lote_id == lote.id)
+        else:
+            query = query.filter(or_(
+                PlanoProducaoORM.lote_id.is_(None),
+                PlanoProducaoORM.lote_id.in_(select(PlanoVigenteORM.lote_id))
+            ))
+        return query.order_by(PlanoProducaoORM.id).all()
+    
     def obter(self, plano_id: int) -> Optional[PlanoProducaoORM]:
         return self.session.get(PlanoProducaoORM, plano_id)
     
@@ -35,9 +89,44 @@ class PlanoProducaoRepo:
         self.session.commit()
         return True
     
+    def _inserir_itens(self, itens: List[dict], data_calculo: datetime, lote_id: int) -> None:
+        """Insere os itens do lote numa só instrução (executemany), na transação corrente."""
+        if not itens:
+            return
+        self.session.execute(
+            insert(PlanoProducaoORM),
+            [{"data_calculo": data_calculo, "lote_id": lote_id, **item} for item in itens]
+        )
+    
+    def _definir_vigente(self, data_inicio: date, data_fim: date, lote_id: int) -> None:
+        """
+        Aponta o período para o lote, na transação corrente. Em SQLite/Postgres é um só
+        upsert (INSERT ... ON CONFLICT DO UPDATE): dois recálculos concorrentes de um
+        período novo não colidem na chave primária; fica vigente o último a gravar.
+        """
+        tabela = PlanoVigenteORM.__table__
+        dialeto = self.session.get_bind().dialect.name
+        if dialeto in ("sqlite", "postgresql"):
+            upsert = (sqlite.insert if dialeto == "sqlite" else postgresql.insert)(tabela).values(
+                data_inicio=data_inicio, data_fim=data_fim, lote_id=lote_id
+            )
+            self.session.execute(upsert.on_conflict_do_update(
+                index_elements=[tabela.c.data_inicio, tabela.c.data_fim],
+                set_={"lote_id": upsert.excluded.lote_id}
+            ))
+            return
+        atualizado = self.session.execute(
+            update(tabela)
+            .where(tabela.c.data_inicio == data_inicio, tabela.c.data_fim == data_fim)
+            .values(lote_id=lote_id)
+        )
+        if atualizado.rowcount == 0:
+            self.session.execute(insert(tabela).values(data_inicio=data_inicio, data_fim=data_fim, lote_id=lote_id))
+    
     def limpar_todos(self) -> int:
-        """Remove todos os registros de plano de produção"""
-        count = self.session.query(PlanoProducaoORM).count()
-        self.session.query(PlanoProducaoORM).delete()
+        """Remove todos os registros de plano de produção (todas as versões de todos os períodos)"""
+        resultado = self.session.execute(delete(PlanoProducaoORM))
+        self.session.execute(delete(PlanoVigenteORM))
+        self.session.execute(delete(LotePlanoProducaoORM))
         self.session.commit()
-        return count
+        return resultado.rowcount
@@ -1,11 +1,13 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from sqlalchemy.orm import Session
 from ..db.models import ProdutoFornecedorORM
 from ..models.produto import ProdutoFornecedorModel
+from .indiceIngredientesRepo import IndiceIngredientesRepo, normalizar_ingrediente
 
 class ProdutoRepo:
     def __init__(self, session: Session):
         self.session = session
+        self.indice = IndiceIngredientesRepo(session)
     
     def criar_produto(self, fornecedor_id: int, produto: ProdutoFornecedorModel) -> tuple[int, int, ProdutoFornecedorModel]:
         """Cria um produto para um fornecedor específico. Retorna (id, fornecedor_id, model)"""
@@ -19,6 +21,8 @@ class ProdutoRepo:
             capacidade=produto.capacidade,
         )
         self.session.add(orm)
+        self.session.flush()
+        self.indice.registar_produto(orm)
         self.session.commit()
         self.session.refresh(orm)
         return (orm.id, orm.fornecedor_id, self._to_model(orm))
@@ -30,6 +34,19 @@ class ProdutoRepo:
             return None
         return (orm.id, orm.fornecedor_id, self._to_model(orm))
     
+    def buscar_por_nomes(self, nomes: Iterable[str]) -> Dict[str, ProdutoFornecedorORM]:
+        """
+        Resolve nomes de ingredientes/produtos através do índice de ingredientes, numa só consulta.
+        Retorna: {nome: produto} apenas para os nomes encontrados
+        """
+        nomes = list(nomes)
+        produtos = self.indice.resolver_produtos(nomes)
+        return {
+            nome: produtos[normalizar_ingrediente(nome)]
+            for nome in nomes
+            if normalizar_ingrediente(nome) in produtos
+        }
+    
     def listar_todos(self) -> List[ProdutoFornecedorModel]:
         """Lista todos os produtos como Models"""
         orms = self.session.query(ProdutoFornecedorORM).all()
@@ -74,6 +91,7 @@ class ProdutoRepo:
         orm.intervalo_producao_inicio = produto.intervalo_producao_inicio
         orm.intervalo_producao_fim = produto.intervalo_producao_fim
         orm.capacidade = produto.capacidade
+        self.indice.registar_produto(orm)
         
         self.session.commit()
         self.session.refresh(orm)
@@ -85,6 +103,7 @@ class ProdutoRepo:
         if not orm:
             return False
         
+        self.indice.remover_produto(produto_id)
         self.session.delete(orm)
         self.session.commit()
         return True
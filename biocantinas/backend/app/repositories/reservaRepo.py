@@ -1,38 +1,331 @@
-from typing import List, Optional
-from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import date, datetime
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from ..db.models import ReservaRefeicaoORM, RefeicaoORM, EmentaORM
+from ..db.models import (
+    ReservaRefeicaoORM, RefeicaoORM, EmentaORM, ItemRefeicaoORM, ContadorReservasRefeicaoORM
+)
+
+class CapacidadeEsgotada(ValueError):
+    """A reserva excede a capacidade (lugares livres) da refeição."""
+
+
+class RefeicaoNaoEncontrada(ValueError):
+    """A reserva indica uma refeição que não existe."""
+
 
 class ReservaRepo:
     def __init__(self, session: Session):
         self.session = session
     
     def criar(self, utilizador_id: int, refeicao_id: int, quantidade_pessoas: int = 1) -> ReservaRefeicaoORM:
-        reserva = ReservaRefeicaoORM(
-            utilizador_id=utilizador_id,
-            refeicao_id=refeicao_id,
-            quantidade_pessoas=quantidade_pessoas
-        )
-        self.session.add(reserva)
+        if not self.refeicoes_existentes([refeicao_id]):
+            raise RefeicaoNaoEncontrada(f"Refeição {refeicao_id} não encontrada")
+        reserva = self.criar_varias([(utilizador_id, refeicao_id, quantidade_pessoas)])[0]
+        if reserva is None:
+            self.session.rollback()
+            raise CapacidadeEsgotada(f"Capacidade esgotada para a refeição {refeicao_id}")
         self.session.commit()
         self.session.refresh(reserva)
         return reserva
+
+    def criar_varias(self, reservas: List[Tuple[int, int, int]]) -> List[Optional[ReservaRefeicaoORM]]:
+        """
+        Insere (utilizador_id, refeicao_id, quantidade_pessoas) numa só instrução e
+        retorna as reservas pela mesma ordem. Não faz commit: a transação é do chamador.
+        
+        Os lugares são ocupados primeiro nos contadores (_ocupar_lugares); as reservas
+        que excederiam a capacidade da refeição não são inseridas e ficam a None.
+        Levanta ValueError se alguma reserva não tiver pelo menos uma pessoa.
+        """
+        if not reservas:
+            return []
+        if any(q <= 0 for _, _, q in reservas):
+            raise ValueError("A quantidade de pessoas da reserva deve ser positiva")
+        aceites = self._reservar_lugares(reservas)
+        resultado: List[Optional[ReservaRefeicaoORM]] = [None] * len(reservas)
+        if not aceites:
+            return resultado
+        data_reserva = datetime.utcnow()
+        criadas = self.session.scalars(
+            insert(ReservaRefeicaoORM).returning(ReservaRefeicaoORM, sort_by_parameter_order=True),
+            [
+                {"utilizador_id": u, "refeicao_id": r, "quantidade_pessoas": q, "data_reserva": data_reserva}
+                for u, r, q in (reservas[i] for i in aceites)
+            ]
+        ).all()
+        for i, reserva in zip(aceites, criadas):
+            resultado[i] = reserva
+        return resultado
+
+    def _reservar_lugares(self, reservas: List[Tuple[int, int, int]]) -> List[int]:
+        """
+        Ocupa nos contadores os lugares das reservas; retorna os índices das aceites.
+        Tenta cada refeição de uma vez; se não couberem todas, aceita-as pela ordem
+        de chegada enquanto houver lugares.
+        """
+        por_refeicao: Dict[int, List[int]] = {}
+        for i, (_, refeicao_id, _) in enumerate(reservas):
+            por_refeicao.setdefault(refeicao_id, []).append(i)
+
+        aceites = []
+        for refeicao_id in sorted(por_refeicao):  # ordem fixa: sem deadlocks entre transações
+            indices = por_refeicao[refeicao_id]
+            if self._ocupar_lugares(refeicao_id, sum(reservas[i][2] for i in indices), len(indices)):
+                aceites.extend(indices)
+                continue
+            for i in indices:
+                if self._ocupar_lugares(refeicao_id, reservas[i][2], 1):
+                    aceites.append(i)
+        return sorted(aceites)
+
+    def _ocupar_lugares(self, refeicao_id: int, pessoas: int, numero: int) -> bool:
+        """
+        Soma (pessoas, reservas) ao contador da refeição só se couberem na capacidade,
+        numa instrução atómica (upsert condicional: INSERT ... ON CONFLICT DO UPDATE
+        ... WHERE). A linha do contador fica bloqueada até ao fim da transação, por
+        isso reservas concorrentes na mesma refeição nunca ultrapassam a capacidade.
+        Retorna False se não houver lugares.
+        """
+        if pessoas <= 0:
+            raise ValueError("A quantidade de pessoas da reserva deve ser positiva")
+        tabela = ContadorReservasRefeicaoORM.__table__
+        agora = datetime.utcnow()
+        cabe = or_(tabela.c.capacidade.is_(None), tabela.c.total_pessoas + pessoas <= tabela.c.capacidade)
+        dialeto = self.session.get_bind().dialect.name
+        if dialeto in ("sqlite", "postgresql"):
+            upsert = (sqlite.insert if dialeto == "sqlite" else postgresql.insert)(tabela).values(
+                refeicao_id=refeicao_id, total_pessoas=pessoas, total_reservas=numero, atualizado_em=agora
+            )
+            return self.session.execute(upsert.on_conflict_do_update(
+                index_elements=[tabela.c.refeicao_id],
+                set_={
+                    "total_pessoas": tabela.c.total_pessoas + upsert.excluded.total_pessoas,
+                    "total_reservas": tabela.c.total_reservas + upsert.excluded.total_reservas,
+                    "atualizado_em": upsert.excluded.atualizado_em,
+                },
+                where=cabe
+            )).rowcount == 1
+        atualizado = self.session.execute(
+            update(tabela)
+            .where(tabela.c.refeicao_id == refeicao_id)
+            .where(cabe)
+            .values(
+                total_pessoas=tabela.c.total_pessoas + pessoas,
+                total_reservas=tabela.c.total_reservas + numero,
+                atualizado_em=agora,
+            )
+        )
+        if atualizado.rowcount == 1:
+            return True
+        if self.session.get(ContadorReservasRefeicaoORM, refeicao_id) is not None:
+            return False
+        self.session.execute(insert(tabela).values(
+            refeicao_id=refeicao_id, total_pessoas=pessoas, total_reservas=numero, atualizado_em=agora
+        ))
+        return True
+
+    def definir_capacidade(self, refeicao_id: int, capacidade: Optional[int]) -> ContadorReservasRefeicaoORM:
+        """Define a capacidade (máximo de pessoas) da refeição; None remove o limite."""
+        contador = self.session.get(ContadorReservasRefeicaoORM, refeicao_id, with_for_update=True)
+        if contador is None:
+            contador = ContadorReservasRefeicaoORM(
+                refeicao_id=refeicao_id, total_pessoas=0, total_reservas=0
+            )
+            self.session.add(contador)
+        contador.capacidade = capacidade
+        contador.atualizado_em = datetime.utcnow()
+        try:
+            self.session.commit()
+        except IntegrityError:
+            # O contador foi criado entretanto por uma reserva concorrente
+            self.session.rollback()
+            return self.definir_capacidade(refeicao_id, capacidade)
+        self.session.refresh(contador)
+        return contador
+
+    def remover(self, reserva_id: int, utilizador_id: int) -> bool:
+        """Remove a reserva do utilizador e desconta-a do contador da refeição."""
+        reserva = self.session.get(ReservaRefeicaoORM, reserva_id)
+        if not reserva or reserva.utilizador_id != utilizador_id:
+            return False
+        self._somar_contadores({reserva.refeicao_id: (-reserva.quantidade_pessoas, -1)})
+        self.session.delete(reserva)
+        self.session.commit()
+        return True
+
+    def _somar_contadores(self, deltas: Dict[int, Tuple[int, int]]) -> None:
+        """
+        Soma {refeicao_id: (pessoas, reservas)} aos contadores, na transação corrente.
+        Em SQLite/Postgres é um só upsert (INSERT ... ON CONFLICT DO UPDATE), atómico
+        face a escritas concorrentes na mesma refeição.
+        """
+        if not deltas:
+            return
+        tabela = ContadorReservasRefeicaoORM.__table__
+        agora = datetime.utcnow()
+        linhas = [
+            {"refeicao_id": refeicao_id, "total_pessoas": pessoas, "total_reservas": numero, "atualizado_em": agora}
+            for refeicao_id, (pessoas, numero) in sorted(deltas.items())  # ordem fixa: sem deadlocks entre lotes
+        ]
+        dialeto = self.session.get_bind().dialect.name
+        if dialeto in ("sqlite", "postgresql"):
+            upsert = (sqlite.insert if dialeto == "sqlite" else postgresql.insert)(tabela)
+            self.session.execute(upsert.on_conflict_do_update(
+                index_elements=[tabela.c.refeicao_id],
+                set_={
+                    "total_pessoas": tabela.c.total_pessoas + upsert.excluded.total_pessoas,
+                    "total_reservas": tabela.c.total_reservas + upsert.excluded.total_reservas,
+                    "atualizado_em": upsert.excluded.atualizado_em,
+                }
+            ), linhas)
+            return
+        for linha in linhas:
+            atualizado = self.session.execute(
+                update(tabela)
+                .where(tabela.c.refeicao_id == linha["refeicao_id"])
+                .values(
+                    total_pessoas=tabela.c.total_pessoas + linha["total_pessoas"],
+                    total_reservas=tabela.c.total_reservas + linha["total_reservas"],
+                    atualizado_em=agora,
+                )
+            )
+            if atualizado.rowcount == 0:
+                self.session.execute(insert(tabela), linha)
+
+    def remover_contadores(self, refeicao_ids: Iterable[int]) -> None:
+        """Remove os contadores das refeições indicadas (a apagar). Não faz commit."""
+        ids = set(refeicao_ids)
+        if ids:
+            self.session.execute(
+                ContadorReservasRefeicaoORM.__table__.delete()
+                .where(ContadorReservasRefeicaoORM.refeicao_id.in_(ids))
+            )
+
+    def recalcular_contadores(self) -> None:
+        """Reconstrói todos os contadores a partir das reservas (e.g. após cargas diretas de dados)."""
+        self.session.execute(ContadorReservasRefeicaoORM.__table__.delete())
+        self.session.execute(insert(ContadorReservasRefeicaoORM).from_select(
+            ["refeicao_id", "total_pessoas", "total_reservas", "atualizado_em"],
+            select(
+                ReservaRefeicaoORM.refeicao_id,
+                func.sum(ReservaRefeicaoORM.quantidade_pessoas),
+                func.count(ReservaRefeicaoORM.id),
+                func.max(ReservaRefeicaoORM.data_reserva),
+            )
+            .where(ReservaRefeicaoORM.refeicao_id.in_(select(RefeicaoORM.id)))
+            .group_by(ReservaRefeicaoORM.refeicao_id)
+        ))
+        self.session.commit()
+
+    def refeicoes_com_reservas(self, refeicao_ids: Iterable[int]) -> Set[int]:
+        """Quais das refeições indicadas têm reservas (numa consulta, pelo índice refeicao_id)."""
+        ids = set(refeicao_ids)
+        if not ids:
+            return set()
+        return set(self.session.scalars(
+            select(ReservaRefeicaoORM.refeicao_id).where(ReservaRefeicaoORM.refeicao_id.in_(ids)).distinct()
+        ))
+
+    def refeicoes_existentes(self, refeicao_ids: Iterable[int]) -> Set[int]:
+        """Quais dos ids indicados correspondem a refeições existentes (numa consulta)."""
+        ids = set(refeicao_ids)
+        if not ids:
+            return set()
+        return set(self.session.scalars(select(RefeicaoORM.id).where(RefeicaoORM.id.in_(ids))))
     
+    def _refeicoes_do_periodo(self, data_inicio: date, data_fim: date):
+        """
+        Subconsulta com os ids das refeições das ementas contidas no período.
+        Filtrar reservas por refeicao_id IN (...) percorre ementas → refeições → reservas
+        pelos índices, em vez de ler todas as reservas e juntar as ementas.
+        """
+        return (
+            select(RefeicaoORM.id)
+            .join(EmentaORM, EmentaORM.id == RefeicaoORM.ementa_id)
+            .where(EmentaORM.data_inicio >= data_inicio)
+            .where(EmentaORM.data_fim <= data_fim)
+        )
+
     def listar_por_periodo(self, data_inicio: date, data_fim: date) -> List[ReservaRefeicaoORM]:
         """Lista reservas de refeições dentro do período da ementa"""
         return (
             self.session.query(ReservaRefeicaoORM)
-            .join(ReservaRefeicaoORM.refeicao)
-            .join(RefeicaoORM.ementa)
             .options(
                 joinedload(ReservaRefeicaoORM.refeicao)
                 .joinedload(RefeicaoORM.itens)
             )
-            .filter(EmentaORM.data_inicio >= data_inicio)
-            .filter(EmentaORM.data_fim <= data_fim)
+            .filter(ReservaRefeicaoORM.refeicao_id.in_(self._refeicoes_do_periodo(data_inicio, data_fim)))
             .all()
         )
     
+    def _reservas_por_quantidade(self, data_inicio: date, data_fim: date):
+        """
+        Reservas das refeições do período agrupadas por (refeicao_id, quantidade_pessoas):
+        número de reservas e id da primeira. Lido pelo índice
+        ix_reservas_refeicoes_refeicao_pessoas, sem carregar as reservas.
+        """
+        return (
+            select(
+                ReservaRefeicaoORM.refeicao_id,
+                ReservaRefeicaoORM.quantidade_pessoas,
+                func.count(ReservaRefeicaoORM.id).label("reservas"),
+                func.min(ReservaRefeicaoORM.id).label("primeira"),
+            )
+            .where(ReservaRefeicaoORM.refeicao_id.in_(self._refeicoes_do_periodo(data_inicio, data_fim)))
+            .group_by(ReservaRefeicaoORM.refeicao_id, ReservaRefeicaoORM.quantidade_pessoas)
+        )
+    
+    def assinatura_por_periodo(self, data_inicio: date, data_fim: date) -> tuple:
+        """
+        Número de reservas por (refeição, quantidade_pessoas) do período, ordenado.
+        São exatamente as entradas do ajuste do plano (itens_com_reservas_por_periodo),
+        por isso a assinatura muda sempre que o ajuste pode mudar, sem depender dos
+        ids das reservas (que podem ser reutilizados depois de remoções).
+        """
+        grupos = self._reservas_por_quantidade(data_inicio, data_fim).subquery()
+        return tuple(
+            tuple(linha) for linha in self.session.execute(
+                select(grupos.c.refeicao_id, grupos.c.quantidade_pessoas, grupos.c.reservas)
+                .order_by(grupos.c.refeicao_id, grupos.c.quantidade_pessoas)
+            )
+        )
+    
+    def totais_por_refeicao(self, refeicao_ids: List[int]) -> Dict[int, int]:
+        """
+        Soma de pessoas reservadas por refeição, lida dos contadores (por chave primária).
+        Refeições sem reservas não aparecem no resultado.
+        """
+        if not refeicao_ids:
+            return {}
+        linhas = self.session.execute(
+            select(ContadorReservasRefeicaoORM.refeicao_id, ContadorReservasRefeicaoORM.total_pessoas)
+            .where(ContadorReservasRefeicaoORM.refeicao_id.in_(set(refeicao_ids)))
+            .where(ContadorReservasRefeicaoORM.total_reservas > 0)
+        ).all()
+        return {refeicao_id: total for refeicao_id, total in linhas}
+
+    def itens_com_reservas_por_periodo(self, data_inicio: date, data_fim: date) -> List[Tuple[str, Optional[float], int, int]]:
+        """
+        (ingrediente, quantidade_estimada, pessoas por reserva, número de reservas) de cada
+        item das refeições do período com reservas (ver _reservas_por_quantidade).
+        Ordenado pela primeira reserva de cada grupo e pelos itens da refeição.
+        """
+        grupos = self._reservas_por_quantidade(data_inicio, data_fim).subquery()
+        return [tuple(linha) for linha in self.session.execute(
+            select(
+                ItemRefeicaoORM.ingrediente,
+                ItemRefeicaoORM.quantidade_estimada,
+                grupos.c.quantidade_pessoas,
+                grupos.c.reservas
+            )
+            .join(grupos, grupos.c.refeicao_id == ItemRefeicaoORM.refeicao_id)
+            .order_by(grupos.c.primeira, ItemRefeicaoORM.id)
+        )]
+    
     def listar_por_utilizador(self, utilizador_id: int) -> List[ReservaRefeicaoORM]:
         return (
             self.session.query(ReservaRefeicaoORM)
@@ -41,6 +334,7 @@ class ReservaRepo:
                 .joinedload(RefeicaoORM.ementa)
             )
             .filter(ReservaRefeicaoORM.utilizador_id == utilizador_id)
+            .order_by(ReservaRefeicaoORM.id)
             .all()
         )
     
@@ -49,11 +343,39 @@ class ReservaRepo:
     
     def obter(self, reserva_id: int) -> Optional[ReservaRefeicaoORM]:
         return self.session.get(ReservaRefeicaoORM, reserva_id)
-    
-    def deletar(self, reserva_id: int) -> bool:
-        reserva = self.session.get(ReservaRefeicaoORM, reserva_id)
-        if not reserva:
-            return False
-        self.session.delete(reserva)
-        self.session.commit()
-        return True
+
+
+class ReservaRepoAsync:
+    """Leituras de ReservaRepo para rotas assíncronas (AsyncSession)."""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def listar_por_utilizador(self, utilizador_id: int) -> List[ReservaRefeicaoORM]:
+        results = await self.session.scalars(
+            select(ReservaRefeicaoORM)
+            .options(
+                joinedload(ReservaRefeicaoORM.refeicao)
+                .joinedload(RefeicaoORM.ementa)
+            )
+            .where(ReservaRefeicaoORM.utilizador_id == utilizador_id)
+            .order_by(ReservaRefeicaoORM.id)
+        )
+        return list(results)
+
+    async def listar_contadores(self, refeicao_ids: Optional[List[int]] = None) -> List[ContadorReservasRefeicaoORM]:
+        """Contadores das refeições indicadas (todos, se nenhuma for indicada)."""
+        consulta = select(ContadorReservasRefeicaoORM).order_by(ContadorReservasRefeicaoORM.refeicao_id)
+        if refeicao_ids:
+            consulta = consulta.where(ContadorReservasRefeicaoORM.refeicao_id.in_(set(refeicao_ids)))
+        return list(await self.session.scalars(consulta))
+
+    async def totais_por_refeicao(self, refeicao_ids: List[int]) -> Dict[int, int]:
+        """Como ReservaRepo.totais_por_refeicao."""
+        if not refeicao_ids:
+            return {}
+        linhas = await self.session.execute(
+            select(ContadorReservasRefeicaoORM.refeicao_id, ContadorReservasRefeicaoORM.total_pessoas)
+            .where(ContadorReservasRefeicaoORM.refeicao_id.in_(set(refeicao_ids)))
+            .where(ContadorReservasRefeicaoORM.total_reservas > 0)
+        )
+        return {refeicao_id: total for refeicao_id, total in linhas}
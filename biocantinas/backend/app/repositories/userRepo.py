@@ -1,4 +1,6 @@
 from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from ..db.models import UserORM
@@ -37,3 +39,14 @@ class UserRepo:
         except Exception:
             self.session.rollback()
             raise
+
+
+class UserRepoAsync:
+    """Leituras de UserRepo para rotas assíncronas (AsyncSession)."""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_by_username(self, username: str) -> Optional[UserORM]:
+        return await self.session.scalar(
+            select(UserORM).where(UserORM.username == username).limit(1)
+        )
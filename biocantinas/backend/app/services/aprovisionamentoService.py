@@ -1,17 +1,83 @@
+import hashlib
 from datetime import date
-from typing import Dict, List
-from ..db.session import SessionLocal, init_db
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..db.session import get_db, get_async_db
+from ..dtos.aprovisionamentoDTO import ReservaRefeicaoDTO
+from ..models.ementa import EmentaLeitura
+from ..models.alocacao import CandidatoFornecimento, LinhaAlocacao, ResultadoAlocacao
 from ..repositories.ementaRepo import EmentaRepo
-from ..repositories.reservaRepo import ReservaRepo
+from ..repositories.reservaRepo import ReservaRepo, ReservaRepoAsync
+from ..repositories.idempotenciaRepo import IdempotenciaRepoAsync
 from ..repositories.planoProducaoRepo import PlanoProducaoRepo
 from ..repositories.pedidoRepo import PedidoRepo
 from ..repositories.produtoRepo import ProdutoRepo
 from ..repositories.historicoReservasRepo import HistoricoReservasRepo
+from ..repositories.indiceIngredientesRepo import normalizar_ingrediente
+
+
+def contar_dias_semana(data_inicio: date, data_fim: date) -> Dict[int, int]:
+    """
+    Conta quantas vezes cada dia da semana ocorre no período [data_inicio, data_fim],
+    em tempo constante (independente da duração do período).
+    
+    Retorna: {dia_semana: ocorrencias} com 1=Segunda ... 7=Domingo, pela ordem
+    da primeira ocorrência no período (apenas dias que ocorrem).
+    """
+    total_dias = (data_fim - data_inicio).days + 1
+    if total_dias <= 0:
+        return {}
+    
+    semanas_completas, resto = divmod(total_dias, 7)
+    primeiro_dia = data_inicio.weekday()
+    
+    ocorrencias = {}
+    for i in range(min(total_dias, 7)):
+        dia_semana_num = (primeiro_dia + i) % 7 + 1
+        ocorrencias[dia_semana_num] = semanas_completas + (1 if i < resto else 0)
+    return ocorrencias
+
+
+def alocar_por_prioridade(necessidades: Dict[str, int],
+                          candidatos: Dict[str, List[CandidatoFornecimento]]) -> ResultadoAlocacao:
+    """
+    Divide a necessidade de cada produto pelos seus fornecedores candidatos, por ordem
+    de prioridade: cada fornecedor recebe min(capacidade disponível, quantidade em falta).
+    
+    A capacidade é de cada produto de cada fornecedor, por isso os produtos são independentes
+    e o preenchimento guloso por prioridade é exato. Tempo linear no número de candidatos.
+    
+    candidatos: {nome_normalizado: [CandidatoFornecimento por ordem de prioridade]}
+    Retorna: linhas de alocação (pela ordem das necessidades) e faltas por produto
+    """
+    resultado = ResultadoAlocacao()
+    for produto, quantidade in necessidades.items():
+        restante = quantidade
+        for candidato in candidatos.get(normalizar_ingrediente(produto), []):
+            if restante <= 0:
+                break
+            atribuida = min(candidato.capacidade_disponivel, restante)
+            if atribuida <= 0:
+                continue
+            resultado.linhas.append(LinhaAlocacao(
+                produto=produto,
+                produto_id=candidato.produto_id,
+                fornecedor_id=candidato.fornecedor_id,
+                fornecedor_nome=candidato.fornecedor_nome,
+                ordem_prioridade=candidato.ordem_prioridade,
+                quantidade=atribuida
+            ))
+            restante -= atribuida
+        if restante > 0:
+            resultado.faltas[produto] = restante
+    return resultado
+
 
 class AprovisionamentoService:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.ementa_repo = EmentaRepo(self.session)
         self.reserva_repo = ReservaRepo(self.session)
         self.plano_repo = PlanoProducaoRepo(self.session)
@@ -19,42 +85,88 @@ class AprovisionamentoService:
         self.produto_repo = ProdutoRepo(self.session)
         self.historico_repo = HistoricoReservasRepo(self.session)
     
-    def calcular_necessidades(self, data_inicio: date, data_fim: date) -> Dict[str, int]:
+    def criar_reservas_lote(self, utilizador_id: int, itens: List[Tuple[int, int]]) -> List[Dict]:
+        """
+        Reserva várias refeições de uma vez (e.g. a semana inteira, ou uma turma):
+        itens = [(refeicao_id, quantidade_pessoas), ...].
+        
+        Valida os ids das refeições numa só consulta e insere as reservas válidas
+        numa só transação (as que excedam a capacidade da refeição são recusadas). Retorna um resultado por item, pela ordem recebida:
+        {"indice", "refeicao_id", "quantidade_pessoas", "sucesso", "reserva", "erro"}
+        """
+        existentes = self.reserva_repo.refeicoes_existentes(r for r, _ in itens)
+        validos = [i for i, (refeicao_id, _) in enumerate(itens) if refeicao_id in existentes]
+        reservas = self.reserva_repo.criar_varias(
+            [(utilizador_id, *itens[i]) for i in validos]
+        )
+        # Ler antes do commit (que expira os objetos) para não recarregar reserva a reserva
+        por_indice = {
+            i: ReservaRefeicaoDTO.model_validate(r) if r is not None else None
+            for i, r in zip(validos, reservas)
+        }
+        self.session.commit()
+        
+        resultados = []
+        for i, (refeicao_id, quantidade_pessoas) in enumerate(itens):
+            reserva = por_indice.get(i)
+            if reserva is not None:
+                erro = None
+            elif i in por_indice:
+                erro = f"Capacidade esgotada para a refeição {refeicao_id}"
+            else:
+                erro = f"Refeição {refeicao_id} não encontrada"
+            resultados.append({
+                "indice": i,
+                "refeicao_id": refeicao_id,
+                "quantidade_pessoas": quantidade_pessoas,
+                "sucesso": reserva is not None,
+                "reserva": reserva,
+                "erro": erro
+            })
+        return resultados
+    
+    def carregar_ementas(self, data_inicio: date, data_fim: date) -> List[EmentaLeitura]:
+        """Carrega (numa consulta) as ementas do período com refeições e itens."""
+        return self.ementa_repo.carregar_grafo_por_periodo(data_inicio, data_fim)
+    
+    def calcular_necessidades(self, data_inicio: date, data_fim: date,
+                              ementas: Optional[List[EmentaLeitura]] = None) -> Dict[str, int]:
         """
         ETAPA 1: Calcula quantidade de produtos necessários baseado na ementa planejada.
         
-        Percorre: EMENTA → DIAS DO PERÍODO → REFEIÇÕES DO DIA → ITENS (ingredientes)
+        Percorre: EMENTA → REFEIÇÕES POR DIA DA SEMANA → ITENS (ingredientes)
         
-        IMPORTANTE: Calcula para cada DIA do período selecionado, somando a quantidade
-        de ingredientes de cada refeição multiplicada pelo número de vezes que ela
-        aparece no período.
+        IMPORTANTE: Para cada ementa, soma os ingredientes de cada dia da semana e
+        multiplica pelo número de vezes que esse dia da semana ocorre na sobreposição
+        entre a ementa e o período selecionado (sem percorrer o período dia a dia).
+        
+        ementas: grafo já carregado por carregar_ementas (opcional)
         
         Retorna: {produto_nome: quantidade_total_kg}
         """
-        from datetime import timedelta
-        
-        ementas = self.ementa_repo.listar_por_periodo(data_inicio, data_fim)
+        if ementas is None:
+            ementas = self.carregar_ementas(data_inicio, data_fim)
         necessidades = {}
         
         for ementa in ementas:
-            # Iterar sobre cada dia do período selecionado
-            data_atual = max(ementa.data_inicio, data_inicio)
-            data_fim_ementa = min(ementa.data_fim, data_fim)
+            ocorrencias = contar_dias_semana(
+                max(ementa.data_inicio, data_inicio),
+                min(ementa.data_fim, data_fim)
+            )
+            if not ocorrencias:
+                continue
             
-            while data_atual <= data_fim_ementa:
-                dia_semana_num = data_atual.weekday() + 1  # 1=Segunda, 2=Terça, etc
-                
-                # Processar apenas as refeições deste dia da semana
-                for refeicao in ementa.refeicoes:
-                    if refeicao.dia_semana != dia_semana_num:
-                        continue
-                    
-                    for item in refeicao.itens:
-                        produto = item.ingrediente
-                        quantidade = item.quantidade_estimada or 0
-                        necessidades[produto] = necessidades.get(produto, 0) + quantidade
-                
-                data_atual += timedelta(days=1)
+            # Totais de ingredientes por dia da semana (1=Segunda, 2=Terça, etc)
+            totais_por_dia: Dict[int, Dict[str, int]] = {}
+            for refeicao in ementa.refeicoes:
+                totais = totais_por_dia.setdefault(refeicao.dia_semana, {})
+                for item in refeicao.itens:
+                    produto = item.ingrediente
+                    totais[produto] = totais.get(produto, 0) + (item.quantidade_estimada or 0)
+            
+            for dia_semana_num, vezes in ocorrencias.items():
+                for produto, quantidade in totais_por_dia.get(dia_semana_num, {}).items():
+                    necessidades[produto] = necessidades.get(produto, 0) + quantidade * vezes
         
         return necessidades
     
@@ -66,97 +178,83 @@ class AprovisionamentoService:
         - Se mais pessoas reservaram → aumenta quantidade
         - Se menos pessoas → mantém necessidade base
         
+        O adicional é arredondado reserva a reserva; as reservas com a mesma
+        quantidade de pessoas na mesma refeição são agregadas na base de dados.
+        
         Retorna: (necessidades_ajustadas, reservas_por_produto)
         """
-        reservas = self.reserva_repo.listar_por_periodo(data_inicio, data_fim)
+        itens = self.reserva_repo.itens_com_reservas_por_periodo(data_inicio, data_fim)
         necessidades_ajustadas = necessidades.copy()
         reservas_por_produto = {}
         
         # Agrupar reservas por produto
-        for reserva in reservas:
-            for item in reserva.refeicao.itens:
-                produto = item.ingrediente
-                # Assumir que receita é para 10 pessoas
-                quantidade_por_pessoa = (item.quantidade_estimada or 0) / 10
-                adicional = int(reserva.quantidade_pessoas * quantidade_por_pessoa)
-                
-                reservas_por_produto[produto] = reservas_por_produto.get(produto, 0) + adicional
-                necessidades_ajustadas[produto] = necessidades_ajustadas.get(produto, 0) + adicional
+        for produto, quantidade_estimada, pessoas, numero in itens:
+            # Assumir que receita é para 10 pessoas
+            quantidade_por_pessoa = (quantidade_estimada or 0) / 10
+            adicional = int(pessoas * quantidade_por_pessoa) * numero
+            
+            reservas_por_produto[produto] = reservas_por_produto.get(produto, 0) + adicional
+            necessidades_ajustadas[produto] = necessidades_ajustadas.get(produto, 0) + adicional
         
         return necessidades_ajustadas, reservas_por_produto
     
     def ajustar_com_previsao_historica(self, necessidades: Dict[str, int], 
-                                      data_inicio: date, data_fim: date) -> Dict[str, int]:
+                                      data_inicio: date, data_fim: date,
+                                      ementas: Optional[List[EmentaLeitura]] = None) -> Dict[str, int]:
         """
         ETAPA 2 ALTERNATIVA: Ajusta quantidades usando histórico de refeições.
         
         LÓGICA IMPLEMENTADA:
-        1. Para cada dia do período, identifica o dia da semana (ex: "segunda")
-        2. Busca o TOTAL de refeições oferecidas naquele dia/tipo no histórico
-        3. Para cada prato na ementa, busca o PERCENTUAL de escolha no histórico
-        4. Calcula quantidade = (total_refeições_histórico × percentual_prato)
+        1. Para cada dia da semana do período, conta quantas vezes ocorre (ex: 4 "segunda")
+        2. Busca o número de reservas de cada prato desse dia/tipo no histórico
+           (tabela em memória, carregada uma vez por cálculo)
+        3. Calcula quantidade = quantidade_ingrediente × reservas_histórico × ocorrências
         
         EXEMPLO PRÁTICO:
         - Ementa de segunda tem "Frango grelhado" com 1kg de frango por porção
-        - Histórico diz: Segunda almoço = 180 refeições totais
-        - Histórico diz: "Frango grelhado" = 50% das escolhas na segunda
-        - Cálculo: 180 refeições × 50% = 90 porções de frango
-        - Quantidade ingrediente: 1kg × 90 = 90kg de frango
+        - Histórico diz: "Frango grelhado" teve 90 reservas na segunda ao almoço
+        - Cálculo: 1kg × 90 reservas = 90kg de frango por cada segunda do período
+        
+        ementas: grafo já carregado por carregar_ementas (opcional)
         
         Retorna: necessidades_ajustadas por produto
         """
-        from datetime import timedelta
-        
-        ementas = self.ementa_repo.listar_por_periodo(data_inicio, data_fim)
+        if ementas is None:
+            ementas = self.carregar_ementas(data_inicio, data_fim)
+        historico = self.historico_repo.obter_tabela()
         necessidades_ajustadas = {}
         
-        # Mapa de dias da semana (0=segunda, 1=terça, ...)
+        # Mapa de dias da semana (1=segunda, 2=terça, ...)
         dias_semana_map = ["segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"]
         
         for ementa in ementas:
-            # Processar cada dia da ementa dentro do período selecionado
-            data_atual = max(ementa.data_inicio, data_inicio)
-            data_fim_ementa = min(ementa.data_fim, data_fim)
+            ocorrencias = contar_dias_semana(
+                max(ementa.data_inicio, data_inicio),
+                min(ementa.data_fim, data_fim)
+            )
             
-            while data_atual <= data_fim_ementa:
-                dia_semana_nome = dias_semana_map[data_atual.weekday()]
-                dia_semana_num = data_atual.weekday() + 1  # 1=Segunda, 2=Terça, etc
+            for dia_semana_num, vezes in ocorrencias.items():
+                dia_semana_nome = dias_semana_map[dia_semana_num - 1]
                 
                 # Processar apenas as refeições deste dia da semana
                 for refeicao in ementa.refeicoes:
-                    # Filtrar apenas refeições do dia da semana atual
                     if refeicao.dia_semana != dia_semana_num:
                         continue
-                    tipo_refeicao = refeicao.tipo.lower()
-                    descricao_prato = refeicao.descricao or ""
                     
-                    # PASSO 1: Buscar número de reservas deste prato específico no histórico
+                    # Número de reservas deste prato específico no histórico
                     # Ex: "Lasanha vegetariana" no almoço da quarta-feira teve 30 reservas
-                    numero_reservas_historico = self.historico_repo.obter_reservas_prato(
-                        dia_semana_nome, tipo_refeicao, descricao_prato
+                    numero_reservas_historico = historico.reservas_prato(
+                        dia_semana_nome, refeicao.tipo, refeicao.descricao or ""
                     )
-                    
+                    # Sem histórico para este prato específico, usar quantidade base (1 porção)
                     if numero_reservas_historico is None:
-                        # Sem histórico para este prato específico, usar quantidade base (1 porção)
-                        for item in refeicao.itens:
-                            produto = item.ingrediente
-                            quantidade = item.quantidade_estimada or 0
-                            necessidades_ajustadas[produto] = necessidades_ajustadas.get(produto, 0) + quantidade
-                        continue
+                        numero_reservas_historico = 1
                     
-                    # PASSO 2: Multiplicar quantidade de cada ingrediente pelo número de reservas
-                    # Exemplo: Lasanha com 1kg curgete teve 30 reservas → 1kg × 30 = 30kg
+                    # Exemplo: Lasanha com 1kg curgete teve 30 reservas → 1kg × 30 = 30kg por dia
                     for item in refeicao.itens:
                         produto = item.ingrediente
-                        quantidade_por_reserva = item.quantidade_estimada or 0
-                        
-                        # Quantidade total = quantidade_por_reserva × número_de_reservas_histórico
-                        # Exemplo: 1kg curgete × 30 reservas = 30kg de curgete
-                        quantidade_total = quantidade_por_reserva * numero_reservas_historico
-                        
+                        quantidade_total = (item.quantidade_estimada or 0) * numero_reservas_historico * vezes
                         necessidades_ajustadas[produto] = necessidades_ajustadas.get(produto, 0) + quantidade_total
-                
-                data_atual += timedelta(days=1)
         
         return necessidades_ajustadas
     
@@ -182,14 +280,31 @@ class AprovisionamentoService:
         2. Ajusta com RESERVAS REAIS de estudantes (não histórico)
         3. Calcula desvios percentuais
         4. Gera alertas se desvio > 10%
-        5. Salva no plano de produção
+        5. Salva no plano de produção como nova versão (lote) do período
         
-        Retorna: {"plano": [...], "alertas": [...]}
-        """
-        # Limpar planos anteriores para este período
-        self.plano_repo.limpar_todos()
+        Se as entradas do período (ementas e reservas) não mudaram desde a versão
+        vigente, essa versão é devolvida sem recalcular (reutilizado=True).
         
-        necessidades_base = self.calcular_necessidades(data_inicio, data_fim)
+        Retorna: {"plano": [...], "alertas": [...], "lote_id": ..., "reutilizado": ...}
+        """
+        ementas = self.carregar_ementas(data_inicio, data_fim)
+        assinatura = self._assinatura_plano(ementas, data_inicio, data_fim)
+        
+        vigente = self.plano_repo.obter_lote_vigente(data_inicio, data_fim)
+        if vigente and vigente.assinatura == assinatura:
+            plano = [
+                {
+                    "produto_nome": item.produto_nome,
+                    "quantidade_prevista": item.quantidade_prevista,
+                    "quantidade_realizada": item.quantidade_realizada,
+                    "desvio_percentual": item.desvio_percentual,
+                    "requer_alerta": item.requer_alerta
+                }
+                for item in self.plano_repo.listar_por_lote(vigente.id)
+            ]
+            return self._resultado_plano(plano, vigente, reutilizado=True)
+        
+        necessidades_base = self.calcular_necessidades(data_inicio, data_fim, ementas)
         
         # Usar RESERVAS REAIS (não previsão histórica)
         necessidades_ajustadas, reservas_por_produto = self.ajustar_com_reservas(
@@ -200,7 +315,6 @@ class AprovisionamentoService:
         todos_produtos = set(necessidades_base.keys()) | set(necessidades_ajustadas.keys())
         
         plano = []
-        alertas = []
         
         for produto in todos_produtos:
             qtd_planejada = necessidades_base.get(produto, 0)
@@ -209,86 +323,132 @@ class AprovisionamentoService:
             desvio = self.calcular_desvio(qtd_planejada, qtd_real)
             requer_alerta = self.gerar_alerta_desvio(desvio)
             
-            plano_item = {
+            plano.append({
                 "produto_nome": produto,
                 "quantidade_prevista": qtd_planejada,
                 "quantidade_realizada": qtd_real,
                 "desvio_percentual": round(desvio, 2),
                 "requer_alerta": requer_alerta
-            }
-            plano.append(plano_item)
-            
-            if requer_alerta:
+            })
+        
+        # Salvar no banco de dados como nova versão do período (numa só transação)
+        lote = self.plano_repo.registar_lote(data_inicio, data_fim, assinatura, plano)
+        
+        return self._resultado_plano(plano, lote, reutilizado=False)
+    
+    def _resultado_plano(self, plano: List[Dict], lote, reutilizado: bool) -> Dict:
+        alertas = []
+        for item in plano:
+            if item["requer_alerta"]:
+                desvio = self.calcular_desvio(item["quantidade_prevista"], item["quantidade_realizada"])
                 alertas.append({
-                    "produto": produto,
+                    "produto": item["produto_nome"],
                     "desvio": round(desvio, 2),
-                    "mensagem": f"⚠️ Desvio de {desvio:.1f}% no produto '{produto}'"
+                    "mensagem": f"⚠️ Desvio de {desvio:.1f}% no produto '{item['produto_nome']}'"
                 })
-            
-            # Salvar no banco de dados
-            self.plano_repo.criar(plano_item)
         
         return {
             "plano": plano,
             "alertas": alertas,
             "total_produtos": len(plano),
-            "produtos_com_alerta": len(alertas)
+            "produtos_com_alerta": len(alertas),
+            "lote_id": lote.id,
+            "data_calculo": lote.data_calculo,
+            "reutilizado": reutilizado
         }
     
-    def gerar_pedidos_fornecedores(self, data_inicio: date, data_fim: date, data_entrega: date) -> List:
+    def _assinatura_plano(self, ementas: List[EmentaLeitura], data_inicio: date, data_fim: date) -> str:
+        """Hash das entradas do plano: grafo das ementas do período e reservas por (refeição, pessoas)."""
+        reservas = self.reserva_repo.assinatura_por_periodo(data_inicio, data_fim)
+        return hashlib.sha256(repr((ementas, reservas)).encode("utf-8")).hexdigest()
+    
+    def calcular_alocacao(self, necessidades: Dict[str, int], data_inicio: date,
+                          data_fim: Optional[date] = None) -> ResultadoAlocacao:
+        """
+        Divide as necessidades pelos fornecedores aprovados (ver alocar_por_prioridade),
+        considerando capacidade, pedidos em aberto e intervalo de produção: tem de cobrir
+        data_inicio (data de entrega) ou intersetar [data_inicio, data_fim].
+        """
+        candidatos = self.pedido_repo.listar_candidatos(necessidades.keys(), data_inicio, data_fim)
+        return alocar_por_prioridade(necessidades, candidatos)
+    
+    def gerar_pedidos_fornecedores(self, data_inicio: date, data_fim: date, data_entrega: date) -> Dict:
         """
         ETAPA 4: Gera pedidos aos fornecedores aprovados
         
-        Ordem baseada na data de inscrição do fornecedor:
+        Cada necessidade é dividida pelos fornecedores aprovados do produto, por ordem
+        de data de inscrição (mais antigo primeiro), até à capacidade disponível de cada um
+        e apenas se data_entrega estiver no intervalo de produção do produto:
         - Fornecedor mais antigo = prioridade 1
         - Segundo mais antigo = prioridade 2
         - E assim por diante
         
-        Retorna: lista de pedidos criados
+        Retorna: pedidos criados (um por fornecedor/produto), faltas e erros
         """
         necessidades = self.calcular_necessidades(data_inicio, data_fim)
-        pedidos_criados = []
-        erros = []
+        alocacao = self.calcular_alocacao(necessidades, data_entrega)
         
-        for produto_nome, quantidade in necessidades.items():
-            try:
-                # Buscar produto no banco pelo nome
-                produto = self.produto_repo.buscar_por_nome(produto_nome)
-                
-                if not produto:
+        erros = []
+        sem_candidatos = [p for p in alocacao.faltas if alocacao.faltas[p] == necessidades[p]]
+        if sem_candidatos:
+            catalogo = self.produto_repo.buscar_por_nomes(sem_candidatos)
+            for produto_nome in sem_candidatos:
+                if produto_nome not in catalogo:
                     erros.append(f"Produto '{produto_nome}' não encontrado no catálogo")
-                    continue
-                
-                # Criar pedido (ordem automática por data_inscricao)
-                pedido = self.pedido_repo.criar_pedido(
-                    produto_id=produto.id,
-                    quantidade=quantidade,
-                    data_entrega=data_entrega
-                )
-                
-                pedidos_criados.append({
-                    "produto": produto_nome,
-                    "quantidade": quantidade,
-                    "fornecedor": pedido.fornecedor.nome,
-                    "ordem_prioridade": pedido.ordem_prioridade,
-                    "status": pedido.status
-                })
-                
-            except ValueError as e:
-                erros.append(str(e))
+                else:
+                    erros.append(
+                        f"Nenhum fornecedor aprovado com capacidade para o produto "
+                        f"{catalogo[produto_nome].nome} em {data_entrega}"
+                    )
+        
+        # Criar todos os pedidos numa só transação
+        self.pedido_repo.criar_pedidos_em_lote([
+            {
+                "fornecedor_id": linha.fornecedor_id,
+                "produto_id": linha.produto_id,
+                "quantidade_solicitada": linha.quantidade,
+                "data_entrega_prevista": data_entrega,
+                "ordem_prioridade": linha.ordem_prioridade
+            }
+            for linha in alocacao.linhas
+        ])
+        pedidos_criados = [
+            {
+                "produto": linha.produto,
+                "quantidade": linha.quantidade,
+                "fornecedor": linha.fornecedor_nome,
+                "fornecedor_id": linha.fornecedor_id,
+                "ordem_prioridade": linha.ordem_prioridade,
+                "status": "pendente"
+            }
+            for linha in alocacao.linhas
+        ]
         
         return {
             "pedidos_criados": pedidos_criados,
             "total": len(pedidos_criados),
+            "faltas": [
+                {
+                    "produto": produto,
+                    "quantidade_necessaria": necessidades[produto],
+                    "quantidade_em_falta": falta
+                }
+                for produto, falta in alocacao.faltas.items()
+            ],
             "erros": erros
         }
     
-    def listar_alertas(self) -> List:
-        """Lista todos os alertas de desvio > 10%"""
-        alertas_orm = self.plano_repo.listar_alertas()
+    def listar_alertas(self, data_inicio: Optional[date] = None,
+                       data_fim: Optional[date] = None) -> List:
+        """
+        Lista os alertas de desvio > 10% dos planos vigentes
+        (apenas do período indicado, se data_inicio/data_fim forem dados).
+        """
+        alertas_orm = self.plano_repo.listar_alertas(data_inicio, data_fim)
         
         return [
             {
+                "lote_id": alerta.lote_id,
                 "produto": alerta.produto_nome,
                 "quantidade_prevista": alerta.quantidade_prevista,
                 "quantidade_realizada": alerta.quantidade_realizada,
@@ -299,11 +459,30 @@ class AprovisionamentoService:
         ]
 
 
-# Singleton
-_service = None
+T = TypeVar("T")
+
+
+class AprovisionamentoServiceAsync:
+    """
+    AprovisionamentoService para rotas assíncronas.
+    Os cálculos (vários repositórios e a cache do histórico) correm sobre a
+    AsyncSession com run_sync; as leituras simples de reservas usam ReservaRepoAsync.
+    """
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.reserva_repo = ReservaRepoAsync(session)
+        self.idempotencia_repo = IdempotenciaRepoAsync(session)
+
+    async def executar(self, operacao: Callable[[AprovisionamentoService], T]) -> T:
+        """Executa operacao(service) com um AprovisionamentoService sobre a sessão assíncrona."""
+        return await self.session.run_sync(lambda sessao: operacao(AprovisionamentoService(sessao)))
+
+
+def get_aprovisionamento_service(db: Session = Depends(get_db)) -> AprovisionamentoService:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return AprovisionamentoService(db)
+
 
-def get_aprovisionamento_service() -> AprovisionamentoService:
-    global _service
-    if _service is None:
-        _service = AprovisionamentoService()
-    return _service
+async def get_aprovisionamento_service_async(db: AsyncSession = Depends(get_async_db)) -> AprovisionamentoServiceAsync:
+    """Como get_aprovisionamento_service, com a sessão assíncrona do pedido."""
+    return AprovisionamentoServiceAsync(db)
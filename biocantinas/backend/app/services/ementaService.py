@@ -3,15 +3,17 @@ from datetime import date, timedelta
 from random import choice, sample
 from ..dtos.ementaDTO import Ementa as EmentaDTO, EmentaCreate as EmentaCreateDTO, Refeicao as RefeicaoDTO, ItemRefeicao as ItemRefeicaoDTO
 from ..models.ementa import EmentaModel, RefeicaoModel, ItemRefeicaoModel
-from ..db.session import SessionLocal, init_db
-from ..repositories.ementaRepo import EmentaRepo
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..db.session import get_db, get_async_db
+from ..repositories.ementaRepo import EmentaRepo, EmentaRepoAsync
 from ..repositories.fornecedorRepo import FornecedorRepo
 
 
 class EmentaService:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.repo = EmentaRepo(self.session)
         self.fornecedor_repo = FornecedorRepo(self.session)
 
@@ -210,7 +212,8 @@ class EmentaService:
             refeicoes=refeicoes
         )
 
-    def _model_to_dto(self, model: EmentaModel) -> EmentaDTO:
+    @staticmethod
+    def _model_to_dto(model: EmentaModel) -> EmentaDTO:
         refeicoes = [
             RefeicaoDTO(
                 dia_semana=r.dia_semana,
@@ -237,7 +240,24 @@ class EmentaService:
         )
 
 
-_service = EmentaService()
+class EmentaServiceAsync:
+    """Leituras de EmentaService para rotas assíncronas."""
+    def __init__(self, session: AsyncSession):
+        self.repo = EmentaRepoAsync(session)
 
-def get_ementa_service() -> EmentaService:
-    return _service
+    async def listar_ementas(self) -> List[EmentaDTO]:
+        return [EmentaService._model_to_dto(m) for m in await self.repo.listar_ementas()]
+
+    async def obter_ementa(self, ementa_id: int) -> EmentaDTO | None:
+        m = await self.repo.obter_ementa(ementa_id)
+        return EmentaService._model_to_dto(m) if m else None
+
+
+def get_ementa_service(db: Session = Depends(get_db)) -> EmentaService:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return EmentaService(db)
+
+
+async def get_ementa_service_async(db: AsyncSession = Depends(get_async_db)) -> EmentaServiceAsync:
+    """Como get_ementa_service, com a sessão assíncrona do pedido."""
+    return EmentaServiceAsync(db)
@@ -1,15 +1,16 @@
 from datetime import date
 from typing import List
-from ..db.session import SessionLocal, init_db
+from fastapi import Depends
+from sqlalchemy.orm import Session
+from ..db.session import get_db
 from ..repositories.execucaoRefeicaoRepo import ExecucaoRefeicaoRepo
 from ..models.execucaoRefeicao import ExecucaoRefeicaoModel
 from ..dtos.execucaoRefeicaoDTO import ExecucaoRefeicao, ExecucaoRefeicaoCreate
 
 
 class ExecucaoRefeicaoService:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.repo = ExecucaoRefeicaoRepo(self.session)
 
     def criar_execucao(self, data: ExecucaoRefeicaoCreate) -> ExecucaoRefeicao:
@@ -42,7 +43,6 @@ class ExecucaoRefeicaoService:
         )
 
 
-_service = ExecucaoRefeicaoService()
-
-def get_execucaoRefeicao_service() -> ExecucaoRefeicaoService:
-    return _service
+def get_execucaoRefeicao_service(db: Session = Depends(get_db)) -> ExecucaoRefeicaoService:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return ExecucaoRefeicaoService(db)
@@ -2,19 +2,22 @@ from typing import List, Dict, Protocol
 from ..dtos.fornecedorDTO import Fornecedor as FornecedorDTO, OrdemFornecedor, FornecedorCreate as FornecedorCreateDTO
 from ..models.fornecedor import FornecedorModel
 from ..mappings.mappers import dto_to_model_create, model_to_dto
-from ..db.session import SessionLocal, init_db
-from ..repositories.fornecedorRepo import FornecedorRepo
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..db.session import get_db, get_async_db
+from ..repositories.fornecedorRepo import FornecedorRepo, FornecedorRepoAsync
 
 class Repository(Protocol):
     def criar_fornecedor(self, model: FornecedorModel) -> FornecedorModel: ...
     def listar_fornecedores(self) -> List[FornecedorModel]: ...
     def obter_fornecedor(self, fid: int) -> FornecedorModel | None: ...
+    def obter_por_usuario_id(self, usuario_id: int) -> FornecedorModel | None: ...
     def atualizar_fornecedor(self, f: FornecedorModel) -> None: ...
 
 class SqlRepository:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.repo = FornecedorRepo(self.session)
 
     def criar_fornecedor(self, model: FornecedorModel) -> FornecedorModel:
@@ -26,12 +29,15 @@ class SqlRepository:
     def obter_fornecedor(self, fid: int) -> FornecedorModel | None:
         return self.repo.obter_fornecedor(fid)
 
+    def obter_por_usuario_id(self, usuario_id: int) -> FornecedorModel | None:
+        return self.repo.obter_por_usuario_id(usuario_id)
+
     def atualizar_fornecedor(self, f: FornecedorModel) -> None:
         self.repo.atualizar_fornecedor(f)
 
 class Services:
-    def __init__(self, repo: Repository | None = None):
-        self.repo: Repository = repo or SqlRepository()
+    def __init__(self, repo: Repository):
+        self.repo: Repository = repo
 
     # CRUD + business
     def criar_fornecedor(self, data: FornecedorCreateDTO, usuario_id: int) -> FornecedorDTO:
@@ -58,11 +64,8 @@ class Services:
     
     def obter_fornecedor_por_usuario_id(self, usuario_id: int) -> FornecedorDTO | None:
         """Obtém fornecedor pelo ID do usuário"""
-        fornecedores = self.repo.listar_fornecedores()
-        for f in fornecedores:
-            if f.usuario_id == usuario_id:
-                return model_to_dto(f)
-        return None
+        m = self.repo.obter_por_usuario_id(usuario_id)
+        return model_to_dto(m) if m else None
 
     def aprovar_fornecedor(self, fid: int, aprovado: bool) -> FornecedorDTO:
         fornecedor = self.repo.obter_fornecedor(fid)
@@ -91,7 +94,28 @@ class Services:
             )
         return ordens
 
-_services = Services()
+class ServicesAsync:
+    """Leituras de Services para rotas assíncronas."""
+    def __init__(self, repo: FornecedorRepoAsync):
+        self.repo = repo
+
+    async def listar_fornecedores(self) -> List[FornecedorDTO]:
+        return [model_to_dto(m) for m in await self.repo.listar_fornecedores()]
+
+    async def obter_fornecedor(self, fid: int) -> FornecedorDTO | None:
+        m = await self.repo.obter_fornecedor(fid)
+        return model_to_dto(m) if m else None
+
+    async def obter_fornecedor_por_usuario_id(self, usuario_id: int) -> FornecedorDTO | None:
+        m = await self.repo.obter_por_usuario_id(usuario_id)
+        return model_to_dto(m) if m else None
+
+
+def get_services(db: Session = Depends(get_db)) -> Services:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return Services(SqlRepository(db))
+
 
-def get_services() -> Services:
-    return _services
+async def get_services_async(db: AsyncSession = Depends(get_async_db)) -> ServicesAsync:
+    """Como get_services, com a sessão assíncrona do pedido."""
+    return ServicesAsync(FornecedorRepoAsync(db))
@@ -1,116 +1,129 @@
 from sqlalchemy.orm import Session
 from app.db.models import (
-    RefeicaoORM, ItemRefeicaoORM, EmentaORM, ProdutoFornecedorORM, ExecucaoRefeicaoORM
+    RefeicaoORM, ItemRefeicaoORM, EmentaORM, ProdutoFornecedorORM, ExecucaoRefeicaoORM,
+    KPIDiaSnapshotORM, KPIEmentaSnapshotORM
 )
 from app.dtos.kpiDTO import (
     RefeicaoKPIDTO, IngredienteKPIDTO, DiaKPIDTO, EmentaKPIDTO,
-    DesperdícioRefeicaoDTO, DesperdícioDiaDTO, DesperdícioEmentaDTO, KPIConsolidadoDTO
+    DesperdícioRefeicaoDTO, DesperdícioDiaDTO, DesperdícioEmentaDTO, KPIConsolidadoDTO,
+    KPIEmentaLoteDTO, KPILoteDTO
 )
-from typing import List
+from app.repositories.indiceIngredientesRepo import IndiceIngredientesRepo, normalizar_ingrediente
+from app.repositories.kpiSnapshotRepo import KPISnapshotRepo
+from typing import Dict, List, NamedTuple, Optional
 from statistics import mean
 from datetime import date
 
+
+class _LinhaItemKPI(NamedTuple):
+    refeicao_id: int
+    ementa_id: int
+    dia_semana: int
+    tipo: str
+    descricao: Optional[str]
+    item_id: Optional[int]
+    ingrediente: Optional[str]
+    biologico: Optional[bool]
+    fornecedor_id: Optional[int]
+
+
 class KPIService:
     
     @staticmethod
-    def calcular_kpi_refeicao(session: Session, refeicao_id: int) -> RefeicaoKPIDTO:
+    def _consultar_itens_biologicos(session: Session, *filtros) -> List[_LinhaItemKPI]:
         """
-        Calcula a percentagem de produtos biológicos numa refeição
+        Uma única consulta agrupada refeições → itens → produtos.
+        O produto de cada item é o indicado em produto_id; se não existir,
+        o ingrediente é resolvido pelo índice de ingredientes (uma consulta para todos).
+        Devolve uma linha por item (ou uma linha sem item para refeições vazias).
         """
-        refeicao = session.query(RefeicaoORM).filter(RefeicaoORM.id == refeicao_id).first()
-        
-        if not refeicao:
-            raise ValueError(f"Refeição com ID {refeicao_id} não encontrada")
-        
-        itens = session.query(ItemRefeicaoORM).filter(
-            ItemRefeicaoORM.refeicao_id == refeicao_id
-        ).all()
-        
-        if not itens:
-            return RefeicaoKPIDTO(
-                refeicao_id=refeicao_id,
-                refeicao_descricao=refeicao.descricao or "",
-                total_ingredientes=0,
-                ingredientes_biologicos=0,
-                percentagem_biologica=0.0,
-                ingredientes=[]
+        linhas = (
+            session.query(
+                RefeicaoORM.id.label("refeicao_id"),
+                RefeicaoORM.ementa_id,
+                RefeicaoORM.dia_semana,
+                RefeicaoORM.tipo,
+                RefeicaoORM.descricao,
+                ItemRefeicaoORM.id.label("item_id"),
+                ItemRefeicaoORM.ingrediente,
+                ProdutoFornecedorORM.id.label("produto_id"),
+                ProdutoFornecedorORM.biologico,
+                ProdutoFornecedorORM.fornecedor_id,
             )
+            .outerjoin(ItemRefeicaoORM, ItemRefeicaoORM.refeicao_id == RefeicaoORM.id)
+            .outerjoin(ProdutoFornecedorORM, ProdutoFornecedorORM.id == ItemRefeicaoORM.produto_id)
+            .filter(*filtros)
+            .order_by(RefeicaoORM.id, ItemRefeicaoORM.id)
+            .all()
+        )
         
-        ingredientes_kpi = []
-        biologicos_count = 0
-        
-        for item in itens:
-            # Tentar buscar o produto pelo produto_id se existir
-            produto = None
-            if item.produto_id:
-                produto = session.query(ProdutoFornecedorORM).filter(
-                    ProdutoFornecedorORM.id == item.produto_id
-                ).first()
-            
-            # Se não tem produto_id, tentar buscar pelo nome (mais flexível)
-            if not produto:
-                produto = session.query(ProdutoFornecedorORM).filter(
-                    ProdutoFornecedorORM.nome.ilike(f"%{item.ingrediente}%")
-                ).first()
-            
-            is_biologico = produto.biologico if produto else False
-            
-            if is_biologico:
-                biologicos_count += 1
-            
-            ingredientes_kpi.append(
+        por_resolver = [l.ingrediente for l in linhas if l.item_id is not None and l.produto_id is None]
+        produtos_por_nome = IndiceIngredientesRepo(session).resolver_produtos(por_resolver)
+        
+        resultado = []
+        for l in linhas:
+            biologico, fornecedor_id = l.biologico, l.fornecedor_id
+            if l.item_id is not None and l.produto_id is None:
+                produto = produtos_por_nome.get(normalizar_ingrediente(l.ingrediente))
+                biologico = produto.biologico if produto else False
+                fornecedor_id = produto.fornecedor_id if produto else None
+            resultado.append(_LinhaItemKPI(
+                l.refeicao_id, l.ementa_id, l.dia_semana, l.tipo, l.descricao,
+                l.item_id, l.ingrediente, biologico, fornecedor_id
+            ))
+        return resultado
+    
+    @staticmethod
+    def _agregar_refeicoes(linhas: List[_LinhaItemKPI]) -> Dict[int, tuple]:
+        """
+        Agrupa as linhas de _consultar_itens_biologicos por refeição.
+        Retorna: {refeicao_id: (linha_refeicao, RefeicaoKPIDTO)} pela ordem de id
+        """
+        ingredientes_por_refeicao: Dict[int, list] = {}
+        primeira_linha = {}
+        
+        for linha in linhas:
+            ingredientes = ingredientes_por_refeicao.setdefault(linha.refeicao_id, [])
+            primeira_linha.setdefault(linha.refeicao_id, linha)
+            if linha.item_id is None:
+                continue
+            ingredientes.append(
                 IngredienteKPIDTO(
-                    nome=item.ingrediente,
-                    biologico=is_biologico,
-                    fornecedor_id=produto.fornecedor_id if produto else None
+                    nome=linha.ingrediente,
+                    biologico=bool(linha.biologico),
+                    fornecedor_id=linha.fornecedor_id
                 )
             )
-
-        total_ingredientes = len(itens)
-        percentagem = (biologicos_count / total_ingredientes * 100) if total_ingredientes > 0 else 0.0
         
-        return RefeicaoKPIDTO(
-            refeicao_id=refeicao_id,
-            refeicao_descricao=refeicao.descricao or "",
-            total_ingredientes=total_ingredientes,
-            ingredientes_biologicos=biologicos_count,
-            percentagem_biologica=round(percentagem, 2),
-            ingredientes=ingredientes_kpi
-        )
+        resultado = {}
+        for refeicao_id, ingredientes in ingredientes_por_refeicao.items():
+            linha = primeira_linha[refeicao_id]
+            total_ingredientes = len(ingredientes)
+            biologicos_count = sum(1 for i in ingredientes if i.biologico)
+            percentagem = (biologicos_count / total_ingredientes * 100) if total_ingredientes > 0 else 0.0
+            
+            resultado[refeicao_id] = (linha, RefeicaoKPIDTO(
+                refeicao_id=refeicao_id,
+                refeicao_descricao=linha.descricao or "",
+                total_ingredientes=total_ingredientes,
+                ingredientes_biologicos=biologicos_count,
+                percentagem_biologica=round(percentagem, 2),
+                ingredientes=ingredientes
+            ))
+        
+        return resultado
     
     @staticmethod
-    def calcular_kpi_dia(session: Session, ementa_id: int, dia_semana: int) -> DiaKPIDTO:
+    def _kpi_dia(ementa_id: int, dia_semana: int, refeicoes_kpi: List[tuple]) -> DiaKPIDTO:
         """
-        Calcula a percentagem de produtos biológicos para um dia inteiro (almoço + jantar)
+        Calcula o KPI de um dia a partir das refeições já agregadas (ordenadas por id)
         """
-        refeicoes = session.query(RefeicaoORM).filter(
-            RefeicaoORM.ementa_id == ementa_id,
-            RefeicaoORM.dia_semana == dia_semana
-        ).all()
-        
-        percentagens = []
-        
-        for refeicao in refeicoes:
-            kpi = KPIService.calcular_kpi_refeicao(session, refeicao.id)
-            percentagens.append(kpi.percentagem_biologica)
-        
+        percentagens = [kpi.percentagem_biologica for _, kpi in refeicoes_kpi]
         media_percentagem = mean(percentagens) if percentagens else 0.0
         
-        # Separar por tipo de refeição
-        almoco = session.query(RefeicaoORM).filter(
-            RefeicaoORM.ementa_id == ementa_id,
-            RefeicaoORM.dia_semana == dia_semana,
-            RefeicaoORM.tipo == "almoço"
-        ).first()
-        
-        jantar = session.query(RefeicaoORM).filter(
-            RefeicaoORM.ementa_id == ementa_id,
-            RefeicaoORM.dia_semana == dia_semana,
-            RefeicaoORM.tipo == "jantar"
-        ).first()
-        
-        perc_almoco = KPIService.calcular_kpi_refeicao(session, almoco.id).percentagem_biologica if almoco else 0.0
-        perc_jantar = KPIService.calcular_kpi_refeicao(session, jantar.id).percentagem_biologica if jantar else 0.0
+        # Separar por tipo de refeição (a primeira de cada tipo)
+        perc_almoco = next((kpi.percentagem_biologica for linha, kpi in refeicoes_kpi if linha.tipo == "almoço"), 0.0)
+        perc_jantar = next((kpi.percentagem_biologica for linha, kpi in refeicoes_kpi if linha.tipo == "jantar"), 0.0)
         
         return DiaKPIDTO(
             ementa_id=ementa_id,
@@ -121,38 +134,71 @@ class KPIService:
         )
     
     @staticmethod
-    def calcular_kpi_ementa(session: Session, ementa_id: int) -> EmentaKPIDTO:
+    def _kpi_ementa(ementa: EmentaORM, refeicoes_kpi: List[tuple]) -> EmentaKPIDTO:
         """
-        Calcula a percentagem média de produtos biológicos para uma ementa completa
+        Calcula o KPI de uma ementa a partir das suas refeições já agregadas
         """
-        ementa = session.query(EmentaORM).filter(EmentaORM.id == ementa_id).first()
-        
-        if not ementa:
-            raise ValueError(f"Ementa com ID {ementa_id} não encontrada")
-        
-        dias_kpi = []
-        percentagens_dias = []
+        por_dia: Dict[int, list] = {}
+        for linha, kpi in refeicoes_kpi:
+            por_dia.setdefault(linha.dia_semana, []).append((linha, kpi))
         
         # Calcular para cada dia da semana (1-5 = Segunda a Sexta)
-        for dia_semana in range(1, 6):
-            try:
-                dia_kpi = KPIService.calcular_kpi_dia(session, ementa_id, dia_semana)
-                dias_kpi.append(dia_kpi)
-                percentagens_dias.append(dia_kpi.media_percentagem_biologica)
-            except:
-                # Dia sem refeições, skip
-                pass
-        
+        dias_kpi = [
+            KPIService._kpi_dia(ementa.id, dia_semana, por_dia.get(dia_semana, []))
+            for dia_semana in range(1, 6)
+        ]
+        percentagens_dias = [d.media_percentagem_biologica for d in dias_kpi]
         media_total = mean(percentagens_dias) if percentagens_dias else 0.0
         
         return EmentaKPIDTO(
-            ementa_id=ementa_id,
+            ementa_id=ementa.id,
             ementa_nome=ementa.nome,
             media_percentagem_biologica=round(media_total, 2),
             dias=dias_kpi
         )
     
+    @staticmethod
+    def calcular_kpi_refeicao(session: Session, refeicao_id: int) -> RefeicaoKPIDTO:
+        """
+        Calcula a percentagem de produtos biológicos numa refeição
+        """
+        linhas = KPIService._consultar_itens_biologicos(session, RefeicaoORM.id == refeicao_id)
+        
+        if not linhas:
+            raise ValueError(f"Refeição com ID {refeicao_id} não encontrada")
+        
+        _, kpi = KPIService._agregar_refeicoes(linhas)[refeicao_id]
+        return kpi
+    
+    @staticmethod
+    def calcular_kpi_dia(session: Session, ementa_id: int, dia_semana: int) -> DiaKPIDTO:
+        """
+        Calcula a percentagem de produtos biológicos para um dia inteiro (almoço + jantar)
+        """
+        linhas = KPIService._consultar_itens_biologicos(
+            session,
+            RefeicaoORM.ementa_id == ementa_id,
+            RefeicaoORM.dia_semana == dia_semana
+        )
+        refeicoes_kpi = list(KPIService._agregar_refeicoes(linhas).values())
+        return KPIService._kpi_dia(ementa_id, dia_semana, refeicoes_kpi)
+    
+    @staticmethod
+    def calcular_kpi_ementa(session: Session, ementa_id: int) -> EmentaKPIDTO:
+        """
+        Calcula a percentagem média de produtos biológicos para uma ementa completa
+        """
+        ementa = session.get(EmentaORM, ementa_id)
+        
+        if not ementa:
+            raise ValueError(f"Ementa com ID {ementa_id} não encontrada")
+        
+        linhas = KPIService._consultar_itens_biologicos(session, RefeicaoORM.ementa_id == ementa_id)
+        refeicoes_kpi = list(KPIService._agregar_refeicoes(linhas).values())
+        return KPIService._kpi_ementa(ementa, refeicoes_kpi)
+    
     # ==== MÉTODOS DE DESPERDÍCIO ====
+    # Lêem as tabelas materializadas mantidas por KPISnapshotRepo
     
     @staticmethod
     def calcular_desperdicio_refeicao(session: Session, refeicao_id: int, data_execucao: date = None) -> DesperdícioRefeicaoDTO:
@@ -160,22 +206,28 @@ class KPIService:
         Calcula desperdício de uma refeição específica.
         Se data_execucao não for fornecida, usa a mais recente.
         """
-        refeicao = session.query(RefeicaoORM).filter(RefeicaoORM.id == refeicao_id).first()
+        refeicao = session.get(RefeicaoORM, refeicao_id)
         
         if not refeicao:
             raise ValueError(f"Refeição com ID {refeicao_id} não encontrada")
         
-        # Buscar execução da refeição
-        query = session.query(ExecucaoRefeicaoORM).filter(
-            ExecucaoRefeicaoORM.refeicao_id == refeicao_id
-        )
-        
         if data_execucao:
-            execucao = query.filter(ExecucaoRefeicaoORM.data_execucao == data_execucao).first()
+            execucao = session.query(ExecucaoRefeicaoORM).filter(
+                ExecucaoRefeicaoORM.refeicao_id == refeicao_id,
+                ExecucaoRefeicaoORM.data_execucao == data_execucao
+            ).first()
+            valores = (
+                execucao.data_execucao, execucao.quantidade_produzida,
+                execucao.quantidade_servida, execucao.quantidade_nao_servida
+            ) if execucao else None
         else:
-            execucao = query.order_by(ExecucaoRefeicaoORM.data_execucao.desc()).first()
+            snap = KPISnapshotRepo(session).obter_refeicao(refeicao)
+            valores = (
+                snap.ultima_data_execucao, snap.ultima_quantidade_produzida,
+                snap.ultima_quantidade_servida, snap.ultima_quantidade_nao_servida
+            ) if snap and snap.ultima_execucao_id is not None else None
         
-        if not execucao:
+        if not valores:
             # Se não tem execução, retornar dados zerados
             return DesperdícioRefeicaoDTO(
                 refeicao_id=refeicao_id,
@@ -188,9 +240,7 @@ class KPIService:
                 taxa_servida=0.0
             )
         
-        total_prod = execucao.quantidade_produzida
-        total_serv = execucao.quantidade_servida
-        total_nao_serv = execucao.quantidade_nao_servida
+        data_exec, total_prod, total_serv, total_nao_serv = valores
         
         taxa_desp = (total_nao_serv / total_prod * 100) if total_prod > 0 else 0.0
         taxa_serv = (total_serv / total_prod * 100) if total_prod > 0 else 0.0
@@ -198,7 +248,7 @@ class KPIService:
         return DesperdícioRefeicaoDTO(
             refeicao_id=refeicao_id,
             refeicao_descricao=refeicao.descricao or "",
-            data_execucao=str(execucao.data_execucao),
+            data_execucao=str(data_exec),
             quantidade_produzida=total_prod,
             quantidade_servida=total_serv,
             quantidade_nao_servida=total_nao_serv,
@@ -207,16 +257,11 @@ class KPIService:
         )
     
     @staticmethod
-    def calcular_desperdicio_dia(session: Session, ementa_id: int, dia_semana: int) -> DesperdícioDiaDTO:
+    def _desperdicio_dia(ementa_id: int, dia_semana: int, snap: KPIDiaSnapshotORM = None) -> DesperdícioDiaDTO:
         """
-        Calcula desperdício agregado de um dia (almoço + jantar)
+        Converte o rollup de um dia em DTO (dia sem refeições → valores zerados)
         """
-        refeicoes = session.query(RefeicaoORM).filter(
-            RefeicaoORM.ementa_id == ementa_id,
-            RefeicaoORM.dia_semana == dia_semana
-        ).all()
-        
-        if not refeicoes:
+        if not snap:
             return DesperdícioDiaDTO(
                 ementa_id=ementa_id,
                 dia_semana=dia_semana,
@@ -228,98 +273,68 @@ class KPIService:
                 taxa_servida_media=0.0
             )
         
-        totais_prod = 0
-        totais_serv = 0
-        totais_nao_serv = 0
-        taxas_desp = []
-        
-        for refeicao in refeicoes:
-            execucoes = session.query(ExecucaoRefeicaoORM).filter(
-                ExecucaoRefeicaoORM.refeicao_id == refeicao.id
-            ).all()
-            
-            for exec in execucoes:
-                totais_prod += exec.quantidade_produzida
-                totais_serv += exec.quantidade_servida
-                totais_nao_serv += exec.quantidade_nao_servida
-                
-                if exec.quantidade_produzida > 0:
-                    taxa = (exec.quantidade_nao_servida / exec.quantidade_produzida * 100)
-                    taxas_desp.append(taxa)
-        
-        taxa_desp_media = mean(taxas_desp) if taxas_desp else 0.0
-        taxa_serv_media = (totais_serv / totais_prod * 100) if totais_prod > 0 else 0.0
-        
-        # Determinar tipo de refeição
-        tipos = set(r.tipo for r in refeicoes)
-        tipo_str = " + ".join(sorted(tipos)) if tipos else "completo"
+        taxa_desp_media = (snap.soma_taxas_desperdicio / snap.execucoes_com_producao) if snap.execucoes_com_producao > 0 else 0.0
+        taxa_serv_media = (snap.total_servido / snap.total_produzido * 100) if snap.total_produzido > 0 else 0.0
         
         return DesperdícioDiaDTO(
             ementa_id=ementa_id,
             dia_semana=dia_semana,
-            tipo_refeicao=tipo_str,
-            total_produzido=totais_prod,
-            total_servido=totais_serv,
-            total_nao_servido=totais_nao_serv,
+            tipo_refeicao=snap.tipo_refeicao or "completo",
+            total_produzido=snap.total_produzido,
+            total_servido=snap.total_servido,
+            total_nao_servido=snap.total_nao_servido,
             taxa_desperdicio_media=round(taxa_desp_media, 2),
             taxa_servida_media=round(taxa_serv_media, 2)
         )
     
     @staticmethod
-    def calcular_desperdicio_ementa(session: Session, ementa_id: int) -> DesperdícioEmentaDTO:
+    def calcular_desperdicio_dia(session: Session, ementa_id: int, dia_semana: int) -> DesperdícioDiaDTO:
         """
-        Calcula desperdício agregado de uma ementa completa
+        Calcula desperdício agregado de um dia (almoço + jantar)
         """
-        ementa = session.query(EmentaORM).filter(EmentaORM.id == ementa_id).first()
-        
-        if not ementa:
-            raise ValueError(f"Ementa com ID {ementa_id} não encontrada")
+        snap = KPISnapshotRepo(session).obter_dia(ementa_id, dia_semana)
+        return KPIService._desperdicio_dia(ementa_id, dia_semana, snap)
+    
+    @staticmethod
+    def _desperdicio_ementa(snap: KPIEmentaSnapshotORM, dias: List[KPIDiaSnapshotORM]) -> DesperdícioEmentaDTO:
+        """
+        Converte o rollup de uma ementa (e dos seus dias com produção) em DTO
+        """
+        dias_desp = [KPIService._desperdicio_dia(snap.ementa_id, d.dia_semana, d) for d in dias]
         
-        dias_desp = []
-        totais_prod = 0
-        totais_serv = 0
-        totais_nao_serv = 0
-        
-        # Calcular para cada dia da semana (1-5)
-        for dia_semana in range(1, 6):
-            try:
-                dia_desp = KPIService.calcular_desperdicio_dia(session, ementa_id, dia_semana)
-                if dia_desp.total_produzido > 0:  # Apenas incluir dias com dados
-                    dias_desp.append(dia_desp)
-                    totais_prod += dia_desp.total_produzido
-                    totais_serv += dia_desp.total_servido
-                    totais_nao_serv += dia_desp.total_nao_servido
-            except:
-                pass
-        
-        taxa_desp_geral = (totais_nao_serv / totais_prod * 100) if totais_prod > 0 else 0.0
-        taxa_serv_geral = (totais_serv / totais_prod * 100) if totais_prod > 0 else 0.0
+        totais_prod = snap.total_produzido
+        taxa_desp_geral = (snap.total_nao_servido / totais_prod * 100) if totais_prod > 0 else 0.0
+        taxa_serv_geral = (snap.total_servido / totais_prod * 100) if totais_prod > 0 else 0.0
         
         return DesperdícioEmentaDTO(
-            ementa_id=ementa_id,
-            ementa_nome=ementa.nome,
+            ementa_id=snap.ementa_id,
+            ementa_nome=snap.ementa_nome,
             total_produzido=totais_prod,
-            total_servido=totais_serv,
-            total_nao_servido=totais_nao_serv,
+            total_servido=snap.total_servido,
+            total_nao_servido=snap.total_nao_servido,
             taxa_desperdicio_geral=round(taxa_desp_geral, 2),
             taxa_servida_geral=round(taxa_serv_geral, 2),
             dias=dias_desp
         )
     
     @staticmethod
-    @staticmethod
-    def calcular_kpi_consolidado(session: Session, ementa_id: int) -> KPIConsolidadoDTO:
+    def calcular_desperdicio_ementa(session: Session, ementa_id: int) -> DesperdícioEmentaDTO:
         """
-        Retorna KPI consolidado: biológico + desperdício
+        Calcula desperdício agregado de uma ementa completa
         """
-        # Calcular biológico
-        kpi_bio = KPIService.calcular_kpi_ementa(session, ementa_id)
+        repo = KPISnapshotRepo(session)
+        snap = repo.obter_ementa(ementa_id)
         
-        # Calcular desperdício
-        kpi_desp = KPIService.calcular_desperdicio_ementa(session, ementa_id)
+        if not snap:
+            raise ValueError(f"Ementa com ID {ementa_id} não encontrada")
         
+        # Apenas dias 1-5 com dados
+        return KPIService._desperdicio_ementa(snap, repo.listar_dias_com_producao(ementa_id))
+    
+    @staticmethod
+    def _consolidado(kpi_bio: EmentaKPIDTO, kpi_desp: DesperdícioEmentaDTO) -> KPIConsolidadoDTO:
         return KPIConsolidadoDTO(
-            ementa_id=ementa_id,
+            ementa_id=kpi_bio.ementa_id,
             ementa_nome=kpi_bio.ementa_nome,
             percentagem_biologica=kpi_bio.media_percentagem_biologica,
             taxa_desperdicio=kpi_desp.taxa_desperdicio_geral,
@@ -327,4 +342,70 @@ class KPIService:
             total_produzido=kpi_desp.total_produzido,
             total_servido=kpi_desp.total_servido,
             total_nao_servido=kpi_desp.total_nao_servido
-        )
\ No newline at end of file
+        )
+    
+    @staticmethod
+    def calcular_kpi_consolidado(session: Session, ementa_id: int) -> KPIConsolidadoDTO:
+        """
+        Retorna KPI consolidado: biológico + desperdício
+        """
+        # Calcular biológico
+        kpi_bio = KPIService.calcular_kpi_ementa(session, ementa_id)
+        
+        # Calcular desperdício
+        kpi_desp = KPIService.calcular_desperdicio_ementa(session, ementa_id)
+        
+        return KPIService._consolidado(kpi_bio, kpi_desp)
+    
+    # ==== KPIs EM LOTE ====
+    
+    @staticmethod
+    def calcular_kpi_ementas(session: Session, ementa_ids: List[int] = None,
+                             data_inicio: date = None, data_fim: date = None) -> KPILoteDTO:
+        """
+        Calcula KPIs biológicos, de desperdício e consolidados de várias ementas
+        numa única passagem: uma consulta de itens para todas as ementas e
+        duas consultas aos rollups de desperdício.
+        
+        Seleciona as ementas pelos ids indicados ou, em alternativa, pelas que
+        se sobrepõem ao período [data_inicio, data_fim].
+        """
+        query = session.query(EmentaORM)
+        if ementa_ids:
+            query = query.filter(EmentaORM.id.in_(ementa_ids))
+        else:
+            query = query.filter(EmentaORM.data_inicio <= data_fim, EmentaORM.data_fim >= data_inicio)
+        ementas = query.order_by(EmentaORM.data_inicio, EmentaORM.id).all()
+        ids = [e.id for e in ementas]
+        
+        # Biológico: agrupar refeições por ementa
+        linhas = KPIService._consultar_itens_biologicos(session, RefeicaoORM.ementa_id.in_(ids)) if ids else []
+        refeicoes_por_ementa: Dict[int, list] = {}
+        for linha, kpi in KPIService._agregar_refeicoes(linhas).values():
+            refeicoes_por_ementa.setdefault(linha.ementa_id, []).append((linha, kpi))
+        
+        # Desperdício: rollups materializados
+        snapshot_repo = KPISnapshotRepo(session)
+        snaps = snapshot_repo.obter_ementas(ids)
+        dias_por_ementa = snapshot_repo.listar_dias_com_producao_por_ementa(ids) if ids else {}
+        
+        resultados = []
+        for ementa in ementas:
+            kpi_bio = KPIService._kpi_ementa(ementa, refeicoes_por_ementa.get(ementa.id, []))
+            kpi_desp = KPIService._desperdicio_ementa(snaps[ementa.id], dias_por_ementa.get(ementa.id, []))
+            resultados.append(KPIEmentaLoteDTO(
+                ementa_id=ementa.id,
+                ementa_nome=ementa.nome,
+                data_inicio=ementa.data_inicio,
+                data_fim=ementa.data_fim,
+                consolidado=KPIService._consolidado(kpi_bio, kpi_desp),
+                biologico=kpi_bio,
+                desperdicio=kpi_desp
+            ))
+        
+        encontrados = set(ids)
+        return KPILoteDTO(
+            total=len(resultados),
+            ementas=resultados,
+            ementas_nao_encontradas=[eid for eid in (ementa_ids or []) if eid not in encontrados]
+        )
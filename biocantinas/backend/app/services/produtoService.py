@@ -2,13 +2,14 @@ from typing import List
 from ..repositories.produtoRepo import ProdutoRepo
 from ..models.produto import ProdutoFornecedorModel
 from ..dtos.produtoDTO import ProdutoDTO, ProdutoCreateDTO, ProdutoUpdateDTO
-from ..db.session import SessionLocal, init_db
+from fastapi import Depends
+from sqlalchemy.orm import Session
+from ..db.session import get_db
 
 
 class ProdutoService:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.repo = ProdutoRepo(self.session)
 
     def criar_produto(self, fornecedor_id: int, data: ProdutoCreateDTO) -> ProdutoDTO:
@@ -88,7 +89,6 @@ class ProdutoService:
         )
 
 
-_service = ProdutoService()
-
-def get_produto_service() -> ProdutoService:
-    return _service
+def get_produto_service(db: Session = Depends(get_db)) -> ProdutoService:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return ProdutoService(db)
@@ -0,0 +1,248 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from ..db.session import SessionLocal
+from ..dtos.aprovisionamentoDTO import ReservaRefeicaoDTO
+from ..repositories.reservaRepo import ReservaRepo, CapacidadeEsgotada, RefeicaoNaoEncontrada
+from ..repositories.idempotenciaRepo import IdempotenciaRepo
+from ..utils.metricas import resumo_latencias
+
+
+class FilaReservasCheia(Exception):
+    """A fila de reservas atingiu o limite; o pedido deve ser repetido mais tarde."""
+
+
+@dataclass
+class PedidoReserva:
+    utilizador_id: int
+    refeicao_id: int
+    quantidade_pessoas: int
+    chave: Optional[str] = None                      # Idempotency-Key do cliente
+    submetido: float = field(default_factory=time.perf_counter)
+    resultado: Future = field(default_factory=Future)
+
+
+class FilaReservas:
+    """
+    Ingestão de reservas com group commit: os pedidos entram numa fila limitada e
+    uma thread de escrita grava-os em lotes — até lote_max reservas, ou as que
+    chegarem em espera_ms depois da primeira — numa só transação.
+
+    Cada pedido recebe um Future que só é resolvido depois do commit do seu lote
+    (confirmação durável), ou falha com CapacidadeEsgotada se a refeição estiver
+    cheia (RefeicaoNaoEncontrada se não existir); se o lote falhar, as reservas são regravadas uma a uma para que só as
+    inválidas falhem. Com a fila cheia, submeter levanta
+    FilaReservasCheia em vez de acumular pedidos.
+    """
+    def __init__(self, lote_max: int, espera_ms: float, fila_max: int,
+                 limpeza_s: float = 300, amostras: int = 1000):
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self.limpeza_s = limpeza_s
+        self._ultima_limpeza = time.monotonic()
+        self._fila: "queue.Queue[Optional[PedidoReserva]]" = queue.Queue(maxsize=fila_max)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._inicio = time.time()
+        self.submetidas = 0
+        self.gravadas = 0
+        self.falhadas = 0
+        self.sem_capacidade = 0
+        self.rejeitadas = 0
+        self.chaves_expiradas = 0
+        self.lotes = 0
+        self.maior_lote = 0
+        self._flush_ms = deque(maxlen=amostras)
+        self._confirmacao_ms = deque(maxlen=amostras)
+
+    # ==== CICLO DE VIDA ====
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="fila-reservas", daemon=True)
+                self._thread.start()
+
+    def parar(self, timeout: float = 10) -> None:
+        """Grava o que estiver na fila e termina a thread de escrita."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._fila.put(None)
+            thread.join(timeout)
+
+    # ==== SUBMISSÃO ====
+
+    def submeter(self, utilizador_id: int, refeicao_id: int, quantidade_pessoas: int = 1,
+                 chave: Optional[str] = None) -> Future:
+        """
+        Enfileira uma reserva; o Future resolve com a ReservaRefeicaoDTO gravada.
+        Com chave, a chave de idempotência é registada na transação da reserva; uma
+        chave ainda válida já usada faz o Future falhar com IntegrityError.
+        """
+        self.iniciar()
+        pedido = PedidoReserva(utilizador_id, refeicao_id, quantidade_pessoas, chave)
+        try:
+            self._fila.put_nowait(pedido)
+        except queue.Full:
+            with self._lock:
+                self.rejeitadas += 1
+            raise FilaReservasCheia("Demasiadas reservas em simultâneo; tente novamente")
+        with self._lock:
+            self.submetidas += 1
+        return pedido.resultado
+
+    # ==== THREAD DE ESCRITA ====
+
+    def _executar(self) -> None:
+        while True:
+            pedido = self._fila.get()
+            if pedido is None:
+                return
+            lote = [pedido]
+            limite = time.perf_counter() + self.espera
+            terminar = False
+            while len(lote) < self.lote_max:
+                restante = limite - time.perf_counter()
+                try:
+                    seguinte = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if seguinte is None:
+                    terminar = True
+                    break
+                lote.append(seguinte)
+            self._gravar(lote)
+            if terminar:
+                # Drenar o que ainda estiver na fila antes de sair
+                resto = []
+                while True:
+                    try:
+                        seguinte = self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    if seguinte is not None:
+                        resto.append(seguinte)
+                for i in range(0, len(resto), self.lote_max):
+                    self._gravar(resto[i:i + self.lote_max])
+                return
+
+    def _gravar(self, lote: List[PedidoReserva]) -> None:
+        inicio = time.perf_counter()
+        try:
+            gravadas = self._gravar_transacao(lote)
+        except Exception:
+            # Isolar as reservas inválidas: regravar uma a uma
+            gravadas = []
+            for pedido in lote:
+                try:
+                    gravadas.extend(self._gravar_transacao([pedido]))
+                except Exception as e:
+                    pedido.resultado.set_exception(e)
+        fim = time.perf_counter()
+
+        confirmadas = []
+        sem_capacidade = 0
+        for pedido, reserva in gravadas:
+            if isinstance(reserva, Exception):
+                pedido.resultado.set_exception(reserva)
+                sem_capacidade += isinstance(reserva, CapacidadeEsgotada)
+            else:
+                pedido.resultado.set_result(reserva)
+                confirmadas.append(pedido)
+        with self._lock:
+            self.lotes += 1
+            self.maior_lote = max(self.maior_lote, len(lote))
+            self.gravadas += len(confirmadas)
+            self.sem_capacidade += sem_capacidade
+            self.falhadas += len(lote) - len(confirmadas) - sem_capacidade
+            self._flush_ms.append((fim - inicio) * 1000)
+            self._confirmacao_ms.extend((fim - p.submetido) * 1000 for p in confirmadas)
+        self._limpar_idempotencia()
+
+    def _limpar_idempotencia(self) -> None:
+        """Apaga as chaves de idempotência expiradas, no máximo uma vez por limpeza_s."""
+        agora = time.monotonic()
+        if agora - self._ultima_limpeza < self.limpeza_s:
+            return
+        self._ultima_limpeza = agora
+        session = SessionLocal()
+        try:
+            removidas = IdempotenciaRepo(session).remover_expiradas()
+        except Exception:
+            session.rollback()
+            return
+        finally:
+            session.close()
+        with self._lock:
+            self.chaves_expiradas += removidas
+
+    @staticmethod
+    def _gravar_transacao(lote: List[PedidoReserva]) -> List[tuple]:
+        """
+        Grava o lote numa transação; retorna (pedido, ReservaRefeicaoDTO) após o commit,
+        com a exceção no lugar da reserva se a refeição não existe (RefeicaoNaoEncontrada)
+        ou não tinha capacidade (CapacidadeEsgotada).
+        """
+        session = SessionLocal()
+        try:
+            repo = ReservaRepo(session)
+            existentes = repo.refeicoes_existentes(p.refeicao_id for p in lote)
+            validos = [i for i, p in enumerate(lote) if p.refeicao_id in existentes]
+            reservas = repo.criar_varias([
+                (lote[i].utilizador_id, lote[i].refeicao_id, lote[i].quantidade_pessoas) for i in validos
+            ])
+            resultados: List[object] = [
+                RefeicaoNaoEncontrada(f"Refeição {p.refeicao_id} não encontrada") for p in lote
+            ]
+            for i, reserva in zip(validos, reservas):
+                resultados[i] = ReservaRefeicaoDTO.model_validate(reserva) if reserva is not None else \
+                    CapacidadeEsgotada(f"Capacidade esgotada para a refeição {lote[i].refeicao_id}")
+            IdempotenciaRepo(session).registar(
+                (p.utilizador_id, p.chave, r.id, r.model_dump_json())
+                for p, r in zip(lote, resultados) if p.chave is not None and isinstance(r, ReservaRefeicaoDTO)
+            )
+            session.commit()
+            return list(zip(lote, resultados))
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    # ==== MÉTRICAS ====
+
+    def relatorio(self) -> Dict[str, object]:
+        """Débito, tamanho dos lotes e latências (ms) do flush e da confirmação ao cliente."""
+        with self._lock:
+            decorrido = max(time.time() - self._inicio, 1e-9)
+            return {
+                "lote_max": self.lote_max,
+                "espera_ms": self.espera * 1000,
+                "em_fila": self._fila.qsize(),
+                "submetidas": self.submetidas,
+                "gravadas": self.gravadas,
+                "falhadas": self.falhadas,
+                "sem_capacidade": self.sem_capacidade,
+                "rejeitadas": self.rejeitadas,
+                "chaves_expiradas": self.chaves_expiradas,
+                "lotes": self.lotes,
+                "maior_lote": self.maior_lote,
+                "media_por_lote": round(self.gravadas / self.lotes, 2) if self.lotes else None,
+                "reservas_por_segundo": round(self.gravadas / decorrido, 2),
+                "flush_ms": resumo_latencias(self._flush_ms),
+                "confirmacao_ms": resumo_latencias(self._confirmacao_ms),
+            }
+
+
+fila_reservas = FilaReservas(
+    lote_max=int(os.getenv("BIOCANTINAS_RESERVAS_LOTE_MAX", "256")),
+    espera_ms=float(os.getenv("BIOCANTINAS_RESERVAS_LOTE_ESPERA_MS", "5")),
+    fila_max=int(os.getenv("BIOCANTINAS_RESERVAS_FILA_MAX", "10000")),
+    limpeza_s=float(os.getenv("BIOCANTINAS_IDEMPOTENCIA_LIMPEZA_S", "300")),
+)
@@ -1,43 +1,140 @@
-from typing import Optional, List
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, List
 from passlib.context import CryptContext
-from ..db.session import SessionLocal, init_db
-from ..repositories.userRepo import UserRepo
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..db.session import get_db, get_async_db
+from ..repositories.userRepo import UserRepo, UserRepoAsync
 from ..db.models import UserORM
+from ..utils.metricas import resumo_latencias
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def _password_bcrypt(password: str) -> str:
+    """bcrypt has a 72-byte limit; truncate password to 72 bytes (not characters)."""
+    return password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
+
+
+class PoolHashSaturado(Exception):
+    """O pool de verificação de passwords não tem lugar livre (nem na fila)."""
+
+
+class PoolHash:
+    """
+    Verificação bcrypt num pool de threads dedicado e limitado, fora do event loop
+    e do threadpool das rotas síncronas (o bcrypt liberta o GIL, por isso as
+    verificações correm em paralelo nos vários cores).
+
+    Aceita no máximo workers + fila verificações em curso; acima disso falha logo
+    com PoolHashSaturado (o login responde 429) em vez de acumular pedidos.
+    Regista o tempo de espera na fila e de hash de cada verificação.
+    """
+    def __init__(self, workers: int, fila: int, amostras: int = 1000):
+        self.workers = workers
+        self.capacidade = workers + fila
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.em_curso = 0
+        self.verificacoes = 0
+        self.rejeitadas = 0
+        self._espera_ms = deque(maxlen=amostras)
+        self._hash_ms = deque(maxlen=amostras)
+
+    async def verificar(self, password: str, password_hash: str) -> bool:
+        with self._lock:
+            if self.em_curso >= self.capacidade:
+                self.rejeitadas += 1
+                raise PoolHashSaturado("Demasiados logins em simultâneo; tente novamente")
+            self.em_curso += 1
+        try:
+            futuro = self._executor.submit(self._verificar_medido, password, password_hash, time.perf_counter())
+        except BaseException:
+            self._libertar()
+            raise
+        # O lugar só é libertado quando o trabalho sai do executor (terminado ou
+        # cancelado ainda na fila), não quando quem espera desiste (e.g. cliente desligou)
+        futuro.add_done_callback(self._libertar)
+        return await asyncio.wrap_future(futuro)
+
+    def _libertar(self, futuro: Optional[Future] = None) -> None:
+        with self._lock:
+            self.em_curso -= 1
+
+    def _verificar_medido(self, password: str, password_hash: str, submetido: float) -> bool:
+        inicio = time.perf_counter()
+        try:
+            return pwd_context.verify(_password_bcrypt(password), password_hash)
+        finally:
+            fim = time.perf_counter()
+            with self._lock:
+                self.verificacoes += 1
+                self._espera_ms.append((inicio - submetido) * 1000)
+                self._hash_ms.append((fim - inicio) * 1000)
+
+    def relatorio(self) -> Dict[str, object]:
+        """Ocupação do pool e latências (ms) das últimas verificações: p50, p95 e máximo."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacidade": self.capacidade,
+                "em_curso": self.em_curso,
+                "verificacoes": self.verificacoes,
+                "rejeitadas": self.rejeitadas,
+                "espera_ms": resumo_latencias(self._espera_ms),
+                "hash_ms": resumo_latencias(self._hash_ms),
+            }
+
+
+pool_hash = PoolHash(
+    workers=int(os.getenv("BIOCANTINAS_HASH_WORKERS", str(os.cpu_count() or 1))),
+    fila=int(os.getenv("BIOCANTINAS_HASH_FILA", "64")),
+)
+
+
 class UserService:
-    def __init__(self):
-        init_db()
-        self.session = SessionLocal()
+    def __init__(self, session: Session):
+        self.session = session
         self.repo = UserRepo(self.session)
 
     def create_user(self, username: str, password: str, role: str) -> UserORM:
-        # bcrypt has a 72-byte limit; truncate password to 72 bytes (not characters)
-        password_bytes = password.encode('utf-8')[:72]
-        password_hash = pwd_context.hash(password_bytes.decode('utf-8', errors='ignore'))
+        password_hash = pwd_context.hash(_password_bcrypt(password))
         return self.repo.create(username=username, password_hash=password_hash, role=role)
 
-    def verify_user(self, username: str, password: str) -> Optional[UserORM]:
-        user = self.repo.get_by_username(username)
+    def get_user(self, user_id: int) -> Optional[UserORM]:
+        return self.repo.get(user_id)
+
+    def list_users(self) -> List[UserORM]:
+        return self.repo.list()
+
+
+class UserServiceAsync:
+    """Login para rotas assíncronas: a verificação bcrypt corre no pool_hash."""
+    def __init__(self, session: AsyncSession):
+        self.repo = UserRepoAsync(session)
+
+    async def verify_user(self, username: str, password: str) -> Optional[UserORM]:
+        """Utilizador se a password estiver correta; levanta PoolHashSaturado se o pool estiver cheio."""
+        user = await self.repo.get_by_username(username)
         if not user:
             return None
-        # bcrypt has a 72-byte limit; truncate password to 72 bytes
-        password_bytes = password.encode('utf-8')[:72]
-        safe_password = password_bytes.decode('utf-8', errors='ignore')
-        if not pwd_context.verify(safe_password, user.hashed_password):
+        if not await pool_hash.verificar(password, user.hashed_password):
             return None
         return user
 
-    def get_user(self, user_id: int) -> Optional[UserORM]:
-        return self.repo.get(user_id)
 
-    def list_users(self) -> List[UserORM]:
-        return self.repo.list()
+def get_user_service(db: Session = Depends(get_db)) -> UserService:
+    """Serviço com a sessão do pedido HTTP (dependência FastAPI)."""
+    return UserService(db)
 
-_users = UserService()
 
-def get_user_service() -> UserService:
-    return _users
+async def get_user_service_async(db: AsyncSession = Depends(get_async_db)) -> UserServiceAsync:
+    """Como get_user_service, com a sessão assíncrona do pedido."""
+    return UserServiceAsync(db)
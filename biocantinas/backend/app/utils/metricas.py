@@ -0,0 +1,13 @@
+from typing import Dict, Iterable, Optional
+
+
+def resumo_latencias(amostras: Iterable[float]) -> Optional[Dict[str, float]]:
+    """p50, p95 e máximo (ms) de uma janela de amostras; None se estiver vazia."""
+    ordenadas = sorted(amostras)
+    if not ordenadas:
+        return None
+    return {
+        "p50": round(ordenadas[len(ordenadas) // 2], 1),
+        "p95": round(ordenadas[min(int(len(ordenadas) * 0.95), len(ordenadas) - 1)], 1),
+        "max": round(ordenadas[-1], 1),
+    }
@@ -47,6 +47,12 @@ def get_kpi_consolidado(API_URL, auth_token, ementa_id):
     r.raise_for_status()
     return r.json()
 
+def get_kpi_lote(API_URL, auth_token, ementa_ids):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    r = requests.get(f"{API_URL}/kpi/lote", params={"ementa_ids": ementa_ids}, headers=headers)
+    r.raise_for_status()
+    return r.json()
+
 def pagina_gestor(API_URL, auth_token):
     st.header("Gestão de Fornecedores")
 
@@ -144,7 +150,7 @@ def pagina_gestor(API_URL, auth_token):
                 selected_ementa_id = ementa_options[selected_ementa_label]
                 
                 # Subtabs para KPIs
-                kpi_tab1, kpi_tab2, kpi_tab3 = st.tabs(["Consolidado", "Sustentabilidade", "Desperdício"])
+                kpi_tab1, kpi_tab2, kpi_tab3, kpi_tab4 = st.tabs(["Consolidado", "Sustentabilidade", "Desperdício", "Comparação"])
                 
                 # TAB CONSOLIDADO
                 with kpi_tab1:
@@ -370,6 +376,37 @@ def pagina_gestor(API_URL, auth_token):
                             except Exception as e:
                                 st.error(f"Erro: {str(e)}")
                 
+                # TAB COMPARAÇÃO (todas as ementas num só pedido)
+                with kpi_tab4:
+                    st.markdown("Comparação de KPIs entre ementas")
+                    
+                    if st.button("Comparar Ementas", key="calc_comparacao"):
+                        with st.spinner("Calculando KPIs de todas as ementas..."):
+                            try:
+                                lote = get_kpi_lote(API_URL, auth_token, [e['id'] for e in ementas])
+                                
+                                import pandas as pd
+                                tabela = pd.DataFrame([
+                                    {
+                                        "Ementa": item['ementa_nome'],
+                                        "Início": item['data_inicio'],
+                                        "% Biológico": item['consolidado']['percentagem_biologica'],
+                                        "% Desperdício": item['consolidado']['taxa_desperdicio'],
+                                        "% Servido": item['consolidado']['taxa_servida'],
+                                        "Produzido": item['consolidado']['total_produzido'],
+                                    }
+                                    for item in lote['ementas']
+                                ])
+                                
+                                if tabela.empty:
+                                    st.info("Sem dados para comparar.")
+                                else:
+                                    st.dataframe(tabela, use_container_width=True, hide_index=True)
+                                    st.line_chart(tabela.set_index("Início")[["% Biológico", "% Desperdício"]], height=400)
+                                
+                            except Exception as e:
+                                st.error(f"Erro: {str(e)}")
+                
         except requests.exceptions.HTTPError as e:
             st.error(f"Erro ao carregar KPIs: {e.response.status_code} - {e.response.text}")
         except Exception as e:
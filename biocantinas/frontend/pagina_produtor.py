@@ -212,7 +212,7 @@ def pagina_produtor(API_URL, auth_token):
                     if st.button("🔍 Ver Previsão", key="btn_preview"):
                         try:
                             response = requests.get(
-                                f"{API_URL}/aprovisionamento/preview",
+                                f"{API_URL}/aprovisionamento/alocacao",
                                 params={
                                     "data_inicio": str(data_inicio),
                                     "data_fim": str(data_fim)
@@ -225,73 +225,25 @@ def pagina_produtor(API_URL, auth_token):
                                 
                                 st.success(f"✅ Previsão gerada para {dados['periodo']}")
                                 
-                                # Obter todos os fornecedores para distribuir quantidades
-                                try:
-                                    fornecedores_response = requests.get(
-                                        f"{API_URL}/fornecedores",
-                                        headers=headers
-                                    )
-                                    todos_fornecedores = fornecedores_response.json() if fornecedores_response.status_code == 200 else []
-                                except:
-                                    todos_fornecedores = []
-                                
-                                # Criar mapa de fornecedor_id -> fornecedor
-                                fornecedores_map = {f["id"]: f for f in todos_fornecedores}
-                                
-                                # Filtrar apenas produtos que o fornecedor produz e calcular quantidade a pedir
-                                necessidades = dados.get("necessidades_previstas_historico", {})
+                                # A divisão pelos fornecedores (prioridade, capacidade e intervalo
+                                # de produção) é calculada pela API: ficar apenas com as minhas linhas
+                                necessidades = dados.get("necessidades", {})
                                 necessidades_filtradas = []
                                 
-                                for produto, quantidade_total in necessidades.items():
+                                for alocacao in dados.get("alocacoes", []):
+                                    if alocacao["fornecedor_id"] != perfil["id"]:
+                                        continue
+                                    produto = alocacao["produto"]
                                     produto_lower = produto.lower()
-                                    if produto_lower in meus_produtos:
-                                        # Obter ordem de prioridade para este produto
-                                        ordem_produto = None
-                                        for ordem_item in ordem_data:
-                                            if ordem_item["produto"].lower() == produto_lower:
-                                                ordem_produto = ordem_item
-                                                break
-                                        
-                                        if ordem_produto:
-                                            fornecedores_ids = ordem_produto.get("fornecedores_ids", [])
-                                            
-                                            # Calcular quanto cada fornecedor deve fornecer
-                                            quantidade_restante = quantidade_total
-                                            quantidade_para_mim = 0
-                                            
-                                            for idx, forn_id in enumerate(fornecedores_ids):
-                                                if quantidade_restante <= 0:
-                                                    break
-                                                
-                                                # Obter capacidade do fornecedor para este produto
-                                                fornecedor = fornecedores_map.get(forn_id)
-                                                if fornecedor:
-                                                    for p in fornecedor.get("produtos", []):
-                                                        if p["nome"].lower() == produto_lower:
-                                                            capacidade_forn = p.get("capacidade", 0)
-                                                            
-                                                            # Se for o fornecedor atual (eu)
-                                                            if forn_id == perfil["id"]:
-                                                                # Calcular quanto devo fornecer
-                                                                quantidade_para_mim = min(capacidade_forn, quantidade_restante)
-                                                                quantidade_restante -= quantidade_para_mim
-                                                            else:
-                                                                # Fornecedor com prioridade maior já consome da necessidade
-                                                                quantidade_consumida = min(capacidade_forn, quantidade_restante)
-                                                                quantidade_restante -= quantidade_consumida
-                                                            break
-                                            
-                                            # Só mostrar se houver quantidade para mim
-                                            if quantidade_para_mim > 0:
-                                                prioridade = prioridade_map.get(produto_lower)
-                                                capacidade = capacidade_map.get(produto_lower, 0)
-                                                necessidades_filtradas.append({
-                                                    "Produto": produto,
-                                                    "Quantidade Total Necessária (kg)": quantidade_total,
-                                                    "Quantidade a Fornecer (kg)": quantidade_para_mim,
-                                                    "Prioridade": prioridade if prioridade else "N/A",
-                                                    "Capacidade (kg)": capacidade
-                                                })
+                                    prioridade = prioridade_map.get(produto_lower)
+                                    capacidade = capacidade_map.get(produto_lower, 0)
+                                    necessidades_filtradas.append({
+                                        "Produto": produto,
+                                        "Quantidade Total Necessária (kg)": necessidades.get(produto, 0),
+                                        "Quantidade a Fornecer (kg)": alocacao["quantidade"],
+                                        "Prioridade": prioridade if prioridade else "N/A",
+                                        "Capacidade (kg)": capacidade
+                                    })
                                 
                                 if necessidades_filtradas:
                                     # Ordenar por prioridade (valores menores = maior prioridade)
@@ -9,11 +9,14 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 import os
 from datetime import date, timedelta
 from biocantinas.backend.app.db.session import SessionLocal, engine, init_db
+from biocantinas.backend.app.db.migrations import aplicar_migracoes
 from biocantinas.backend.app.db.models import (
     Base, UserORM, FornecedorORM, ProdutoFornecedorORM, 
     EmentaORM, RefeicaoORM, ItemRefeicaoORM, ReservaRefeicaoORM,
     HistoricoRefeicoesDiaORM, HistoricoReservasPratoORM, ExecucaoRefeicaoORM
 )
+from biocantinas.backend.app.repositories.reservaRepo import ReservaRepo
+from biocantinas.backend.app.repositories.kpiSnapshotRepo import KPISnapshotRepo
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -40,6 +43,9 @@ def delete_database(db_url: str):
             print("Database removed")
         else:
             print(f"No database found at {path}")
+        # Ficheiros WAL de uma base de dados anterior seriam reaplicados à nova
+        for sufixo in ("-wal", "-shm"):
+            Path(str(path) + sufixo).unlink(missing_ok=True)
 
 def create_users(session):
     """Criar usuários do sistema"""
@@ -705,6 +711,8 @@ def create_reservas(session):
         session.add(reserva)
     
     session.commit()
+    # Reservas inseridas diretamente: reconstruir os contadores por refeição
+    ReservaRepo(session).recalcular_contadores()
     print(f"✅ {len(reservas)} reservas criadas para {len(refeicoes)} refeições")
 
 def create_historico(session):
@@ -809,6 +817,9 @@ def create_execucoes(session):
         execucoes.append(exec_refeicao)
         session.add(exec_refeicao)
     
+    session.commit()
+    # Ementas e execuções inseridas diretamente: criar os rollups de desperdício
+    KPISnapshotRepo(session).preencher_em_falta()
     session.commit()
     print(f"✅ {len(execucoes)} execuções de refeições criadas")
 
@@ -827,7 +838,7 @@ def main():
     new_engine = create_engine(DB_PATH, connect_args={"check_same_thread": False})
     
     print("\n📦 Criando tabelas...")
-    Base.metadata.create_all(bind=new_engine)
+    aplicar_migracoes(new_engine)
     print("✅ Tabelas criadas")
     
     SessionFactory = sessionmaker(bind=new_engine, autoflush=False, autocommit=False)
@@ -0,0 +1,173 @@
+"""
+Script para verificar os planos de execução (EXPLAIN QUERY PLAN) das consultas
+dos repositórios.
+
+Executa cada consulta de leitura dos repositórios contra a base de dados configurada
+(BIOCANTINAS_DB_PATH), captura o SQL emitido e mostra o plano do SQLite.
+Uma leitura completa de tabela ("SCAN tabela" sem índice) que não esteja prevista
+para a consulta é assinalada como regressão, e o script termina com código 1.
+
+Uso: python scripts/verificar_planos_consulta.py
+"""
+import re
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from datetime import date
+from sqlalchemy import event
+from biocantinas.backend.app.db.session import SessionLocal, engine, init_db
+from biocantinas.backend.app.db.models import (
+    Base, EmentaORM, RefeicaoORM, ProdutoFornecedorORM, FornecedorORM, UserORM
+)
+from biocantinas.backend.app.repositories.ementaRepo import EmentaRepo
+from biocantinas.backend.app.repositories.reservaRepo import ReservaRepo
+from biocantinas.backend.app.repositories.pedidoRepo import PedidoRepo, STATUS_EM_ABERTO
+from biocantinas.backend.app.repositories.planoProducaoRepo import PlanoProducaoRepo
+from biocantinas.backend.app.repositories.execucaoRefeicaoRepo import ExecucaoRefeicaoRepo
+from biocantinas.backend.app.repositories.produtoRepo import ProdutoRepo
+from biocantinas.backend.app.repositories.fornecedorRepo import FornecedorRepo
+from biocantinas.backend.app.repositories.userRepo import UserRepo
+from biocantinas.backend.app.repositories.kpiSnapshotRepo import KPISnapshotRepo
+from biocantinas.backend.app.repositories.indiceIngredientesRepo import IndiceIngredientesRepo
+from biocantinas.backend.app.repositories.historicoReservasRepo import HistoricoReservasRepo
+
+
+def _amostra(session):
+    """Valores reais da base de dados para parametrizar as consultas."""
+    ementa = session.query(EmentaORM).order_by(EmentaORM.id).first()
+    refeicao = session.query(RefeicaoORM).order_by(RefeicaoORM.id).first()
+    produto = session.query(ProdutoFornecedorORM).order_by(ProdutoFornecedorORM.id).first()
+    fornecedor = session.query(FornecedorORM).order_by(FornecedorORM.id).first()
+    utilizador = session.query(UserORM).order_by(UserORM.id).first()
+    inicio = ementa.data_inicio if ementa else date.today()
+    fim = ementa.data_fim if ementa else date.today()
+    return {
+        "inicio": inicio,
+        "fim": fim,
+        "ementa_id": ementa.id if ementa else 0,
+        "refeicao_id": refeicao.id if refeicao else 0,
+        "produto_id": produto.id if produto else 0,
+        "produto_nome": produto.nome if produto else "",
+        "fornecedor_id": fornecedor.id if fornecedor else 0,
+        "usuario_id": utilizador.id if utilizador else 0,
+        "username": utilizador.username if utilizador else "",
+    }
+
+
+# Tabelas que a consulta lê por inteiro de propósito: a sobreposição de períodos
+# (data_inicio <= fim AND data_fim >= inicio) não restringe bem nenhum índice e
+# "ementas" tem uma linha por período; o histórico é carregado todo para memória.
+SOBREPOSICAO = {"ementas"}
+HISTORICO = {"historico_refeicoes_dia", "historico_reservas_prato"}
+
+# (descrição, consulta, tabelas com leitura completa prevista)
+CONSULTAS = [
+    ("EmentaRepo.listar_por_periodo",
+     lambda s, a: EmentaRepo(s).listar_por_periodo(a["inicio"], a["fim"]), SOBREPOSICAO),
+    ("EmentaRepo.carregar_grafo_por_periodo",
+     lambda s, a: EmentaRepo(s).carregar_grafo_por_periodo(a["inicio"], a["fim"]), SOBREPOSICAO),
+    ("ReservaRepo.listar_por_periodo",
+     lambda s, a: ReservaRepo(s).listar_por_periodo(a["inicio"], a["fim"])),
+    ("ReservaRepo.assinatura_por_periodo",
+     lambda s, a: ReservaRepo(s).assinatura_por_periodo(a["inicio"], a["fim"])),
+    ("ReservaRepo.itens_com_reservas_por_periodo",
+     lambda s, a: ReservaRepo(s).itens_com_reservas_por_periodo(a["inicio"], a["fim"])),
+    ("ReservaRepo.totais_por_refeicao",
+     lambda s, a: ReservaRepo(s).totais_por_refeicao([a["refeicao_id"]])),
+    ("ReservaRepo.listar_por_utilizador",
+     lambda s, a: ReservaRepo(s).listar_por_utilizador(a["usuario_id"])),
+    ("PedidoRepo.obter_ranking_prioridade",
+     lambda s, a: PedidoRepo(s).obter_ranking_prioridade()),
+    ("PedidoRepo.listar_candidatos",
+     lambda s, a: PedidoRepo(s).listar_candidatos([a["produto_nome"]], a["inicio"], a["fim"])),
+    ("PedidoRepo.quantidades_em_aberto",
+     lambda s, a: PedidoRepo(s).quantidades_em_aberto([a["produto_id"]])),
+    ("PedidoRepo.listar_por_fornecedor",
+     lambda s, a: PedidoRepo(s).listar_por_fornecedor(a["fornecedor_id"])),
+    ("PedidoRepo.listar_por_status",
+     lambda s, a: PedidoRepo(s).listar_por_status(STATUS_EM_ABERTO[0])),
+    ("PlanoProducaoRepo.obter_lote_vigente",
+     lambda s, a: PlanoProducaoRepo(s).obter_lote_vigente(a["inicio"], a["fim"])),
+    ("PlanoProducaoRepo.listar_alertas (período)",
+     lambda s, a: PlanoProducaoRepo(s).listar_alertas(a["inicio"], a["fim"])),
+    ("ExecucaoRefeicaoRepo.listar_por_periodo",
+     lambda s, a: ExecucaoRefeicaoRepo(s).listar_por_periodo(a["inicio"], a["fim"])),
+    ("ProdutoRepo.listar_por_fornecedor",
+     lambda s, a: ProdutoRepo(s).listar_por_fornecedor(a["fornecedor_id"])),
+    ("ProdutoRepo.buscar_por_nomes",
+     lambda s, a: ProdutoRepo(s).buscar_por_nomes([a["produto_nome"]])),
+    ("FornecedorRepo.obter_por_usuario_id",
+     lambda s, a: FornecedorRepo(s).obter_por_usuario_id(a["usuario_id"])),
+    ("UserRepo.get_by_username",
+     lambda s, a: UserRepo(s).get_by_username(a["username"])),
+    ("IndiceIngredientesRepo.resolver",
+     lambda s, a: IndiceIngredientesRepo(s).resolver(a["produto_nome"])),
+    ("KPISnapshotRepo.listar_dias_com_producao_por_ementa",
+     lambda s, a: KPISnapshotRepo(s).listar_dias_com_producao_por_ementa([a["ementa_id"]])),
+    ("HistoricoReservasRepo.obter_tabela",
+     lambda s, a: HistoricoReservasRepo(s).obter_tabela(), HISTORICO),
+]
+
+
+def _capturar(session, consulta, amostra):
+    """Executa a consulta e devolve os SELECT emitidos (sql, parâmetros)."""
+    emitidos = []
+
+    def registar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            emitidos.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", registar)
+    try:
+        consulta(session, amostra)
+    finally:
+        event.remove(engine, "before_cursor_execute", registar)
+    return emitidos
+
+
+def _leituras_completas(plano, permitidas):
+    """Linhas do plano que leem uma tabela do modelo inteira sem índice (fora das permitidas)."""
+    completas = []
+    for detalhe in plano:
+        if not detalhe.startswith("SCAN ") or "USING" in detalhe:
+            continue
+        tabela = re.sub(r"_\d+$", "", detalhe.split()[1])  # aliases como refeicoes_1
+        if tabela in Base.metadata.tables and tabela not in permitidas:
+            completas.append(detalhe)
+    return completas
+
+
+def verificar_planos() -> int:
+    init_db()
+    session = SessionLocal()
+    regressoes = 0
+    try:
+        amostra = _amostra(session)
+        for nome, consulta, *permitidas in CONSULTAS:
+            permitidas = permitidas[0] if permitidas else set()
+            print(f"\n=== {nome} ===")
+            for sql, parametros in _capturar(session, consulta, amostra):
+                plano = [
+                    linha[3] for linha in
+                    session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql, parametros).all()
+                ]
+                completas = _leituras_completas(plano, permitidas)
+                regressoes += len(completas)
+                print("  " + " ".join(sql.split())[:120])
+                for detalhe in plano:
+                    marca = "✗" if detalhe in completas else "·" if detalhe.startswith("SCAN ") else "✓"
+                    print(f"    {marca} {detalhe}")
+    finally:
+        session.rollback()
+        session.close()
+
+    if regressoes:
+        print(f"\n{regressoes} leitura(s) completa(s) de tabela não prevista(s).")
+    else:
+        print("\nSem leituras completas de tabela não previstas.")
+    return 1 if regressoes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(verificar_planos())
@@ -0,0 +1,108 @@
+"""
+Configuração comum dos testes: a API corre contra uma base de dados SQLite
+temporária (nunca contra os ficheiros biocantinas.db do repositório).
+
+O motor é criado quando app.db.session é importado, por isso
+BIOCANTINAS_DB_PATH tem de ser definido antes de importar a aplicação.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+_BACKEND = Path(__file__).resolve().parent.parent / "biocantinas" / "backend"
+sys.path.insert(0, str(_BACKEND))
+
+# BIOCANTINAS_TESTES_DB_PATH corre os testes noutra base de dados (e.g. o Postgres de
+# docker-compose.postgres.yml); tem de ser uma base de dados descartável.
+_DIRETORIO = tempfile.mkdtemp(prefix="biocantinas-testes-")
+os.environ["BIOCANTINAS_DB_PATH"] = os.getenv("BIOCANTINAS_TESTES_DB_PATH", f"sqlite:///{_DIRETORIO}/testes.db")
+os.environ.pop("BIOCANTINAS_ASYNC_DB_PATH", None)
+
+_SEMANAS = itertools.count()  # cada ementa de teste fica numa semana própria
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.db.models import RefeicaoORM  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:  # corre o lifespan: migrações e fila de reservas
+        yield c
+
+
+@pytest.fixture
+def session():
+    s = SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
+
+
+def _utilizador(client, role: str) -> dict:
+    username = f"{role.lower()}-{uuid.uuid4().hex[:8]}"
+    resposta = client.post("/auth/signup", json={"username": username, "password": "segredo", "role": role})
+    assert resposta.status_code == 200, resposta.text
+    resposta = client.post("/auth/login", json={"username": username, "password": "segredo"})
+    assert resposta.status_code == 200, resposta.text
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def aluno(client) -> dict:
+    return _utilizador(client, "ALUNO")
+
+
+@pytest.fixture(scope="session")
+def outro_aluno(client) -> dict:
+    return _utilizador(client, "ALUNO")
+
+
+@pytest.fixture(scope="session")
+def gestor(client) -> dict:
+    return _utilizador(client, "GESTOR_CANTINA")
+
+
+@pytest.fixture(scope="session")
+def dietista(client) -> dict:
+    return _utilizador(client, "DIETISTA")
+
+
+@pytest.fixture
+def nova_ementa(client, dietista):
+    """Cria uma ementa (uma semana futura, sem sobreposição) e retorna (ementa_id, [refeicao_id, ...])."""
+    def criar(dias: int = 1, itens: List[Tuple[str, int]] = (("Arroz", 100),)) -> Tuple[int, List[int]]:
+        inicio = date(2030, 1, 7) + timedelta(weeks=next(_SEMANAS))
+        resposta = client.post("/ementas/", headers=dietista, json={
+            "nome": f"Ementa de teste {uuid.uuid4().hex[:6]}",
+            "data_inicio": inicio.isoformat(),
+            "data_fim": (inicio + timedelta(days=4)).isoformat(),
+            "refeicoes": [
+                {
+                    "dia_semana": dia,
+                    "tipo": "almoço",
+                    "itens": [{"ingrediente": nome, "quantidade_estimada": qtd} for nome, qtd in itens],
+                }
+                for dia in range(1, dias + 1)
+            ],
+        })
+        assert resposta.status_code == 200, resposta.text
+        ementa_id = resposta.json()["id"]
+        with SessionLocal() as s:
+            refeicoes = list(s.scalars(
+                select(RefeicaoORM.id).where(RefeicaoORM.ementa_id == ementa_id).order_by(RefeicaoORM.dia_semana)
+            ))
+        return ementa_id, refeicoes
+
+    return criar
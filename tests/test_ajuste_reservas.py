@@ -0,0 +1,29 @@
+"""Ajuste das necessidades com as reservas (arredondamento reserva a reserva)."""
+from datetime import date
+
+from app.db.models import EmentaORM
+from app.services.aprovisionamentoService import AprovisionamentoService
+
+
+def test_adicional_arredondado_por_reserva(client, aluno, session, nova_ementa):
+    ementa_id, (refeicao_id,) = nova_ementa(itens=[("Cenoura", 5), ("Arroz", 30)])
+    for pessoas in (1, 1, 1, 3):
+        assert client.post("/aprovisionamento/reservas", headers=aluno,
+                           json={"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas}).status_code == 200
+    ementa = session.get(EmentaORM, ementa_id)
+
+    _, adicionais = AprovisionamentoService(session).ajustar_com_reservas(
+        {}, ementa.data_inicio, ementa.data_fim
+    )
+
+    # Cenoura: 5/10 por pessoa → int(0.5) = 0 em cada reserva de 1 pessoa, int(1.5) = 1 na de 3
+    # Arroz: 3 por pessoa → 3 + 3 + 3 + 9
+    assert adicionais == {"Cenoura": 1, "Arroz": 18}
+
+
+def test_sem_reservas_nao_ajusta(client, session):
+    necessidades = {"Batata": 10}
+    ajustadas, adicionais = AprovisionamentoService(session).ajustar_com_reservas(
+        necessidades, date(1990, 1, 1), date(1990, 1, 7)
+    )
+    assert (ajustadas, adicionais) == (necessidades, {})
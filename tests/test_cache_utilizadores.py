@@ -0,0 +1,19 @@
+"""Cache dos utilizadores autenticados: invalidada só depois do commit da alteração."""
+from app.auth.jwt import decode_token
+from app.db.models import UserORM
+
+from .conftest import _utilizador
+
+
+def test_leitura_antes_do_commit_nao_fica_em_cache(client, session):
+    headers = _utilizador(client, "DIETISTA")
+    user_id = int(decode_token(headers["Authorization"].split()[1])["sub"])
+    assert client.delete("/ementas/999999999", headers=headers).status_code == 404
+
+    # Alteração escrita (flush) mas ainda não confirmada: um pedido concorrente lê o papel antigo
+    session.get(UserORM, user_id).role = "ALUNO"
+    session.flush()
+    assert client.delete("/ementas/999999999", headers=headers).status_code == 404
+    session.commit()
+
+    assert client.delete("/ementas/999999999", headers=headers).status_code == 403
@@ -0,0 +1,75 @@
+"""Capacidade por refeição: reservas acima da capacidade são recusadas de forma atómica."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.repositories.reservaRepo import ReservaRepo
+
+
+def _contador(client, headers, refeicao_id):
+    resposta = client.get("/aprovisionamento/reservas/contadores",
+                          params={"refeicao_ids": [refeicao_id]}, headers=headers)
+    assert resposta.status_code == 200
+    return resposta.json()[0]
+
+
+def test_reserva_acima_da_capacidade_devolve_409(client, aluno, gestor, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    resposta = client.put(f"/aprovisionamento/refeicoes/{refeicao_id}/capacidade",
+                          json={"capacidade": 3}, headers=gestor)
+    assert resposta.status_code == 200
+
+    ok = client.post("/aprovisionamento/reservas",
+                     json={"refeicao_id": refeicao_id, "quantidade_pessoas": 3}, headers=aluno)
+    assert ok.status_code == 200
+    cheia = client.post("/aprovisionamento/reservas",
+                        json={"refeicao_id": refeicao_id, "quantidade_pessoas": 1}, headers=aluno)
+    assert cheia.status_code == 409
+
+    contador = _contador(client, aluno, refeicao_id)
+    assert (contador["total_pessoas"], contador["total_reservas"], contador["capacidade"]) == (3, 1, 3)
+
+
+@pytest.mark.parametrize("pessoas", [0, -5])
+def test_quantidade_nao_positiva_nao_liberta_lugares(client, aluno, gestor, nova_ementa, pessoas):
+    _, (refeicao_id,) = nova_ementa()
+    client.put(f"/aprovisionamento/refeicoes/{refeicao_id}/capacidade", json={"capacidade": 2}, headers=gestor)
+    assert client.post("/aprovisionamento/reservas",
+                       json={"refeicao_id": refeicao_id, "quantidade_pessoas": 2}, headers=aluno).status_code == 200
+
+    negativa = client.post("/aprovisionamento/reservas",
+                           json={"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas}, headers=aluno)
+    assert negativa.status_code == 422
+    lote = client.post("/aprovisionamento/reservas/lote",
+                       json={"reservas": [{"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas}]}, headers=aluno)
+    assert lote.status_code == 422
+
+    # Os lugares continuam ocupados: uma nova reserva continua a não caber
+    assert client.post("/aprovisionamento/reservas",
+                       json={"refeicao_id": refeicao_id, "quantidade_pessoas": 1}, headers=aluno).status_code == 409
+    assert _contador(client, aluno, refeicao_id)["total_pessoas"] == 2
+
+
+def test_repositorio_recusa_quantidade_nao_positiva(client, session, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    with pytest.raises(ValueError):
+        ReservaRepo(session).criar_varias([(1, refeicao_id, -1)])
+    with pytest.raises(ValueError):
+        ReservaRepo(session).criar(1, refeicao_id, 0)
+
+
+def test_reservas_concorrentes_nao_ultrapassam_capacidade(client, aluno, gestor, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    client.put(f"/aprovisionamento/refeicoes/{refeicao_id}/capacidade", json={"capacidade": 10}, headers=gestor)
+
+    def reservar(_):
+        return client.post("/aprovisionamento/reservas/lote",
+                           json={"reservas": [{"refeicao_id": refeicao_id, "quantidade_pessoas": 1}] * 3},
+                           headers=aluno).json()["criadas"]
+
+    with ThreadPoolExecutor(8) as executor:
+        criadas = sum(executor.map(reservar, range(8)))
+
+    assert criadas == 10
+    contador = _contador(client, aluno, refeicao_id)
+    assert (contador["total_pessoas"], contador["total_reservas"]) == (10, 10)
@@ -0,0 +1,65 @@
+"""Contadores de reservas por refeição mantidos nas escritas de reservas e ementas."""
+from app.db.models import ContadorReservasRefeicaoORM, RefeicaoORM
+
+
+def _contadores(client, headers, refeicao_ids):
+    resposta = client.get("/aprovisionamento/reservas/contadores",
+                          params={"refeicao_ids": refeicao_ids}, headers=headers)
+    assert resposta.status_code == 200
+    return {c["refeicao_id"]: (c["total_pessoas"], c["total_reservas"]) for c in resposta.json()}
+
+
+def _reservar(client, headers, refeicao_id, pessoas):
+    resposta = client.post("/aprovisionamento/reservas",
+                           json={"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas}, headers=headers)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()["id"]
+
+
+def test_criar_e_cancelar_atualiza_contadores(client, aluno, outro_aluno, nova_ementa):
+    _, (r1, r2) = nova_ementa(dias=2)
+    a = _reservar(client, aluno, r1, 2)
+    _reservar(client, outro_aluno, r1, 3)
+    lote = client.post("/aprovisionamento/reservas/lote", headers=aluno, json={"reservas": [
+        {"refeicao_id": r1, "quantidade_pessoas": 1},
+        {"refeicao_id": r2, "quantidade_pessoas": 4},
+    ]})
+    assert lote.json()["criadas"] == 2
+    assert _contadores(client, aluno, [r1, r2]) == {r1: (6, 3), r2: (4, 1)}
+
+    # Só o dono pode cancelar
+    assert client.delete(f"/aprovisionamento/reservas/{a}", headers=outro_aluno).status_code == 404
+    assert client.delete(f"/aprovisionamento/reservas/{a}", headers=aluno).status_code == 200
+    assert _contadores(client, aluno, [r1, r2]) == {r1: (4, 2), r2: (4, 1)}
+
+
+def test_alterar_ementa_mantem_refeicoes_e_reservas(client, aluno, dietista, session, nova_ementa):
+    ementa_id, (r1, r2) = nova_ementa(dias=2)
+    reserva = _reservar(client, aluno, r1, 2)
+    ementa = client.get(f"/ementas/{ementa_id}", headers=dietista).json()
+    ementa["nome"] = "Semana renomeada"
+    ementa["refeicoes"][0]["itens"] = [{"ingrediente": "Massa", "quantidade_estimada": 120}]
+
+    # Editar não recria as refeições: ids, reservas e contadores mantêm-se
+    assert client.put(f"/ementas/{ementa_id}", headers=dietista, json=ementa).status_code == 200
+    assert any(r["id"] == reserva and r["refeicao_id"] == r1
+               for r in client.get("/aprovisionamento/reservas", headers=aluno).json())
+    assert _contadores(client, aluno, [r1]) == {r1: (2, 1)}
+    session.expire_all()
+    assert [i.ingrediente for i in session.get(RefeicaoORM, r1).itens] == ["Massa"]
+
+    # Remover uma refeição sem reservas é permitido; com reservas é recusado
+    sem_r2 = dict(ementa, refeicoes=ementa["refeicoes"][:1])
+    assert client.put(f"/ementas/{ementa_id}", headers=dietista, json=sem_r2).status_code == 200
+    assert session.get(RefeicaoORM, r2) is None
+    vazia = dict(ementa, refeicoes=[])
+    assert client.put(f"/ementas/{ementa_id}", headers=dietista, json=vazia).status_code == 409
+    assert client.delete(f"/ementas/{ementa_id}", headers=dietista).status_code == 409
+    assert client.get(f"/ementas/{ementa_id}", headers=dietista).json()["nome"] == "Semana renomeada"
+    assert _contadores(client, aluno, [r1]) == {r1: (2, 1)}
+
+    # Depois de cancelar a reserva, a ementa pode ser apagada e o contador desaparece
+    assert client.delete(f"/aprovisionamento/reservas/{reserva}", headers=aluno).status_code == 200
+    assert client.delete(f"/ementas/{ementa_id}", headers=dietista).status_code == 200
+    session.expire_all()
+    assert session.get(ContadorReservasRefeicaoORM, r1) is None
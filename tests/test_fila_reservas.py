@@ -0,0 +1,47 @@
+"""Fila de reservas (group commit): confirmação após commit e isolamento de falhas no lote."""
+import pytest
+
+from app.repositories.reservaRepo import CapacidadeEsgotada, RefeicaoNaoEncontrada
+from app.services.reservaService import FilaReservas
+
+
+@pytest.fixture
+def fila():
+    # Espera longa: os pedidos submetidos de seguida ficam no mesmo lote
+    fila = FilaReservas(lote_max=50, espera_ms=300, fila_max=50)
+    yield fila
+    fila.parar()
+
+
+def test_falha_de_um_pedido_nao_afeta_o_resto_do_lote(client, gestor, fila, nova_ementa):
+    _, (r1, r2) = nova_ementa(dias=2)
+    client.put(f"/aprovisionamento/refeicoes/{r2}/capacidade", json={"capacidade": 1}, headers=gestor)
+
+    ok = fila.submeter(1, r1, 2)
+    invalido = fila.submeter(1, r1, 0)           # faz falhar a transação do lote
+    inexistente = fila.submeter(1, 999_999, 1)
+    cheia = fila.submeter(1, r2, 5)
+    ok2 = fila.submeter(2, r2, 1)
+
+    assert ok.result(10).quantidade_pessoas == 2
+    assert ok2.result(10).refeicao_id == r2
+    with pytest.raises(ValueError):
+        invalido.result(10)
+    with pytest.raises(RefeicaoNaoEncontrada):
+        inexistente.result(10)
+    with pytest.raises(CapacidadeEsgotada):
+        cheia.result(10)
+
+    relatorio = fila.relatorio()
+    assert relatorio["lotes"] == 1 and relatorio["maior_lote"] == 5
+    assert (relatorio["gravadas"], relatorio["sem_capacidade"], relatorio["falhadas"]) == (2, 1, 2)
+
+
+def test_reserva_de_refeicao_inexistente_devolve_404(client, aluno):
+    resposta = client.post("/aprovisionamento/reservas",
+                           json={"refeicao_id": 999_999, "quantidade_pessoas": 1}, headers=aluno)
+    assert resposta.status_code == 404
+    contadores = client.get("/aprovisionamento/reservas/contadores",
+                            params={"refeicao_ids": [999_999]}, headers=aluno).json()
+    assert contadores == []
+    assert all(r["refeicao_id"] != 999_999 for r in client.get("/aprovisionamento/reservas", headers=aluno).json())
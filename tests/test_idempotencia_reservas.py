@@ -0,0 +1,59 @@
+"""Idempotency-Key em POST /aprovisionamento/reservas: repetições devolvem a reserva já criada."""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _reservar(client, headers, chave, refeicao_id, pessoas=1):
+    return client.post("/aprovisionamento/reservas", json={"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas},
+                       headers={**headers, "Idempotency-Key": chave})
+
+
+def _contador(client, headers, refeicao_id):
+    contadores = client.get("/aprovisionamento/reservas/contadores",
+                            params={"refeicao_ids": [refeicao_id]}, headers=headers).json()
+    return (contadores[0]["total_pessoas"], contadores[0]["total_reservas"]) if contadores else (0, 0)
+
+
+def test_repeticao_devolve_a_mesma_reserva(client, aluno, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    chave = str(uuid.uuid4())
+
+    primeira = _reservar(client, aluno, chave, refeicao_id, 2)
+    repetida = _reservar(client, aluno, chave, refeicao_id, 2)
+
+    assert primeira.status_code == repetida.status_code == 200
+    assert "Idempotent-Replayed" not in primeira.headers
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert repetida.json() == primeira.json()
+    assert _contador(client, aluno, refeicao_id) == (2, 1)
+
+
+def test_chave_reutilizada_noutra_reserva_devolve_422(client, aluno, nova_ementa):
+    _, (r1, r2) = nova_ementa(dias=2)
+    chave = str(uuid.uuid4())
+    assert _reservar(client, aluno, chave, r1).status_code == 200
+
+    assert _reservar(client, aluno, chave, r2).status_code == 422
+    assert _reservar(client, aluno, chave, r1, 3).status_code == 422
+    assert _contador(client, aluno, r2) == (0, 0)
+
+
+def test_chave_e_por_utilizador(client, aluno, outro_aluno, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    chave = str(uuid.uuid4())
+    a = _reservar(client, aluno, chave, refeicao_id).json()
+    b = _reservar(client, outro_aluno, chave, refeicao_id).json()
+    assert a["id"] != b["id"]
+    assert _contador(client, aluno, refeicao_id) == (2, 2)
+
+
+def test_repeticoes_concorrentes_criam_uma_reserva(client, aluno, nova_ementa):
+    _, (refeicao_id,) = nova_ementa()
+    chave = str(uuid.uuid4())
+
+    with ThreadPoolExecutor(6) as executor:
+        respostas = list(executor.map(lambda _: _reservar(client, aluno, chave, refeicao_id), range(6)))
+
+    assert {r.status_code for r in respostas} == {200}
+    assert len({r.json()["id"] for r in respostas}) == 1
+    assert _contador(client, aluno, refeicao_id) == (1, 1)
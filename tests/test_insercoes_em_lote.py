@@ -0,0 +1,33 @@
+"""Inserções em lote com RETURNING: as linhas devolvidas seguem a ordem dos parâmetros."""
+from datetime import date
+
+from app.db.models import FornecedorORM, ProdutoFornecedorORM
+from app.repositories.pedidoRepo import PedidoRepo
+
+
+def test_pedidos_em_lote_pela_ordem_recebida(client, session):
+    fornecedor = FornecedorORM(nome="Quinta", data_inscricao=date(2030, 1, 1), aprovado=True)
+    produto = ProdutoFornecedorORM(fornecedor=fornecedor, nome="Arroz", capacidade=100,
+                                   intervalo_producao_inicio=date(2030, 1, 1),
+                                   intervalo_producao_fim=date(2030, 12, 31))
+    session.add_all([fornecedor, produto])
+    session.flush()
+    quantidades = [7, 3, 11, 5]
+    criados = PedidoRepo(session).criar_pedidos_em_lote([
+        {"fornecedor_id": fornecedor.id, "produto_id": produto.id, "quantidade_solicitada": q,
+         "data_entrega_prevista": date(2030, 1, 1), "ordem_prioridade": 1}
+        for q in quantidades
+    ])
+    assert [p.quantidade_solicitada for p in criados] == quantidades
+    assert all(p.status == "pendente" for p in criados)
+
+
+def test_reservas_em_lote_pela_ordem_recebida(client, aluno, nova_ementa):
+    _, refeicoes = nova_ementa(dias=3)
+    pedidos = [(r, p) for p in (4, 1, 3) for r in reversed(refeicoes)]
+    resposta = client.post("/aprovisionamento/reservas/lote", headers=aluno, json={"reservas": [
+        {"refeicao_id": r, "quantidade_pessoas": p} for r, p in pedidos
+    ]})
+    assert resposta.status_code == 200
+    resultados = resposta.json()["resultados"]
+    assert [(r["reserva"]["refeicao_id"], r["reserva"]["quantidade_pessoas"]) for r in resultados] == pedidos
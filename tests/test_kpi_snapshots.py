@@ -0,0 +1,78 @@
+"""Rollups de desperdício: atualizados nas escritas de execuções; as leituras não escrevem."""
+from sqlalchemy import func, select
+
+from app.db.models import KPIDiaSnapshotORM, KPIEmentaSnapshotORM, KPIRefeicaoSnapshotORM
+
+
+def _executar(client, dietista, refeicao_id, data, produzida, servida):
+    resposta = client.post("/execucaoRefeicao/", headers=dietista, json={
+        "refeicao_id": refeicao_id, "data_execucao": data, "quantidade_produzida": produzida,
+        "quantidade_servida": servida, "quantidade_nao_servida": produzida - servida,
+    })
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()["id"]
+
+
+def test_execucoes_atualizam_os_rollups(client, dietista, nova_ementa):
+    ementa_id, (r1, r2) = nova_ementa(dias=2)
+    _executar(client, dietista, r1, "2030-01-07", 100, 80)
+    ultima = _executar(client, dietista, r1, "2030-01-08", 50, 50)
+    _executar(client, dietista, r2, "2030-01-08", 40, 30)
+
+    ementa = client.get(f"/kpi/desperdicio/ementa/{ementa_id}").json()
+    assert (ementa["total_produzido"], ementa["total_servido"], ementa["total_nao_servido"]) == (190, 160, 30)
+    assert [d["dia_semana"] for d in ementa["dias"]] == [1, 2]
+    refeicao = client.get(f"/kpi/desperdicio/refeicao/{r1}").json()
+    assert (refeicao["data_execucao"], refeicao["quantidade_produzida"]) == ("2030-01-08", 50)
+
+    assert client.delete(f"/execucaoRefeicao/{ultima}", headers=dietista).status_code == 200
+    ementa = client.get(f"/kpi/desperdicio/ementa/{ementa_id}").json()
+    assert (ementa["total_produzido"], ementa["total_nao_servido"]) == (140, 30)
+    dia = client.get(f"/kpi/desperdicio/dia/{ementa_id}/1").json()
+    assert (dia["total_produzido"], dia["taxa_desperdicio_media"]) == (100, 20.0)
+    refeicao = client.get(f"/kpi/desperdicio/refeicao/{r1}").json()
+    assert (refeicao["data_execucao"], refeicao["quantidade_produzida"]) == ("2030-01-07", 100)
+
+
+def test_leituras_sem_rollup_nao_escrevem(client, dietista, session, nova_ementa):
+    ementa_id, (refeicao_id,) = nova_ementa()
+    _executar(client, dietista, refeicao_id, "2030-01-07", 60, 45)
+    esperado = client.get(f"/kpi/desperdicio/ementa/{ementa_id}").json()
+
+    # Simular uma ementa carregada fora da aplicação (sem rollups)
+    for tabela in (KPIRefeicaoSnapshotORM, KPIDiaSnapshotORM, KPIEmentaSnapshotORM):
+        session.query(tabela).filter(tabela.ementa_id == ementa_id).delete()
+    session.commit()
+
+    assert client.get(f"/kpi/desperdicio/ementa/{ementa_id}").json() == esperado
+    assert client.get(f"/kpi/desperdicio/dia/{ementa_id}/1").json()["total_produzido"] == 60
+    assert client.get(f"/kpi/desperdicio/refeicao/{refeicao_id}").json()["quantidade_nao_servida"] == 15
+    lote = client.get("/kpi/lote", params={"ementa_ids": [ementa_id]}).json()
+    assert lote["ementas"][0]["desperdicio"] == esperado
+
+    contagem = session.scalar(
+        select(func.count()).select_from(KPIEmentaSnapshotORM).where(KPIEmentaSnapshotORM.ementa_id == ementa_id)
+    )
+    assert contagem == 0
+
+
+def test_somas_incrementais_iguais_ao_recalculo(client, dietista, session, nova_ementa):
+    ementa_id, (r1, r2) = nova_ementa(dias=2)
+    _executar(client, dietista, r1, "2030-01-07", 0, 0)          # dia sem produção: não conta na ementa
+    sem_producao = client.get(f"/kpi/desperdicio/ementa/{ementa_id}").json()
+    assert (sem_producao["total_produzido"], sem_producao["dias"]) == (0, [])
+    a = _executar(client, dietista, r1, "2030-01-07", 30, 20)
+    _executar(client, dietista, r2, "2030-01-08", 70, 70)
+    b = _executar(client, dietista, r2, "2030-01-09", 10, 4)
+    assert client.delete(f"/execucaoRefeicao/{a}", headers=dietista).status_code == 200
+    assert client.delete(f"/execucaoRefeicao/{b}", headers=dietista).status_code == 200
+
+    urls = [f"/kpi/desperdicio/ementa/{ementa_id}", f"/kpi/desperdicio/dia/{ementa_id}/1",
+            f"/kpi/desperdicio/refeicao/{r1}", f"/kpi/desperdicio/refeicao/{r2}"]
+    incrementais = [client.get(url).json() for url in urls]
+    assert incrementais[0]["total_produzido"] == 70
+
+    for tabela in (KPIRefeicaoSnapshotORM, KPIDiaSnapshotORM, KPIEmentaSnapshotORM):
+        session.query(tabela).filter(tabela.ementa_id == ementa_id).delete()
+    session.commit()
+    assert [client.get(url).json() for url in urls] == incrementais
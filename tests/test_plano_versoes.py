@@ -0,0 +1,78 @@
+"""Versões do plano de produção: reutilização quando as entradas do período não mudam."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from app.db.models import EmentaORM
+from app.db.session import SessionLocal
+from app.repositories.planoProducaoRepo import PlanoProducaoRepo
+
+
+def _periodo(session, ementa_id):
+    ementa = session.get(EmentaORM, ementa_id)
+    return {"data_inicio": ementa.data_inicio.isoformat(), "data_fim": ementa.data_fim.isoformat()}
+
+
+def _calcular(client, gestor, periodo):
+    resposta = client.post("/aprovisionamento/calcular-plano", params=periodo, headers=gestor)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()
+
+
+def _reservar(client, headers, refeicao_id, pessoas):
+    resposta = client.post("/aprovisionamento/reservas",
+                           json={"refeicao_id": refeicao_id, "quantidade_pessoas": pessoas}, headers=headers)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()["id"]
+
+
+def _realizada(plano, produto):
+    return next(p["quantidade_realizada"] for p in plano["plano"] if p["produto_nome"] == produto)
+
+
+def test_plano_reutilizado_ate_as_reservas_mudarem(client, aluno, gestor, session, nova_ementa):
+    ementa_id, (refeicao_id,) = nova_ementa(itens=[("Cenoura", 5)])
+    periodo = _periodo(session, ementa_id)
+    _reservar(client, aluno, refeicao_id, 3)
+
+    primeiro = _calcular(client, gestor, periodo)
+    repetido = _calcular(client, gestor, periodo)
+    assert not primeiro["reutilizado"]
+    assert repetido["reutilizado"] and repetido["lote_id"] == primeiro["lote_id"]
+
+    _reservar(client, aluno, refeicao_id, 10)
+    novo = _calcular(client, gestor, periodo)
+    assert not novo["reutilizado"] and novo["lote_id"] != primeiro["lote_id"]
+
+
+def test_mesma_contagem_e_total_com_outra_distribuicao_recalcula(client, aluno, gestor, session, nova_ementa):
+    ementa_id, (refeicao_id,) = nova_ementa(itens=[("Cenoura", 5)])
+    periodo = _periodo(session, ementa_id)
+    ids = [_reservar(client, aluno, refeicao_id, 3), _reservar(client, aluno, refeicao_id, 1)]
+    antes = _calcular(client, gestor, periodo)
+    assert _realizada(antes, "Cenoura") == 5 + 1  # int(1.5) + int(0.5)
+
+    # Mesmo número de reservas e de pessoas (e, em SQLite, os mesmos ids reutilizados)
+    for reserva_id in ids:
+        assert client.delete(f"/aprovisionamento/reservas/{reserva_id}", headers=aluno).status_code == 200
+    _reservar(client, aluno, refeicao_id, 2)
+    _reservar(client, aluno, refeicao_id, 2)
+
+    depois = _calcular(client, gestor, periodo)
+    assert not depois["reutilizado"]
+    assert _realizada(depois, "Cenoura") == 5 + 2  # int(1.0) * 2
+
+
+def test_recalculos_concorrentes_de_um_periodo_novo(client):
+    inicio, fim = date(2031, 6, 2), date(2031, 6, 6)
+    barreira = threading.Barrier(4)
+
+    def registar(i):
+        with SessionLocal() as s:
+            barreira.wait()
+            return PlanoProducaoRepo(s).registar_lote(inicio, fim, f"assinatura-{i}", []).id
+
+    with ThreadPoolExecutor(4) as executor:
+        lotes = list(executor.map(registar, range(4)))
+    with SessionLocal() as s:
+        assert PlanoProducaoRepo(s).obter_lote_vigente(inicio, fim).id in lotes
@@ -0,0 +1,31 @@
+"""Pool de verificação bcrypt: o limite de workers + fila conta o trabalho no executor."""
+import asyncio
+import time
+
+import pytest
+
+from app.services.userService import PoolHash, PoolHashSaturado, pwd_context
+
+
+def test_cancelar_a_espera_nao_liberta_o_lugar():
+    pool = PoolHash(workers=1, fila=0)
+    password_hash = pwd_context.hash("segredo")
+
+    async def cenario():
+        espera = asyncio.create_task(pool.verificar("segredo", password_hash))
+        await asyncio.sleep(0.05)
+        espera.cancel()  # e.g. o cliente desligou a meio do login
+        with pytest.raises(asyncio.CancelledError):
+            await espera
+        # O bcrypt continua a correr no executor: o lugar continua ocupado
+        assert pool.em_curso == 1
+        with pytest.raises(PoolHashSaturado):
+            await pool.verificar("segredo", password_hash)
+
+    asyncio.run(cenario())
+    limite = time.monotonic() + 10
+    while pool.em_curso and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert (pool.em_curso, pool.verificacoes, pool.rejeitadas) == (0, 1, 1)
+    assert asyncio.run(pool.verificar("segredo", password_hash))
+    assert pool.em_curso == 0